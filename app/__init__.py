@@ -1,4 +1,6 @@
 from flask import Flask, request, g
+import os
+import threading
 import time
 import uuid
 
@@ -40,4 +42,22 @@ def create_app():
             app.logger.exception(f"TEARDOWN_EXCEPTION: {exc}")
 
     app.register_blueprint(api)
+    _prewarm_spmf_workers(app)
     return app
+
+
+def _prewarm_spmf_workers(app):
+    # Boot the JVM pools in the background so the first /analyse call does not
+    # pay for them; they live in the processes running triclustering
+    if int(os.getenv("SPMF_WORKERS", "0")) <= 0:
+        return
+
+    from .services.analysis_jobs import get_analysis_queue
+
+    def _start():
+        try:
+            get_analysis_queue().prewarm()
+        except Exception as e:
+            app.logger.warning(f"SPMF worker pool prewarm failed: {e}")
+
+    threading.Thread(target=_start, daemon=True).start()
@@ -10,8 +10,9 @@ from .services.db import upsert_weather_daily, upsert_city_metadata, fetch_histo
 from .services.utils import city_key
 from .services.sarimax_train import train_city_sarimax
 from .services.sarimax_forecast import ModelRegistry
-from .services.analysis_pipeline import run_city_analysis
-from .services.db import list_runs
+from .services.analysis_jobs import QueueFullError, get_analysis_queue
+from .services.analysis_batch import submit_batch_analysis
+from .services.db import list_runs, fetch_run
 
 from .services.db import fetch_insights_cache
 from .services.utils import city_key
@@ -132,20 +133,86 @@ def analyse_city(city):
     k_years = int(request.args.get("k_years") or "3")
     k_months = int(request.args.get("k_months") or "3")
 
+    # Optional SLA for the TriHSPAM step; unset means unbounded mining
+    time_budget_s = float(request.args["time_budget_s"]) if request.args.get("time_budget_s") else None
+    max_patterns = int(request.args["max_patterns"]) if request.args.get("max_patterns") else None
+    top_k = int(request.args["top_k"]) if request.args.get("top_k") else None
+
+    # Extend the previous run's TriHSPAM state instead of re-mining everything
+    incremental = (request.args.get("incremental") or "0").strip() == "1"
+
+    # Queued: poll GET /runs/<run_id> for progress and the result. An identical
+    # request already in flight hands back that run instead of starting another.
     try:
-        out = run_city_analysis(
+        run_id, attached = get_analysis_queue().submit(
             city=city,
             country_code=country_code,
             start=start,
             end=end,
             auto_ingest=auto_ingest,
             k_years=k_years,
-            k_months=k_months
+            k_months=k_months,
+            time_budget_s=time_budget_s,
+            max_patterns=max_patterns,
+            top_k_by_hvar3=top_k,
+            incremental=incremental,
         )
-        return jsonify(out)
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 429, {"Retry-After": "30"}
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+    return jsonify({
+        "status": "queued",
+        "run_id": run_id,
+        "attached": attached,
+        "status_url": f"/runs/{run_id}",
+    }), 202
+
+@api.post("/analyse/batch")
+def analyse_batch():
+    body = request.get_json(silent=True) or {}
+    cities = body.get("cities") or []
+    start = (body.get("start") or "2016-01-01").strip()
+    end = (body.get("end") or "2024-12-31").strip()
+
+    if not isinstance(cities, list) or not cities:
+        return jsonify({"error": "cities must be a non-empty list"}), 400
+
+    auto_ingest = bool(body.get("auto_ingest", True))
+    workers = int(body["workers"]) if body.get("workers") else None
+    time_budget_s = float(body["time_budget_s"]) if body.get("time_budget_s") else None
+    max_patterns = int(body["max_patterns"]) if body.get("max_patterns") else None
+    top_k = int(body["top_k"]) if body.get("top_k") else None
+    incremental = bool(body.get("incremental", False))
+
+    # Runs in the background; GET /runs/<batch_id> reports progress and the summary
+    try:
+        batch_id = submit_batch_analysis(
+            cities,
+            start=start,
+            end=end,
+            workers=workers,
+            auto_ingest=auto_ingest,
+            time_budget_s=time_budget_s,
+            max_patterns=max_patterns,
+            top_k_by_hvar3=top_k,
+            incremental=incremental,
+        )
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 429, {"Retry-After": "60"}
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify({
+        "status": "queued",
+        "run_id": batch_id,
+        "n_cities": len(cities),
+        "status_url": f"/runs/{batch_id}",
+    }), 202
+
 # ------------ Log Runs --------------
 
 @api.get("/runs")
@@ -154,6 +221,13 @@ def runs():
     df = list_runs(limit=max(1, min(limit, 200)))
     return jsonify({"count": int(len(df)), "runs": df.to_dict(orient="records")})
 
+@api.get("/runs/<run_id>")
+def run_status(run_id):
+    run = fetch_run(run_id)
+    if not run:
+        return jsonify({"error": f"Unknown run '{run_id}'"}), 404
+    return jsonify(run)
+
 # ----------------- Insights -----------------
 
 def load_insights_payload_from_ref(payload_ref: str) -> dict | None:
@@ -0,0 +1,383 @@
+import java.io.BufferedReader;
+import java.io.BufferedWriter;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.nio.ByteBuffer;
+import java.nio.ByteOrder;
+import java.nio.MappedByteBuffer;
+import java.nio.channels.FileChannel;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.nio.file.Paths;
+import java.nio.file.StandardOpenOption;
+import java.util.Arrays;
+import java.util.jar.JarFile;
+import java.util.jar.Manifest;
+
+/**
+ * Long-lived SPMF runner driven by app/services/spmf_worker.py.
+ *
+ * Started once with: java -cp spmf_vd.jar SpmfWorker.java spmf_vd.jar
+ * (single-file source launch, JDK 11+), then fed one request per line:
+ *
+ *   PING                        -> PONG
+ *   RUN \t arg1 \t arg2 ...     -> OK | ERR \t message
+ *   RUNBIN \t arg1 \t arg2 ...  -> OK | ERR \t message
+ *   QUIT                        -> (exits)
+ *
+ * RUN args are exactly what would follow "java -jar spmf_vd.jar". RUNBIN
+ * takes the same args, but its input and output paths (args 3 and 4) are the
+ * binary sequence and pattern files described in app/services/trihspam_io.py;
+ * the text SPMF reads and writes only exists next to them during the job.
+ * Whatever SPMF prints on System.out is redirected to stderr so it cannot
+ * corrupt the protocol stream.
+ */
+public class SpmfWorker {
+
+    private static final int FORMAT_VERSION = 1;
+    private static final int FLAG_TIMESTAMPS = 1;
+    private static final byte[] SEQUENCE_MAGIC = "TSEQ".getBytes(StandardCharsets.US_ASCII);
+    private static final byte[] PATTERN_MAGIC = "TPAT".getBytes(StandardCharsets.US_ASCII);
+    private static final int SEQUENCE_HEADER_BYTES = 32;
+
+    public static void main(String[] args) throws Exception {
+        if (args.length < 1) {
+            System.err.println("usage: SpmfWorker <path to spmf jar>");
+            System.exit(2);
+        }
+
+        Method entry = Class.forName(mainClassOf(args[0])).getMethod("main", String[].class);
+
+        PrintStream protocol = new PrintStream(new FileOutputStream(FileDescriptor.out), true, "UTF-8");
+        System.setOut(System.err);
+
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        protocol.println("READY");
+
+        String line;
+        while ((line = in.readLine()) != null) {
+            String[] parts = line.split("\t", -1);
+            String command = parts[0];
+
+            if (command.equals("PING")) {
+                protocol.println("PONG");
+                continue;
+            }
+            if (command.equals("QUIT")) {
+                break;
+            }
+            if (!command.equals("RUN") && !command.equals("RUNBIN")) {
+                protocol.println("ERR\tunknown command: " + command);
+                continue;
+            }
+
+            String[] spmfArgs = Arrays.copyOfRange(parts, 1, parts.length);
+            try {
+                if (command.equals("RUNBIN")) {
+                    runBinary(entry, spmfArgs);
+                } else {
+                    entry.invoke(null, (Object) spmfArgs);
+                }
+                System.out.flush();
+                protocol.println("OK");
+            } catch (InvocationTargetException e) {
+                protocol.println("ERR\t" + oneLine(e.getCause()));
+            } catch (Exception e) {
+                protocol.println("ERR\t" + oneLine(e));
+            }
+        }
+    }
+
+    // -------------------------------------------------------------------------
+    // Binary exchange (RUNBIN)
+    // -------------------------------------------------------------------------
+
+    private static void runBinary(Method entry, String[] args) throws Exception {
+        if (args.length < 4) {
+            throw new IllegalArgumentException("RUNBIN needs: run <algorithm> <input> <output> [params]");
+        }
+        Path binaryInput = Paths.get(args[2]);
+        Path binaryOutput = Paths.get(args[3]);
+        Path textInput = binaryInput.resolveSibling(binaryInput.getFileName() + ".txt");
+        Path textOutput = binaryOutput.resolveSibling(binaryOutput.getFileName() + ".txt");
+
+        try {
+            int nSequences = sequencesToText(binaryInput, textInput);
+            String[] spmfArgs = args.clone();
+            spmfArgs[2] = textInput.toString();
+            spmfArgs[3] = textOutput.toString();
+            entry.invoke(null, (Object) spmfArgs);
+            patternsToBinary(textOutput, binaryOutput, nSequences);
+        } finally {
+            Files.deleteIfExists(textInput);
+            Files.deleteIfExists(textOutput);
+        }
+    }
+
+    /** Binary sequence file -> SPMF text input; returns the number of sequences. */
+    private static int sequencesToText(Path binary, Path text) throws IOException {
+        try (FileChannel channel = FileChannel.open(binary, StandardOpenOption.READ);
+             BufferedWriter out = Files.newBufferedWriter(text, StandardCharsets.UTF_8)) {
+            if (channel.size() > Integer.MAX_VALUE) {
+                throw new IOException("sequence file larger than 2 GB: " + binary);
+            }
+            MappedByteBuffer buf = channel.map(FileChannel.MapMode.READ_ONLY, 0, channel.size());
+            buf.order(ByteOrder.LITTLE_ENDIAN);
+            checkHeader(buf, SEQUENCE_MAGIC, SEQUENCE_HEADER_BYTES, binary);
+
+            boolean timestamps = (buf.getInt(8) & FLAG_TIMESTAMPS) != 0;
+            int nSequences = buf.getInt(12);
+            int nItemsets = Math.toIntExact(buf.getLong(16));
+            int seqPtr = SEQUENCE_HEADER_BYTES;
+            int itemsetPtr = seqPtr + 8 * (nSequences + 1);
+            int itemsetTime = itemsetPtr + 8 * (nItemsets + 1);
+            int items = itemsetTime + 4 * nItemsets;
+
+            StringBuilder line = new StringBuilder();
+            for (int s = 0; s < nSequences; s++) {
+                line.setLength(0);
+                int from = (int) buf.getLong(seqPtr + 8 * s);
+                int to = (int) buf.getLong(seqPtr + 8 * (s + 1));
+                for (int t = from; t < to; t++) {
+                    if (timestamps) {
+                        line.append('<').append(buf.getInt(itemsetTime + 4 * t)).append("> ");
+                    }
+                    int first = (int) buf.getLong(itemsetPtr + 8 * t);
+                    int last = (int) buf.getLong(itemsetPtr + 8 * (t + 1));
+                    for (int j = first; j < last; j++) {
+                        line.append(buf.getInt(items + 4 * j)).append(' ');
+                    }
+                    line.append("-1 ");
+                }
+                line.append("-2\n");
+                out.append(line);
+            }
+            return nSequences;
+        }
+    }
+
+    /**
+     * SPMF text output ("ids -1 ids -1 #SUP: n #SID: s s ...") -> binary
+     * pattern file with one subject-id bitset per pattern. Patterns without
+     * any item are dropped; a missing output file gives an empty pattern file.
+     */
+    private static void patternsToBinary(Path text, Path binary, int nSequences) throws IOException {
+        int nWords = (nSequences + 63) / 64;
+        Longs patternPtr = new Longs();
+        Longs itemsetPtr = new Longs();
+        Longs sidWords = new Longs();
+        Ints support = new Ints();
+        Ints items = new Ints();
+        patternPtr.add(0);
+        itemsetPtr.add(0);
+
+        if (Files.exists(text)) {
+            try (BufferedReader in = Files.newBufferedReader(text, StandardCharsets.UTF_8)) {
+                String raw;
+                while ((raw = in.readLine()) != null) {
+                    String line = raw.trim();
+                    if (line.isEmpty()) {
+                        continue;
+                    }
+                    int supAt = line.indexOf("#SUP:");
+                    String body = supAt < 0 ? line : line.substring(0, supAt);
+                    String tail = supAt < 0 ? "" : line.substring(supAt + "#SUP:".length());
+
+                    int itemsetsBefore = itemsetPtr.size();
+                    for (String tok : body.trim().split("\\s+")) {
+                        if (tok.isEmpty() || tok.startsWith("<")) {
+                            continue;  // time annotations like <0>
+                        }
+                        if (tok.equals("-1")) {
+                            if (items.size() > itemsetPtr.last()) {
+                                itemsetPtr.add(items.size());
+                            }
+                            continue;
+                        }
+                        if (tok.equals("-2")) {
+                            break;
+                        }
+                        int id = parseIntOr(tok, 0);
+                        if (id > 0) {
+                            items.add(id);
+                        }
+                    }
+                    if (items.size() > itemsetPtr.last()) {
+                        itemsetPtr.add(items.size());
+                    }
+                    if (itemsetPtr.size() == itemsetsBefore) {
+                        continue;
+                    }
+                    patternPtr.add(itemsetPtr.size() - 1);
+
+                    int sidAt = tail.indexOf("#SID:");
+                    String supportPart = (sidAt < 0 ? tail : tail.substring(0, sidAt)).trim();
+                    support.add(parseIntOr(supportPart.split("\\s+")[0], 0));
+
+                    long[] words = new long[nWords];
+                    if (sidAt >= 0) {
+                        for (String tok : tail.substring(sidAt + "#SID:".length()).trim().split("\\s+")) {
+                            int sid = parseIntOr(tok, -1);
+                            if (sid >= 0 && sid < nSequences) {
+                                words[sid >>> 6] |= 1L << (sid & 63);
+                            }
+                        }
+                    }
+                    sidWords.addAll(words);
+                }
+            }
+        }
+
+        try (FileChannel out = FileChannel.open(binary, StandardOpenOption.CREATE,
+                StandardOpenOption.TRUNCATE_EXISTING, StandardOpenOption.WRITE)) {
+            ByteBuffer header = ByteBuffer.allocate(40).order(ByteOrder.LITTLE_ENDIAN);
+            header.put(PATTERN_MAGIC)
+                    .putInt(FORMAT_VERSION)
+                    .putInt(nSequences)
+                    .putInt(nWords)
+                    .putLong(support.size())
+                    .putLong(itemsetPtr.size() - 1)
+                    .putLong(items.size());
+            header.flip();
+            writeFully(out, header);
+
+            ByteBuffer chunk = ByteBuffer.allocate(1 << 16).order(ByteOrder.LITTLE_ENDIAN);
+            patternPtr.writeTo(out, chunk);
+            itemsetPtr.writeTo(out, chunk);
+            sidWords.writeTo(out, chunk);
+            support.writeTo(out, chunk);
+            items.writeTo(out, chunk);
+        }
+    }
+
+    private static void checkHeader(ByteBuffer buf, byte[] magic, int headerBytes, Path path) throws IOException {
+        if (buf.limit() < headerBytes) {
+            throw new IOException("truncated binary file: " + path);
+        }
+        for (int i = 0; i < magic.length; i++) {
+            if (buf.get(i) != magic[i]) {
+                throw new IOException("not a " + new String(magic, StandardCharsets.US_ASCII) + " file: " + path);
+            }
+        }
+        if (buf.getInt(4) != FORMAT_VERSION) {
+            throw new IOException("unsupported binary format version " + buf.getInt(4) + ": " + path);
+        }
+    }
+
+    private static int parseIntOr(String tok, int fallback) {
+        try {
+            return Integer.parseInt(tok);
+        } catch (NumberFormatException e) {
+            return fallback;
+        }
+    }
+
+    private static void writeFully(FileChannel out, ByteBuffer buf) throws IOException {
+        while (buf.hasRemaining()) {
+            out.write(buf);
+        }
+    }
+
+    /** Growable int array, written little-endian. */
+    private static final class Ints {
+        private int[] data = new int[1024];
+        private int size;
+
+        void add(int value) {
+            if (size == data.length) {
+                data = Arrays.copyOf(data, size * 2);
+            }
+            data[size++] = value;
+        }
+
+        int size() {
+            return size;
+        }
+
+        void writeTo(FileChannel out, ByteBuffer chunk) throws IOException {
+            for (int i = 0; i < size; i++) {
+                if (chunk.remaining() < 4) {
+                    chunk.flip();
+                    writeFully(out, chunk);
+                    chunk.clear();
+                }
+                chunk.putInt(data[i]);
+            }
+            chunk.flip();
+            writeFully(out, chunk);
+            chunk.clear();
+        }
+    }
+
+    /** Growable long array, written little-endian. */
+    private static final class Longs {
+        private long[] data = new long[1024];
+        private int size;
+
+        void add(long value) {
+            if (size == data.length) {
+                data = Arrays.copyOf(data, size * 2);
+            }
+            data[size++] = value;
+        }
+
+        void addAll(long[] values) {
+            for (long value : values) {
+                add(value);
+            }
+        }
+
+        long last() {
+            return data[size - 1];
+        }
+
+        int size() {
+            return size;
+        }
+
+        void writeTo(FileChannel out, ByteBuffer chunk) throws IOException {
+            for (int i = 0; i < size; i++) {
+                if (chunk.remaining() < 8) {
+                    chunk.flip();
+                    writeFully(out, chunk);
+                    chunk.clear();
+                }
+                chunk.putLong(data[i]);
+            }
+            chunk.flip();
+            writeFully(out, chunk);
+            chunk.clear();
+        }
+    }
+
+    // -------------------------------------------------------------------------
+    // Helpers
+    // -------------------------------------------------------------------------
+
+    private static String mainClassOf(String jarPath) throws Exception {
+        try (JarFile jar = new JarFile(jarPath)) {
+            Manifest manifest = jar.getManifest();
+            if (manifest != null) {
+                String name = manifest.getMainAttributes().getValue("Main-Class");
+                if (name != null && !name.isBlank()) {
+                    return name.trim();
+                }
+            }
+        }
+        return "ca.pfv.spmf.gui.Main";
+    }
+
+    private static String oneLine(Throwable t) {
+        if (t == null) {
+            return "unknown error";
+        }
+        String msg = t.getClass().getName() + ": " + t.getMessage();
+        return msg.replace('\n', ' ').replace('\r', ' ').replace('\t', ' ');
+    }
+}
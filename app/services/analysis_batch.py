@@ -0,0 +1,343 @@
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, as_completed
+from typing import Callable
+
+from .analysis_jobs import INFLIGHT_STALE_S, QueueFullError, analysis_params_hash, cpu_process_pool
+from .analysis_pipeline import run_city_analysis
+from .db import _connect, fetch_histories, run_claim_inflight, run_log_end, run_log_progress, run_log_start
+from .utils import city_key
+
+logger = logging.getLogger(__name__)
+
+# Writes gathered per flush: at most this many, waiting at most this long
+# after the first one arrived (before any transaction is opened).
+DEFAULT_WRITE_BATCH = int(os.getenv("ANALYSIS_BATCH_WRITE_BATCH", "16"))
+DEFAULT_WRITE_LINGER_S = float(os.getenv("ANALYSIS_BATCH_WRITE_LINGER_S", "0.1"))
+# A transaction commits once it has held the write lock this long, so API
+# writers (run_log_progress, upsert_step_cache, ...) get the lock in between.
+DEFAULT_WRITE_TXN_S = float(os.getenv("ANALYSIS_BATCH_WRITE_TXN_S", "0.05"))
+
+
+class CoalescingWriter(Executor):
+    """
+    Single-thread DB writer that commits many submitted writes at once.
+
+    Every submitted fn must accept a `con` keyword: it is called with a shared
+    connection inside an open transaction and must not commit it itself (the
+    analysis upserts in db.py work this way). Each write runs under its own
+    savepoint so a failing one is rolled back alone; futures resolve only
+    after the transaction holding their write committed.
+
+    Writes are gathered without holding any lock, and a transaction commits
+    after at most max_batch writes or txn_s seconds, whichever comes first,
+    followed by a txn_s pause, so other writers to the database (API
+    requests logging progress, the step cache) are never kept waiting long.
+    """
+
+    def __init__(
+        self,
+        max_batch: int = DEFAULT_WRITE_BATCH,
+        linger_s: float = DEFAULT_WRITE_LINGER_S,
+        txn_s: float = DEFAULT_WRITE_TXN_S,
+    ):
+        self.max_batch = max(1, int(max_batch))
+        self.linger_s = max(0.0, float(linger_s))
+        self.txn_s = max(0.0, float(txn_s))
+        self._queue: queue.Queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._loop, name="analysis-batch-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        if self._closed:
+            raise RuntimeError("CoalescingWriter is shut down.")
+        fut: Future = Future()
+        self._queue.put((fut, fn, args, kwargs))
+        return fut
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+        if wait:
+            self._thread.join()
+
+    def _loop(self) -> None:
+        stop = False
+        while not stop:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.time() + self.linger_s
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.time()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+
+    def _flush(self, batch: list) -> None:
+        batch = [item for item in batch if item[0].set_running_or_notify_cancel()]
+        con = _connect()
+        con.isolation_level = None
+        try:
+            while batch:
+                batch = batch[self._commit_some(con, batch):]
+                # SQLite wakes waiting writers by polling, so a lock taken
+                # again right after COMMIT would starve them; leave it free
+                # about as long as it was held.
+                time.sleep(self.txn_s)
+        finally:
+            con.close()
+
+    def _commit_some(self, con, batch: list) -> int:
+        """Commit a leading run of `batch` in one transaction; returns how many writes it took."""
+        t0 = time.time()
+        outcomes = []
+        cur = con.cursor()
+        try:
+            cur.execute("BEGIN IMMEDIATE")
+            for i, (_, fn, args, kwargs) in enumerate(batch):
+                if i > 0 and time.time() - t0 >= self.txn_s:
+                    break
+                cur.execute(f"SAVEPOINT w{i}")
+                try:
+                    outcomes.append((True, fn(*args, con=con, **kwargs)))
+                    cur.execute(f"RELEASE w{i}")
+                except Exception as e:
+                    cur.execute(f"ROLLBACK TO w{i}")
+                    cur.execute(f"RELEASE w{i}")
+                    outcomes.append((False, e))
+            cur.execute("COMMIT")
+        except BaseException as e:
+            if con.in_transaction:
+                cur.execute("ROLLBACK")
+            # The whole transaction is lost, including writes that had succeeded
+            n = max(1, len(outcomes))
+            for fut, *_ in batch[:n]:
+                fut.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return n
+
+        for (fut, *_), (ok, value) in zip(batch, outcomes):
+            if ok:
+                fut.set_result(value)
+            else:
+                fut.set_exception(value)
+        logger.debug(f"BATCH_WRITE n={len(outcomes)} dt_ms={int((time.time() - t0) * 1000)}")
+        return len(outcomes)
+
+
+def _normalize_city(entry) -> tuple[str, str | None]:
+    """(city, country_code) from "Pune", "Pune,IN" or {"city": ..., "country_code": ...}."""
+    if isinstance(entry, dict):
+        city = (entry.get("city") or "").strip()
+        country_code = (entry.get("country_code") or "").strip() or None
+    else:
+        city, _, country_code = str(entry).partition(",")
+        city, country_code = city.strip(), country_code.strip() or None
+    if not city:
+        raise ValueError(f"Invalid city entry: {entry!r}")
+    return city, country_code
+
+
+def run_batch_analysis(
+    cities: list,
+    start: str,
+    end: str,
+    workers: int | None = None,
+    on_city_done: Callable[[dict, int, int], None] | None = None,
+    **analysis_kwargs,
+) -> dict:
+    """
+    Run run_city_analysis() over many cities and summarize the batch.
+
+    Histories are fetched with one query up front. `workers` pipelines run
+    at a time (default: one per core) on threads, their triclustering steps
+    share a process pool of the same size, and their analysis_daily /
+    analysis_monthly writes go through one CoalescingWriter. A failing city
+    is recorded in the summary and does not stop the others.
+
+    Each city is claimed like a single /analyse/<city> request (see
+    db.run_claim_inflight): a city with an identical run already queued or
+    running elsewhere is not analysed again, and its summary has status
+    "attached" and that run's run_id.
+    on_city_done(city_summary, done, total) is called as each city finishes.
+    """
+    entries = [_normalize_city(c) for c in cities]
+    keys = [city_key(city, cc) for city, cc in entries]
+    workers = max(1, int(workers or os.cpu_count() or 1))
+
+    t0 = time.time()
+    histories = fetch_histories(keys)
+    fetch_ms = int((time.time() - t0) * 1000)
+    logger.info(f"BATCH_START cities={len(entries)} workers={workers} fetch_ms={fetch_ms}")
+
+    cpu = cpu_process_pool(workers)
+    writer = CoalescingWriter()
+
+    def _run_one(city: str, country_code: str | None, key: str) -> dict:
+        run_id = uuid.uuid4().hex
+        c0 = time.time()
+        summary = {"city": city, "country_code": country_code, "city_key": key, "run_id": run_id}
+        try:
+            existing = run_claim_inflight(
+                run_id,
+                endpoint="/analyse/batch",
+                city=key,
+                params={"city": city, "country_code": country_code, "start": start, "end": end, **analysis_kwargs},
+                params_hash=analysis_params_hash(key, start, end, analysis_kwargs),
+                data_start=start,
+                data_end=end,
+                stale_after_s=INFLIGHT_STALE_S,
+            )
+        except Exception as e:
+            logger.warning(f"BATCH_CLAIM failed city={key} err={e}")
+            summary.update(status="error", error=str(e), duration_ms=int((time.time() - c0) * 1000))
+            return summary
+        if existing is not None:
+            logger.info(f"BATCH_ATTACHED city={key} run_id={existing}")
+            summary.update(status="attached", run_id=existing, duration_ms=int((time.time() - c0) * 1000))
+            return summary
+
+        try:
+            out = run_city_analysis(
+                city=city,
+                country_code=country_code,
+                start=start,
+                end=end,
+                run_id=run_id,
+                cpu_executor=cpu,
+                hist=histories[key],
+                db_writer=writer,
+                **analysis_kwargs,
+            )
+            summary.update(
+                status="ok",
+                city_key=out.get("city_key", key),
+                step_timings_ms=out.get("step_timings_ms"),
+                step_cache_hits=out.get("step_cache_hits"),
+            )
+        except Exception as e:
+            # run_city_analysis already logged it and marked the run as error
+            summary.update(status="error", error=str(e))
+        summary["duration_ms"] = int((time.time() - c0) * 1000)
+        return summary
+
+    results = [None] * len(entries)
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analysis-batch") as threads:
+            futures = {
+                threads.submit(_run_one, city, cc, key): i
+                for i, ((city, cc), key) in enumerate(zip(entries, keys))
+            }
+            for done, fut in enumerate(as_completed(futures), start=1):
+                results[futures[fut]] = fut.result()
+                if on_city_done is not None:
+                    on_city_done(results[futures[fut]], done, len(entries))
+    finally:
+        writer.shutdown(wait=True)
+        cpu.shutdown(wait=True)
+
+    wall_s = time.time() - t0
+    n_ok = sum(r["status"] == "ok" for r in results)
+    n_attached = sum(r["status"] == "attached" for r in results)
+    summary = {
+        "n_cities": len(entries),
+        "ok": n_ok,
+        "attached": n_attached,
+        "failed": len(entries) - n_ok - n_attached,
+        "workers": workers,
+        "fetch_histories_ms": fetch_ms,
+        "wall_ms": int(wall_s * 1000),
+        "cities_per_minute": round(len(entries) / (wall_s / 60.0), 2) if wall_s > 0 else None,
+        "cities": results,
+    }
+    logger.info(
+        f"BATCH_END cities={len(entries)} ok={n_ok} attached={n_attached} failed={summary['failed']} "
+        f"wall_ms={summary['wall_ms']} cities_per_minute={summary['cities_per_minute']}"
+    )
+    return summary
+
+
+# -----------------------------------------------------------------------------
+# Background batches for POST /analyse/batch
+# -----------------------------------------------------------------------------
+
+_BATCHES = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analysis-batch-job")
+_BATCH_LOCK = threading.Lock()
+_batch_pending = False
+
+
+def submit_batch_analysis(cities: list, start: str, end: str, **kwargs) -> str:
+    """
+    Queue run_batch_analysis() in the background and return its batch id.
+
+    The batch is logged in execution_runs under that id, with progress as
+    cities finish and the summary as its result, so GET /runs/<id> reports
+    it. Only one batch runs at a time; QueueFullError while one is pending.
+    """
+    global _batch_pending
+    entries = [_normalize_city(c) for c in cities]
+    if not entries:
+        raise ValueError("cities must not be empty.")
+
+    with _BATCH_LOCK:
+        if _batch_pending:
+            raise QueueFullError("An analysis batch is already running; retry later.")
+        _batch_pending = True
+
+    batch_id = uuid.uuid4().hex
+    params = {
+        "cities": [{"city": c, "country_code": cc} for c, cc in entries],
+        "start": start,
+        "end": end,
+        **kwargs,
+    }
+    try:
+        run_log_start(batch_id, endpoint="/analyse/batch", city=f"batch({len(entries)})",
+                      params=params, status="queued")
+        _BATCHES.submit(_run_batch_job, batch_id, params)
+    except BaseException:
+        with _BATCH_LOCK:
+            _batch_pending = False
+        raise
+    return batch_id
+
+
+def _run_batch_job(batch_id: str, params: dict) -> None:
+    global _batch_pending
+    t0 = time.time()
+    counts = {"ok": 0, "attached": 0, "failed": 0}
+
+    def _progress(city_summary: dict, done: int, total: int) -> None:
+        status = city_summary["status"]
+        counts[status if status in counts else "failed"] += 1
+        try:
+            run_log_progress(batch_id, {"done": done, "total": total, **counts})
+        except Exception as e:
+            logger.warning(f"BATCH_PROGRESS write failed: {e}")
+
+    try:
+        run_log_start(batch_id, endpoint="/analyse/batch", city=f"batch({len(params['cities'])})", params=params)
+        summary = run_batch_analysis(on_city_done=_progress, **params)
+        run_log_end(batch_id, status="ok", duration_ms=summary["wall_ms"], result=summary)
+    except Exception as e:
+        logger.exception(f"BATCH_FAILED batch_id={batch_id} err={e}")
+        run_log_end(batch_id, status="error", duration_ms=int((time.time() - t0) * 1000), error=str(e))
+    finally:
+        with _BATCH_LOCK:
+            _batch_pending = False
@@ -1,6 +1,8 @@
 import numpy as np
 import pandas as pd
 
+from .trihspam_cube import CODE_DTYPE, MISSING_CODE, TriHSPAMCube, encode_categories
+
 P_YEAR = 365.25
 
 NUMERIC_FEATURES_V1 = [
@@ -23,52 +25,42 @@ SYMBOLIC_FEATURES_V1 = [
 
 FEATURE_COLUMNS_V1 = NUMERIC_FEATURES_V1 + SYMBOLIC_FEATURES_V1
 
+# Columns of the legacy analysis_daily table
+ANALYSIS_DAILY_COLUMNS = [
+    "date",
+    "tmin",
+    "tmax",
+    "tavg",
+    "diurnal_range",
+    "delta_1",
+    "delta_7",
+    "roll_mean_7",
+    "roll_std_7",
+    "doy_sin",
+    "doy_cos",
+    "time_idx",
+    "anomaly_z",
+]
 
-def build_daily_analysis_features(hist: pd.DataFrame) -> pd.DataFrame:
-    # expects: date,tmin,tmax,tavg
-    df = hist.copy()
-    df["date"] = pd.to_datetime(df["date"])
-    df = df.sort_values("date")
-
-    # regularize daily
-    idx = pd.date_range(df["date"].min(), df["date"].max(), freq="D")
-    df = df.set_index("date").reindex(idx)
-    df.index.name = "date"
-
-    # fill small gaps
-    for c in ["tmin", "tmax", "tavg"]:
-        df[c] = df[c].astype(float).interpolate(limit_direction="both").ffill().bfill()
-
-    df["diurnal_range"] = df["tmax"] - df["tmin"]
-    df["delta_1"] = df["tavg"].diff(1)
-    df["delta_7"] = df["tavg"].diff(7)
-
-    df["roll_mean_7"] = df["tavg"].rolling(7).mean()
-    df["roll_std_7"] = df["tavg"].rolling(7).std()
-
-    doy = df.index.dayofyear.astype(float)
-    df["doy_sin"] = np.sin(2 * np.pi * doy / P_YEAR)
-    df["doy_cos"] = np.cos(2 * np.pi * doy / P_YEAR)
+# Columns of the TriHSPAM daily table: the analysis_daily ones plus symbolic features
+DAILY_FEATURE_COLUMNS = ANALYSIS_DAILY_COLUMNS + SYMBOLIC_FEATURES_V1
 
-    t0 = df.index.min()
-    df["time_idx"] = (df.index - t0).days.astype(float) / P_YEAR
 
-    # anomaly z-score relative to day-of-year climatology
-    tmp = df[["tavg"]].copy()
-    tmp["doy"] = df.index.dayofyear
-    clim = tmp.groupby("doy")["tavg"].agg(["mean", "std"]).rename(columns={"mean": "mu", "std": "sd"})
-    df["anomaly_z"] = [
-        0.0 if clim.loc[d, "sd"] == 0 or np.isnan(clim.loc[d, "sd"])
-        else float((df.loc[dt, "tavg"] - clim.loc[d, "mu"]) / clim.loc[d, "sd"])
-        for dt, d in zip(df.index, df.index.dayofyear)
-    ]
+def _doy_anomaly_z(values: pd.Series) -> pd.Series:
+    """
+    Z-score of each value against the day-of-year climatology of the series
+    (mean / std of all values sharing its day of year). Days whose std is 0
+    or undefined (a single year of data) get 0.0. Needs a DatetimeIndex.
+    """
+    by_doy = values.groupby(values.index.dayofyear)
+    mu = by_doy.transform("mean")
+    sd = by_doy.transform("std")
+    return ((values - mu) / sd).where(sd.notna() & (sd != 0), 0.0)
 
-    out = df.reset_index()
-    out["date"] = out["date"].dt.date.astype(str)
 
-    # drop early NaNs from rolling/diff
-    out = out.dropna()
-    return out
+def build_daily_analysis_features(hist: pd.DataFrame) -> pd.DataFrame:
+    # expects: date,tmin,tmax,tavg
+    return analysis_daily_view(build_daily_feature_frame(hist))
 
 
 def build_monthly_analysis(daily_feat: pd.DataFrame) -> pd.DataFrame:
@@ -143,6 +135,19 @@ def build_enriched_daily_features(hist: pd.DataFrame) -> pd.DataFrame:
 
     Returns a dataframe with both numeric and symbolic features.
     """
+    return trihspam_daily_view(build_daily_feature_frame(hist))
+
+
+def build_daily_feature_frame(hist: pd.DataFrame) -> pd.DataFrame:
+    """
+    Daily feature frame both analysis paths project from, computed once.
+
+    Holds every column of DAILY_FEATURE_COLUMNS plus a boolean "warmup"
+    column marking the first days, whose rolling/diff features had no full
+    window yet and were filled in. analysis_daily_view() drops those days
+    (the legacy analysis_daily table never had them); trihspam_daily_view()
+    keeps them.
+    """
     _validate_required_columns(hist, ["date", "tmin", "tmax", "tavg"])
 
     df = hist.copy()
@@ -181,18 +186,9 @@ def build_enriched_daily_features(hist: pd.DataFrame) -> pd.DataFrame:
     df["time_idx"] = (df.index - t0).days.astype(float) / P_YEAR
 
     # anomaly z-score relative to day-of-year climatology
-    tmp = pd.DataFrame({"tavg": df["tavg"], "doy": df.index.dayofyear}, index=df.index)
-    clim = tmp.groupby("doy")["tavg"].agg(["mean", "std"]).rename(columns={"mean": "mu", "std": "sd"})
-
-    anomaly_vals = []
-    for dt, d in zip(df.index, df.index.dayofyear):
-        mu = clim.loc[d, "mu"]
-        sd = clim.loc[d, "sd"]
-        if pd.isna(sd) or sd == 0:
-            anomaly_vals.append(0.0)
-        else:
-            anomaly_vals.append(float((df.loc[dt, "tavg"] - mu) / sd))
-    df["anomaly_z"] = anomaly_vals
+    df["anomaly_z"] = _doy_anomaly_z(df["tavg"])
+
+    df["warmup"] = df[["delta_1", "delta_7", "roll_mean_7", "roll_std_7"]].isna().any(axis=1)
 
     # Fill early rolling/diff NaNs after deriving stable features
     df["delta_1"] = df["delta_1"].fillna(0.0)
@@ -219,29 +215,17 @@ def build_enriched_daily_features(hist: pd.DataFrame) -> pd.DataFrame:
 
     out = df.reset_index()
     out["date"] = out["date"].dt.strftime("%Y-%m-%d")
+    return out[DAILY_FEATURE_COLUMNS + ["warmup"]]
+
+
+def analysis_daily_view(frame: pd.DataFrame) -> pd.DataFrame:
+    """Legacy analysis_daily rows of a build_daily_feature_frame() frame: no warmup days."""
+    return frame.loc[~frame["warmup"], ANALYSIS_DAILY_COLUMNS]
 
-    ordered_cols = [
-        "date",
-        "tmin",
-        "tmax",
-        "tavg",
-        "diurnal_range",
-        "delta_1",
-        "delta_7",
-        "roll_mean_7",
-        "roll_std_7",
-        "doy_sin",
-        "doy_cos",
-        "time_idx",
-        "anomaly_z",
-        "temp_band",
-        "trend_class",
-        "anomaly_class",
-        "diurnal_band",
-        "season_class",
-    ]
-    available_cols = [c for c in ordered_cols if c in out.columns]
-    return out[available_cols].copy()
+
+def trihspam_daily_view(frame: pd.DataFrame) -> pd.DataFrame:
+    """TriHSPAM daily table of a build_daily_feature_frame() frame: every day, symbolic features included."""
+    return frame[DAILY_FEATURE_COLUMNS].copy()
 
 
 def build_weather_windows(
@@ -255,6 +239,38 @@ def build_weather_windows(
     Returns:
         windows_meta: list of metadata dicts
         windows_df: long-form dataframe with one row per day within each window
+
+    The long form repeats every day once per window that covers it; the
+    pipeline itself uses build_weather_window_views(), and this is kept for
+    debugging and inspection.
+    """
+    views = build_weather_window_views(daily_df, window_size=window_size, stride=stride)
+    return views["windows_meta"], windows_df_from_views(views)
+
+
+def build_weather_window_views(
+    daily_df: pd.DataFrame,
+    window_size: int = 30,
+    stride: int = 7,
+    first_window_id: int = 0,
+) -> dict:
+    """
+    Rolling weather windows as views over the daily table, without copying it
+    once per window.
+
+    Returns:
+        {
+            "daily_df": date-sorted daily dataframe the windows index into,
+            "days": (n_windows, window_size) read-only view of row positions
+                    in daily_df; row w is window w,
+            "window_ids": [first_window_id, first_window_id + 1, ...],
+            "windows_meta": metadata dicts as in build_weather_windows(),
+            "window_size": window_size,
+            "stride": stride,
+        }
+
+    window_values() gives the same (n_windows, window_size) view over any
+    1-D array aligned with daily_df.
     """
     if window_size <= 0:
         raise ValueError("window_size must be positive.")
@@ -272,38 +288,55 @@ def build_weather_windows(
             f"Not enough rows to create one weather window: have {len(df)}, need at least {window_size}."
         )
 
-    windows_meta: list[dict] = []
-    window_frames: list[pd.DataFrame] = []
-
-    for start_idx in range(0, len(df) - window_size + 1, stride):
-        end_idx = start_idx + window_size
-        window_id = len(windows_meta)
-        window_slice = df.iloc[start_idx:end_idx].copy().reset_index(drop=True)
-        center_idx = int(window_size // 2)
-
-        windows_meta.append(
-            {
-                "window_id": window_id,
-                "start_date": window_slice.loc[0, "date"].strftime("%Y-%m-%d"),
-                "end_date": window_slice.loc[window_size - 1, "date"].strftime("%Y-%m-%d"),
-                "center_date": window_slice.loc[center_idx, "date"].strftime("%Y-%m-%d"),
-            }
+    days = window_values(np.arange(len(df), dtype=np.int64), window_size, stride)
+    window_ids = list(range(first_window_id, first_window_id + len(days)))
+
+    dates = df["date"].to_numpy(dtype="datetime64[ns]")
+    day_strings = pd.DatetimeIndex(dates).strftime("%Y-%m-%d").to_numpy()
+    starts = days[:, 0]
+    windows_meta = [
+        {
+            "window_id": wid,
+            "start_date": start_date,
+            "end_date": end_date,
+            "center_date": center_date,
+        }
+        for wid, start_date, end_date, center_date in zip(
+            window_ids,
+            day_strings[starts].tolist(),
+            day_strings[starts + window_size - 1].tolist(),
+            day_strings[starts + window_size // 2].tolist(),
         )
+    ]
 
-        window_slice["window_id"] = window_id
-        window_slice["context_idx"] = np.arange(window_size, dtype=int)
-        window_frames.append(window_slice)
+    return {
+        "daily_df": df,
+        "days": days,
+        "window_ids": window_ids,
+        "windows_meta": windows_meta,
+        "window_size": int(window_size),
+        "stride": int(stride),
+    }
 
-    if not window_frames:
-        raise ValueError("No weather windows were generated from the provided dataframe.")
 
-    windows_df = pd.concat(window_frames, ignore_index=True)
+def window_values(values: np.ndarray, window_size: int, stride: int) -> np.ndarray:
+    """Read-only (n_windows, window_size) view of a 1-D array: windows start every `stride` items."""
+    return np.lib.stride_tricks.sliding_window_view(values, window_size)[::stride]
+
+
+def windows_df_from_views(views: dict) -> pd.DataFrame:
+    """Long-form windows_df (one row per window day) for the windows in `views`."""
+    days = views["days"]
+    n_windows, window_size = days.shape
+
+    windows_df = views["daily_df"].iloc[days.ravel()].reset_index(drop=True)
     windows_df["date"] = windows_df["date"].dt.strftime("%Y-%m-%d")
+    windows_df["window_id"] = np.repeat(np.asarray(views["window_ids"], dtype=int), window_size)
+    windows_df["context_idx"] = np.tile(np.arange(window_size, dtype=int), n_windows)
 
     first_cols = ["window_id", "context_idx", "date"]
     remaining_cols = [c for c in windows_df.columns if c not in first_cols]
-    windows_df = windows_df[first_cols + remaining_cols]
-    return windows_meta, windows_df
+    return windows_df[first_cols + remaining_cols]
 
 
 def build_trihspam_cube(
@@ -319,81 +352,189 @@ def build_trihspam_cube(
     Returned cube shape:
         (n_features, n_windows, window_size)
 
-    Mixed-type data is stored using object dtype.
+    The cube is a TriHSPAMCube: numeric features in a float64 block and
+    symbolic features as int16 category codes.
     """
     if window_size <= 0:
         raise ValueError("window_size must be positive.")
 
     required = ["window_id", "context_idx", "date"] + list(feature_columns)
     _validate_required_columns(windows_df, required)
+    numeric_feature_indices, symbolic_feature_indices = _feature_indices(
+        feature_columns, numeric_features, symbolic_features
+    )
+
+    if windows_df.empty:
+        raise ValueError("No windows found in windows_df.")
+
+    # One sort by (window_id, context_idx); every column then reshapes to
+    # (n_windows, window_size) in that order.
+    window_col = windows_df["window_id"].to_numpy()
+    context_col = windows_df["context_idx"].to_numpy()
+    order = np.lexsort((context_col, window_col))
+    window_col = window_col[order]
+
+    window_ids, window_counts = np.unique(window_col, return_counts=True)
+    bad = window_counts != window_size
+    if bad.any():
+        raise ValueError(
+            f"Each window must contain exactly {window_size} context positions. "
+            f"Bad windows: {window_ids[bad][:10].tolist()}"
+        )
+
+    n_windows = len(window_ids)
+    contexts = context_col[order].reshape(n_windows, window_size)
+    bad = (contexts != np.arange(window_size)).any(axis=1)
+    if bad.any():
+        raise ValueError(
+            f"Window {window_ids[bad][0]} has invalid context indices; expected 0..{window_size - 1}."
+        )
+
+    shape = (n_windows, window_size)
+    numeric_block = np.empty((len(numeric_features), n_windows, window_size), dtype=float)
+    for local, feature in enumerate(numeric_features):
+        numeric_block[local] = _numeric_values(windows_df[feature])[order].reshape(shape)
+
+    symbolic_block = np.empty((len(symbolic_features), n_windows, window_size), dtype="<U1")
+    if symbolic_features:
+        symbolic_block = np.stack([
+            _symbolic_labels(windows_df[feature])[order].reshape(shape) for feature in symbolic_features
+        ])
+
+    cube = TriHSPAMCube.from_blocks(
+        feature_columns=list(feature_columns),
+        numeric_feature_indices=numeric_feature_indices,
+        symbolic_feature_indices=symbolic_feature_indices,
+        numeric=numeric_block,
+        symbolic_values=symbolic_block,
+    )
+
+    dates = pd.to_datetime(windows_df["date"], errors="coerce").to_numpy(dtype="datetime64[ns]")
+    return _cube_info(
+        cube=cube,
+        window_ids=window_ids.tolist(),
+        dates=dates[order].reshape(shape),
+        feature_columns=feature_columns,
+        numeric_features=numeric_features,
+        symbolic_features=symbolic_features,
+        window_size=window_size,
+    )
+
+
+def build_trihspam_cube_from_views(
+    views: dict,
+    feature_columns: list[str],
+    numeric_features: list[str],
+    symbolic_features: list[str],
+) -> dict:
+    """
+    build_trihspam_cube() straight from build_weather_window_views(): each
+    daily column is converted once and windowed through a view, so the only
+    copy is the cube itself. Symbolic columns are encoded per day (over the
+    days some window covers) before windowing.
+    """
+    daily_df = views["daily_df"]
+    days = views["days"]
+    window_size, stride = views["window_size"], views["stride"]
+
+    _validate_required_columns(daily_df, list(feature_columns))
+    numeric_feature_indices, symbolic_feature_indices = _feature_indices(
+        feature_columns, numeric_features, symbolic_features
+    )
+
+    n_windows = len(days)
+    numeric_block = np.empty((len(numeric_features), n_windows, window_size), dtype=float)
+    for local, feature in enumerate(numeric_features):
+        numeric_block[local] = window_values(_numeric_values(daily_df[feature]), window_size, stride)
+
+    covered = np.zeros(len(daily_df), dtype=bool)
+    covered[days.ravel()] = True
+    codes = np.empty((len(symbolic_features), n_windows, window_size), dtype=CODE_DTYPE)
+    vocabularies = []
+    for local, feature in enumerate(symbolic_features):
+        daily_codes = np.full(len(daily_df), MISSING_CODE, dtype=CODE_DTYPE)
+        daily_codes[covered], vocab = encode_categories(_symbolic_labels(daily_df[feature])[covered])
+        codes[local] = window_values(daily_codes, window_size, stride)
+        vocabularies.append(vocab)
+
+    cube = TriHSPAMCube.from_codes(
+        feature_columns=list(feature_columns),
+        numeric_feature_indices=numeric_feature_indices,
+        symbolic_feature_indices=symbolic_feature_indices,
+        numeric=numeric_block,
+        codes=codes,
+        vocabularies=vocabularies,
+    )
 
+    return _cube_info(
+        cube=cube,
+        window_ids=list(views["window_ids"]),
+        dates=window_values(daily_df["date"].to_numpy(dtype="datetime64[ns]"), window_size, stride),
+        feature_columns=feature_columns,
+        numeric_features=numeric_features,
+        symbolic_features=symbolic_features,
+        window_size=window_size,
+    )
+
+
+def _feature_indices(
+    feature_columns: list[str],
+    numeric_features: list[str],
+    symbolic_features: list[str],
+) -> tuple[list[int], list[int]]:
     invalid_numeric = [c for c in numeric_features if c not in feature_columns]
     invalid_symbolic = [c for c in symbolic_features if c not in feature_columns]
     if invalid_numeric:
         raise ValueError(f"Numeric features not present in feature_columns: {invalid_numeric}")
     if invalid_symbolic:
         raise ValueError(f"Symbolic features not present in feature_columns: {invalid_symbolic}")
+    return (
+        [feature_columns.index(f) for f in numeric_features],
+        [feature_columns.index(f) for f in symbolic_features],
+    )
 
-    df = windows_df.copy()
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")
-    df = df.sort_values(["window_id", "context_idx"]).reset_index(drop=True)
 
-    window_ids = sorted(df["window_id"].drop_duplicates().tolist())
-    if not window_ids:
-        raise ValueError("No windows found in windows_df.")
+def _numeric_values(column: pd.Series) -> np.ndarray:
+    return pd.to_numeric(column, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
 
-    counts = df.groupby("window_id")["context_idx"].nunique().to_dict()
-    bad_windows = [wid for wid, n in counts.items() if n != window_size]
-    if bad_windows:
-        raise ValueError(
-            f"Each window must contain exactly {window_size} context positions. Bad windows: {bad_windows[:10]}"
-        )
 
-    n_features = len(feature_columns)
-    n_windows = len(window_ids)
-    cube = np.empty((n_features, n_windows, window_size), dtype=object)
-
-    window_id_to_idx = {wid: idx for idx, wid in enumerate(window_ids)}
-
-    for wid in window_ids:
-        w_idx = window_id_to_idx[wid]
-        chunk = df[df["window_id"] == wid].sort_values("context_idx")
-        contexts = chunk["context_idx"].to_numpy()
-        expected_contexts = np.arange(window_size)
-        if len(contexts) != window_size or not np.array_equal(contexts, expected_contexts):
-            raise ValueError(f"Window {wid} has invalid context indices; expected 0..{window_size - 1}.")
-
-        for f_idx, feature in enumerate(feature_columns):
-            values = chunk[feature]
-            if feature in numeric_features:
-                numeric_vals = pd.to_numeric(values, errors="coerce").astype(float).to_numpy()
-                cube[f_idx, w_idx, :] = numeric_vals
-            else:
-                symbolic_vals = values.fillna("missing").astype(str).to_numpy()
-                cube[f_idx, w_idx, :] = symbolic_vals
-
-    numeric_feature_indices = [feature_columns.index(f) for f in numeric_features]
-    symbolic_feature_indices = [feature_columns.index(f) for f in symbolic_features]
-
-    meta_df = (
-        df.groupby("window_id", as_index=False)
-        .agg(start_date=("date", "min"), end_date=("date", "max"))
-        .sort_values("window_id")
-        .reset_index(drop=True)
-    )
-    meta_df["center_date"] = meta_df.apply(
-        lambda r: r["start_date"] + (r["end_date"] - r["start_date"]) / 2,
-        axis=1,
-    )
+def _symbolic_labels(column: pd.Series) -> np.ndarray:
+    return column.fillna("missing").astype(str).to_numpy(dtype=str)
+
+
+def _cube_info(
+    cube: TriHSPAMCube,
+    window_ids: list[int],
+    dates: np.ndarray,
+    feature_columns: list[str],
+    numeric_features: list[str],
+    symbolic_features: list[str],
+    window_size: int,
+) -> dict:
+    """cube_info dict for a built cube; dates is (n_windows, window_size) datetime64[ns]."""
+    # First / last / midpoint date of each window, ignoring unparseable dates
+    nat = np.isnat(dates)
+    ns = dates.view(np.int64)
+    start_ns = np.where(nat, np.iinfo(np.int64).max, ns).min(axis=1)
+    end_ns = np.where(nat, np.iinfo(np.int64).min, ns).max(axis=1)
+    center_ns = start_ns + (end_ns - start_ns) // 2
+    all_nat = nat.all(axis=1)
+
+    def _day_strings(values_ns: np.ndarray) -> list[str]:
+        values = values_ns.view("datetime64[ns]").copy()
+        values[all_nat] = np.datetime64("NaT")
+        return pd.DatetimeIndex(values).strftime("%Y-%m-%d").tolist()
 
     windows_meta = [
         {
-            "window_id": int(row.window_id),
-            "start_date": pd.Timestamp(row.start_date).strftime("%Y-%m-%d"),
-            "end_date": pd.Timestamp(row.end_date).strftime("%Y-%m-%d"),
-            "center_date": pd.Timestamp(row.center_date).strftime("%Y-%m-%d"),
+            "window_id": int(wid),
+            "start_date": start_date,
+            "end_date": end_date,
+            "center_date": center_date,
         }
-        for row in meta_df.itertuples(index=False)
+        for wid, start_date, end_date, center_date in zip(
+            window_ids, _day_strings(start_ns), _day_strings(end_ns), _day_strings(center_ns)
+        )
     ]
 
     return {
@@ -401,10 +542,10 @@ def build_trihspam_cube(
         "feature_columns": list(feature_columns),
         "numeric_features": list(numeric_features),
         "symbolic_features": list(symbolic_features),
-        "numeric_feature_indices": numeric_feature_indices,
-        "symbolic_feature_indices": symbolic_feature_indices,
+        "numeric_feature_indices": [feature_columns.index(f) for f in numeric_features],
+        "symbolic_feature_indices": [feature_columns.index(f) for f in symbolic_features],
         "windows_meta": windows_meta,
         "window_ids": window_ids,
-        "n_windows": n_windows,
+        "n_windows": len(window_ids),
         "window_size": window_size,
-    }
\ No newline at end of file
+    }
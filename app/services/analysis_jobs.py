@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .analysis_pipeline import run_city_analysis
+from .db import run_claim_inflight, run_log_end, upsert_insights_cache
+from .spmf_worker import get_spmf_pool
+from .triclustering import DEFAULT_SPMF_WORKERS
+from .trihspam_engine import _default_jar_path
+from .utils import city_key
+
+logger = logging.getLogger(__name__)
+
+# Threads running whole pipelines: most of a run waits on the network,
+# SQLite or the SPMF JVMs.
+DEFAULT_JOB_WORKERS = int(os.getenv("ANALYSIS_JOB_WORKERS", "2"))
+# Jobs (running + waiting) accepted before submit() pushes back.
+DEFAULT_MAX_QUEUE = int(os.getenv("ANALYSIS_MAX_QUEUE", "16"))
+# Processes for the CPU-bound triclustering step; 0 keeps it in the job thread.
+DEFAULT_CPU_WORKERS = int(os.getenv("ANALYSIS_CPU_WORKERS", str(min(4, os.cpu_count() or 1))))
+# A queued/running run older than this no longer blocks identical requests
+# (its worker process most likely died without marking it finished).
+INFLIGHT_STALE_S = float(os.getenv("ANALYSIS_INFLIGHT_STALE_S", str(6 * 3600)))
+
+
+def analysis_params_hash(key: str, start: str, end: str, params: dict) -> str:
+    """Canonical hash of one analysis request; identical requests share a run."""
+    canonical = json.dumps(
+        {"city_key": key, "start": start, "end": end, **params},
+        sort_keys=True, separators=(",", ":"), default=str,
+    )
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def cpu_process_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Process pool for triclustering steps. SPMF worker pools are per process,
+    so each pool process boots its own SPMF_WORKERS JVMs as it starts rather
+    than on its first SPMF job.
+    """
+    # spawn: forking a process that runs threads can copy held locks
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=prewarm_spmf_pool,
+    )
+
+
+def prewarm_spmf_pool() -> None:
+    """Start this process's SPMF worker pool, if SPMF_WORKERS asks for one."""
+    if DEFAULT_SPMF_WORKERS <= 0:
+        return
+    try:
+        pool = get_spmf_pool(_default_jar_path(), DEFAULT_SPMF_WORKERS)
+        logger.info(f"SPMF worker pool ready size={pool.size} pid={os.getpid()}")
+    except Exception as e:
+        logger.warning(f"SPMF worker pool prewarm failed: {e}")
+
+
+def _noop() -> None:
+    pass
+
+
+class QueueFullError(RuntimeError):
+    """Raised by AnalysisJobQueue.submit() when max_queue jobs are already pending."""
+
+
+class AnalysisJobQueue:
+    """
+    Bounded background executor for run_city_analysis().
+
+    submit() records the run in execution_runs as "queued" and returns its
+    run_id straight away; a job thread then runs the pipeline under that
+    run_id, which moves the row to running / ok / error and keeps its
+    progress_json current (see db.fetch_run). Triclustering is handed to a
+    process pool so concurrent jobs do not contend for the GIL.
+
+    Submissions are single-flight per (city_key, params hash): a request
+    identical to one already queued or running gets that run's run_id back
+    instead of starting a second pipeline. Within this process the in-flight
+    map answers directly; across worker processes the queued/running
+    execution_runs row of the identical run is the lock (see db.run_claim_inflight).
+    """
+
+    def __init__(
+        self,
+        workers: int = DEFAULT_JOB_WORKERS,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        cpu_workers: int = DEFAULT_CPU_WORKERS,
+    ):
+        if workers <= 0:
+            raise ValueError("workers must be positive.")
+        if max_queue < workers:
+            raise ValueError("max_queue must be at least workers.")
+
+        self.workers = int(workers)
+        self.max_queue = int(max_queue)
+        self.cpu_workers = max(0, int(cpu_workers))
+
+        self._threads = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="analysis-job")
+        self._cpu: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._inflight: dict[tuple[str, str], str] = {}
+
+    @property
+    def depth(self) -> int:
+        """Jobs queued or running."""
+        with self._lock:
+            return self._pending
+
+    def submit(self, city: str, country_code: str | None, start: str, end: str, **kwargs) -> tuple[str, bool]:
+        """
+        Queue run_city_analysis(city, country_code, start, end, **kwargs).
+
+        Returns (run_id, attached); attached is True when an identical run was
+        already in flight and its run_id is returned instead of a new one.
+        """
+        key = city_key(city, country_code)
+        flight = (key, analysis_params_hash(key, start, end, kwargs))
+
+        with self._lock:
+            if flight in self._inflight:
+                run_id = self._inflight[flight]
+                logger.info(f"JOB_ATTACHED run_id={run_id} city={city}")
+                return run_id, True
+            if self._pending >= self.max_queue:
+                raise QueueFullError(
+                    f"Analysis queue is full ({self._pending} jobs pending); retry later."
+                )
+            self._pending += 1
+
+        run_id = uuid.uuid4().hex
+        params = {"city": city, "country_code": country_code, "start": start, "end": end, **kwargs}
+        try:
+            existing = run_claim_inflight(
+                run_id,
+                endpoint="/analyse/<city>",
+                city=key,
+                params=params,
+                params_hash=flight[1],
+                data_start=start,
+                data_end=end,
+                stale_after_s=INFLIGHT_STALE_S,
+            )
+        except BaseException:
+            self._release(None)
+            raise
+
+        if existing is not None:
+            # Claimed by another worker process; its run is the shared result
+            self._release(None)
+            logger.info(f"JOB_ATTACHED run_id={existing} city={city}")
+            return existing, True
+
+        with self._lock:
+            self._inflight[flight] = run_id
+        try:
+            self._threads.submit(self._run, run_id, flight, params)
+        except BaseException as e:
+            self._release(flight)
+            run_log_end(run_id, status="error", duration_ms=0, error=str(e))
+            upsert_insights_cache(key, run_id, start, end, status="error", error=str(e), version=2)
+            raise
+
+        logger.info(f"JOB_QUEUED run_id={run_id} city={city} depth={self.depth}")
+        return run_id, False
+
+    def _run(self, run_id: str, flight: tuple[str, str], params: dict) -> None:
+        cpu = self._cpu_executor()
+        try:
+            run_city_analysis(run_id=run_id, cpu_executor=cpu, **params)
+        except BrokenProcessPool as e:
+            # A pool process died (e.g. OOM-killed mid-mine): this run fails,
+            # later ones get a fresh pool
+            logger.warning(f"JOB_FAILED run_id={run_id} cpu pool broken, replacing it: {e}")
+            self._discard_cpu_executor(cpu)
+        except Exception as e:
+            # run_city_analysis already logged it and marked the run as error
+            logger.debug(f"JOB_FAILED run_id={run_id} err={e}")
+        finally:
+            self._release(flight)
+
+    def _release(self, flight: tuple[str, str] | None) -> None:
+        with self._lock:
+            self._pending -= 1
+            if flight is not None:
+                self._inflight.pop(flight, None)
+
+    def _cpu_executor(self) -> ProcessPoolExecutor | None:
+        if self.cpu_workers == 0:
+            return None
+        with self._lock:
+            if self._cpu is None:
+                self._cpu = cpu_process_pool(self.cpu_workers)
+            return self._cpu
+
+    def _discard_cpu_executor(self, cpu: ProcessPoolExecutor | None) -> None:
+        with self._lock:
+            if cpu is None or self._cpu is not cpu:
+                return  # already replaced by another job that hit the same pool
+            self._cpu = None
+        cpu.shutdown(wait=False, cancel_futures=True)
+
+    def prewarm(self) -> None:
+        """
+        Boot the SPMF JVMs where triclustering will run: in the pool processes
+        (started now, each prewarming its own), or in this process without them.
+        """
+        cpu = self._cpu_executor()
+        if cpu is None:
+            prewarm_spmf_pool()
+            return
+        for fut in [cpu.submit(_noop) for _ in range(self.cpu_workers)]:
+            fut.result()
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._threads.shutdown(wait=wait, cancel_futures=not wait)
+        if self._cpu is not None:
+            self._cpu.shutdown(wait=wait, cancel_futures=not wait)
+
+
+_QUEUE: AnalysisJobQueue | None = None
+_QUEUE_LOCK = threading.Lock()
+
+
+def get_analysis_queue() -> AnalysisJobQueue:
+    """Process-wide job queue, created on first use."""
+    global _QUEUE
+    with _QUEUE_LOCK:
+        if _QUEUE is None:
+            _QUEUE = AnalysisJobQueue()
+        return _QUEUE
+
+
+@atexit.register
+def shutdown_analysis_queue() -> None:
+    global _QUEUE
+    with _QUEUE_LOCK:
+        if _QUEUE is not None:
+            _QUEUE.shutdown(wait=False)
+            _QUEUE = None
@@ -1,10 +1,12 @@
 import time
 import uuid
 import logging
+from concurrent.futures import Executor, ThreadPoolExecutor
+
 import pandas as pd
 
 from ..log_context import bind_run_id
-from .utils import city_key
+from .utils import city_key, safe_city_dir
 from .openmeteo import geocode, fetch_daily
 from .db import (
     fetch_history,
@@ -12,20 +14,30 @@ from .db import (
     upsert_city_metadata,
     upsert_analysis_daily,
     upsert_analysis_monthly,
-    read_analysis_monthly,
     run_log_start,
     run_log_end,
+    run_log_progress,
     upsert_insights_cache,
 )
 from .analysis_features import (
-    build_daily_analysis_features,
+    analysis_daily_view,
+    build_daily_feature_frame,
     build_monthly_analysis,
+    trihspam_daily_view,
 )
 from .triclustering import (
     tricluster_year_month_features,
     run_weather_triclustering_from_history,
 )
 from .insights import compute_insights_payload
+from .step_cache import (
+    frame_from_entry,
+    frame_to_entry,
+    history_fingerprint,
+    load_step,
+    step_fingerprint,
+    store_step,
+)
 
 import os
 import json
@@ -37,6 +49,11 @@ logger = logging.getLogger(__name__)
 
 
 INSIGHTS_JSON_DIR = Path("artifacts/insights_json")
+TRIHSPAM_STATE_DIR = Path("artifacts/trihspam_state")
+
+# analysis_daily / analysis_monthly writes run here while the pipeline moves
+# on; one thread keeps them from contending for the SQLite write lock.
+_DB_WRITER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analysis-db-writer")
 
 
 def _json_safe(obj):
@@ -68,8 +85,7 @@ def write_insights_payload_to_json(
     base_dir.mkdir(parents=True, exist_ok=True)
 
     ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
-    safe_city = "".join(ch if ch.isalnum() or ch in ("-", "_") else "_" for ch in city_key)
-    filename = f"{safe_city}__{run_id}__{ts}.json"
+    filename = f"{safe_city_dir(city_key)}__{run_id}__{ts}.json"
     file_path = base_dir / filename
 
     with file_path.open("w", encoding="utf-8") as f:
@@ -78,6 +94,13 @@ def write_insights_payload_to_json(
     return str(file_path)
 
 
+def _timed_write(store, *args, **kwargs) -> tuple[int, int]:
+    """(rows written, dt_ms) of store(*args, **kwargs); runs on the DB writer."""
+    t0 = time.time()
+    rows = store(*args, **kwargs)
+    return int(rows), int((time.time() - t0) * 1000)
+
+
 def _safe_len(x) -> int:
     try:
         return int(len(x))
@@ -108,8 +131,22 @@ def run_city_analysis(
     overlap_filter: float | None = 0.7,
     jar_path: str | None = None,
     keep_temp_files: bool = False,
+    time_budget_s: float | None = None,
+    max_patterns: int | None = None,
+    top_k_by_hvar3: int | None = None,
+    incremental: bool = False,
+    run_id: str | None = None,
+    cpu_executor: Executor | None = None,
+    hist: pd.DataFrame | None = None,
+    db_writer: Executor | None = None,
 ):
-    run_id = uuid.uuid4().hex
+    # run_id is preassigned when the run was queued (see analysis_jobs); with
+    # cpu_executor set, the CPU-bound triclustering step runs in that executor.
+    # Batch runs (see analysis_batch) pass the city's history already fetched
+    # and a db_writer that coalesces the analysis table writes.
+    # Feature, triclustering and insights steps are memoized per city on a
+    # fingerprint of the history plus their params (see step_cache).
+    run_id = run_id or uuid.uuid4().hex
     pipeline_t0 = time.time()
 
     key = city_key(city, country_code)
@@ -136,6 +173,10 @@ def run_city_analysis(
         "overlap_filter": overlap_filter,
         "jar_path": jar_path,
         "keep_temp_files": keep_temp_files,
+        "time_budget_s": time_budget_s,
+        "max_patterns": max_patterns,
+        "top_k_by_hvar3": top_k_by_hvar3,
+        "incremental": incremental,
     }
 
     run_log_start(run_id, endpoint="/analyse/<city>", city=key, params=params)
@@ -166,22 +207,39 @@ def run_city_analysis(
 
         steps = {}
 
+        def _report_progress(current_step: str | None):
+            # Best effort: polling GET /runs/<run_id> must never fail the run
+            try:
+                run_log_progress(run_id, {
+                    "current_step": current_step,
+                    "step_timings_ms": {k: v["dt_ms"] for k, v in steps.items() if "dt_ms" in v},
+                    "step_cache_hits": {k: v["cache_hit"] for k, v in steps.items() if "cache_hit" in v},
+                })
+            except Exception as e:
+                logger.warning(f"RUN_PROGRESS write failed: {e}")
+
         def _step_start(name: str):
             logger.debug(f"STEP_START {name}")
             steps[name] = {"t0": time.time()}
+            _report_progress(name)
 
-        def _step_end(name: str, extra: dict | None = None):
-            dt_ms = int((time.time() - steps[name]["t0"]) * 1000)
-            steps[name]["dt_ms"] = dt_ms
+        def _step_end(name: str, extra: dict | None = None, dt_ms: int | None = None):
+            # dt_ms is passed for steps timed elsewhere (the background DB writes)
+            if dt_ms is None:
+                dt_ms = int((time.time() - steps[name]["t0"]) * 1000)
+            steps.setdefault(name, {})["dt_ms"] = dt_ms
             if extra:
                 steps[name].update(extra)
             logger.info(f"STEP_END {name} dt_ms={dt_ms} extra={extra or {}}")
+            _report_progress(None)
 
         try:
             # 1) Fetch history
             _step_start("fetch_history_initial")
-            hist = fetch_history(key, None, None)
-            _step_end("fetch_history_initial", {"rows": int(len(hist))})
+            prefetched = hist is not None
+            if not prefetched:
+                hist = fetch_history(key, None, None)
+            _step_end("fetch_history_initial", {"rows": int(len(hist)), "prefetched": prefetched})
 
             # 2) Auto-ingest if missing
             if hist.empty and auto_ingest:
@@ -218,36 +276,74 @@ def run_city_analysis(
                     f"No history for '{key}'. Ingest via POST /cities or use auto_ingest=1."
                 )
 
-            # 4) Build legacy daily analysis features for existing tables/charts
+            # 4) Build daily features once; the legacy tables/charts and
+            # TriHSPAM each take their projection of the same frame
             _step_start("build_daily_features")
-            daily_feat = build_daily_analysis_features(hist)
-            _step_end("build_daily_features", {"daily_feat_rows": int(len(daily_feat))})
+            daily_fp = step_fingerprint(history_fingerprint(hist), "build_daily_features")
+            cached = load_step(key, "build_daily_features", daily_fp)
+            if cached is not None:
+                feature_frame = frame_from_entry(*cached)
+            else:
+                feature_frame = build_daily_feature_frame(hist)
+                store_step(key, "build_daily_features", daily_fp, run_id, *frame_to_entry(feature_frame))
+            daily_feat = analysis_daily_view(feature_frame)
+            _step_end(
+                "build_daily_features",
+                {"daily_feat_rows": int(len(daily_feat)), "cache_hit": cached is not None},
+            )
 
-            # 5) Store daily features
-            _step_start("store_analysis_daily")
-            daily_rows = upsert_analysis_daily(key, daily_feat)
-            _step_end("store_analysis_daily", {"upserted": int(daily_rows)})
+            # 5) Store daily features in the background; only changed months are rewritten
+            db_writer = db_writer or _DB_WRITER
+            daily_write = db_writer.submit(_timed_write, upsert_analysis_daily, key, daily_feat)
 
             # 6) Build monthly analysis for existing baseline charts
             _step_start("build_monthly_features")
-            monthly_feat = build_monthly_analysis(daily_feat)
-            _step_end("build_monthly_features", {"monthly_feat_rows": int(len(monthly_feat))})
-
-            # 7) Store monthly analysis
-            _step_start("store_analysis_monthly")
-            monthly_rows = upsert_analysis_monthly(key, monthly_feat)
-            _step_end("store_analysis_monthly", {"upserted": int(monthly_rows)})
+            monthly_fp = step_fingerprint(daily_fp, "build_monthly_features")
+            cached = load_step(key, "build_monthly_features", monthly_fp)
+            if cached is not None:
+                monthly_feat = frame_from_entry(*cached)
+            else:
+                monthly_feat = build_monthly_analysis(daily_feat)
+                store_step(key, "build_monthly_features", monthly_fp, run_id, *frame_to_entry(monthly_feat))
+            _step_end(
+                "build_monthly_features",
+                {"monthly_feat_rows": int(len(monthly_feat)), "cache_hit": cached is not None},
+            )
 
-            # 8) Read monthly back
-            _step_start("read_analysis_monthly")
-            monthly_db = read_analysis_monthly(key)
-            _step_end("read_analysis_monthly", {"rows": int(len(monthly_db))})
+            # 7) Store monthly analysis in the background too; triclustering and
+            # insights use the in-memory frame instead of reading it back
+            monthly_write = db_writer.submit(_timed_write, upsert_analysis_monthly, key, monthly_feat)
 
-            # 9) Triclustering
+            # 8) Triclustering
             _step_start("triclustering")
             if use_legacy_triclustering:
+                tri_fp = step_fingerprint(
+                    monthly_fp, "triclustering", legacy=True, k_years=k_years, k_months=k_months,
+                )
+            else:
+                tri_fp = step_fingerprint(
+                    daily_fp,
+                    "triclustering",
+                    **{
+                        k: params[k]
+                        for k in (
+                            "window_size", "stride", "min_I", "min_J", "min_K",
+                            "disc_method", "n_bins", "mv_method", "spm_algo",
+                            "time_relaxed", "coherence_threshold", "overlap_filter",
+                            "jar_path", "time_budget_s", "max_patterns",
+                            "top_k_by_hvar3", "incremental",
+                        )
+                    },
+                )
+            cached = load_step(key, "triclustering", tri_fp)
+            tri_hit = cached is not None
+
+            if tri_hit:
+                tri = cached[0]
+                tri_extra = {"method": tri.get("method") if isinstance(tri, dict) else None}
+            elif use_legacy_triclustering:
                 tri = tricluster_year_month_features(
-                    monthly_db,
+                    monthly_feat,
                     k_years=k_years,
                     k_months=k_months,
                 )
@@ -256,8 +352,14 @@ def run_city_analysis(
                     "clusters": len(tri.get("clusters", [])) if isinstance(tri, dict) else 0,
                 }
             else:
-                tri = run_weather_triclustering_from_history(
+                # Incremental runs extend the TriHSPAM state of the previous run
+                state_dir = None
+                if incremental:
+                    state_dir = str(TRIHSPAM_STATE_DIR / safe_city_dir(key))
+
+                tri_kwargs = dict(
                     hist_df=hist,
+                    daily_df=trihspam_daily_view(feature_frame),
                     window_size=window_size,
                     stride=stride,
                     min_I=min_I,
@@ -272,34 +374,62 @@ def run_city_analysis(
                     overlap_filter=overlap_filter,
                     jar_path=jar_path,
                     keep_temp_files=keep_temp_files,
+                    time_budget_s=time_budget_s,
+                    max_patterns=max_patterns,
+                    top_k_by_hvar3=top_k_by_hvar3,
+                    state_dir=state_dir,
                 )
+                if cpu_executor is not None:
+                    tri = cpu_executor.submit(run_weather_triclustering_from_history, **tri_kwargs).result()
+                else:
+                    tri = run_weather_triclustering_from_history(**tri_kwargs)
                 tri_extra = {
                     "method": tri.get("method", "TriHSPAM"),
                     "triclusters": len(tri.get("triclusters", [])),
                     "n_windows": tri.get("n_windows"),
                     "cube_shape": tri.get("cube_shape"),
+                    "truncated": tri.get("engine", {}).get("truncated", False),
+                    "incremental": (tri.get("engine", {}).get("incremental") or {}).get("mode"),
                 }
+
+            # A run cut short by its time budget is not the step's full output
+            if not tri_hit and not tri_extra.get("truncated"):
+                store_step(key, "triclustering", tri_fp, run_id, _json_safe(tri))
+            tri_extra["cache_hit"] = tri_hit
             _step_end("triclustering", tri_extra)
 
-            # 10) Compute insights
+            # 9) Compute insights
             # For now we keep the same insights function signature.
             # It will continue to use monthly summaries, and later we will upgrade
             # insights.py to properly render TriHSPAM triclusters.
             _step_start("compute_insights")
-            insights_payload = compute_insights_payload(
-                city_key=key,
-                daily_feat_df=daily_feat,
-                monthly_df=monthly_db,
-                tri=tri,
-                run_id=run_id,
-            )
+            insights_fp = step_fingerprint(tri_fp, "compute_insights", daily=daily_fp, monthly=monthly_fp)
+            cached = load_step(key, "compute_insights", insights_fp)
+            if cached is not None:
+                insights_payload = cached[0]
+                insights_payload["analysis_run_id"] = run_id
+            else:
+                insights_payload = compute_insights_payload(
+                    city_key=key,
+                    daily_feat_df=daily_feat,
+                    monthly_df=monthly_feat,
+                    tri=tri,
+                    run_id=run_id,
+                )
+                store_step(key, "compute_insights", insights_fp, run_id, _json_safe(insights_payload))
             _step_end(
                 "compute_insights",
                 {
                     "insights_keys": list(insights_payload.keys()),
+                    "cache_hit": cached is not None,
                 },
             )
 
+            # 10) Wait for the background writes; the run is only ok once they landed
+            for name, write in (("store_analysis_daily", daily_write), ("store_analysis_monthly", monthly_write)):
+                rows, dt_ms = write.result()
+                _step_end(name, {"upserted": rows}, dt_ms=dt_ms)
+
             # 11) Store insights as local JSON file instead of MongoDB
             _step_start("store_insights_json")
             mongo_id = write_insights_payload_to_json(
@@ -325,10 +455,11 @@ def run_city_analysis(
             result = {
                 "run_id": run_id,
                 "city_key": key,
-                "analysis_daily_rows": int(daily_rows),
-                "analysis_monthly_rows": int(monthly_rows),
+                "analysis_daily_rows": int(len(daily_feat)),
+                "analysis_monthly_rows": int(len(monthly_feat)),
                 "triclustering": tri,
                 "step_timings_ms": {k: v.get("dt_ms") for k, v in steps.items()},
+                "step_cache_hits": {k: v["cache_hit"] for k, v in steps.items() if "cache_hit" in v},
             }
 
             total_ms = int((time.time() - pipeline_t0) * 1000)
@@ -3,6 +3,7 @@ from pathlib import Path
 import pandas as pd
 
 import json
+import hashlib
 import datetime as _dt
 import logging
 from .logging_utils import trace
@@ -62,6 +63,24 @@ def fetch_history(city: str, start: str | None, end: str | None):
     con.close()
     return df
 
+def fetch_histories(cities: list[str]) -> dict[str, pd.DataFrame]:
+    """fetch_history(city, None, None) for many cities with one query; cities without rows map to an empty frame."""
+    cities = list(dict.fromkeys(cities))
+    if not cities:
+        return {}
+
+    con = _connect()
+    df = pd.read_sql_query(
+        f"SELECT city,date,tmin,tmax,tavg FROM weather_daily WHERE city IN ({','.join('?' * len(cities))}) "
+        "ORDER BY city ASC, date ASC",
+        con, params=cities
+    )
+    con.close()
+
+    groups = {c: g.drop(columns="city").reset_index(drop=True) for c, g in df.groupby("city", sort=False)}
+    empty = df.drop(columns="city").iloc[0:0]
+    return {c: groups.get(c, empty) for c in cities}
+
 def list_cities():
     con = _connect()
     df = pd.read_sql_query(
@@ -75,53 +94,86 @@ def list_cities():
 
 # ----------------------------- Analysis Data Handling ---------------------------
 
-def upsert_analysis_daily(city_key: str, df: pd.DataFrame):
-    # df columns must match analysis_daily fields (except city)
-    x = df.copy()
-    x["date"] = pd.to_datetime(x["date"]).dt.date.astype(str)
-    x["city"] = city_key
+def _range_checksums(x: pd.DataFrame, range_keys: pd.Series) -> dict[str, str]:
+    """Checksum of the rows in each range (a month of days, a year of months), in frame order."""
+    row_hash = pd.util.hash_pandas_object(x, index=False).to_numpy()
+    return {
+        str(rk): hashlib.blake2b(row_hash[idx].tobytes(), digest_size=16).hexdigest()
+        for rk, idx in range_keys.groupby(range_keys, sort=False).indices.items()
+    }
 
-    cols = [
-        "city","date","tmin","tmax","tavg",
-        "diurnal_range","delta_1","delta_7","roll_mean_7","roll_std_7",
-        "anomaly_z","doy_sin","doy_cos","time_idx"
-    ]
-    x = x[cols]
+def _diff_upsert(
+    table: str,
+    city_key: str,
+    x: pd.DataFrame,
+    range_keys: pd.Series,
+    range_expr: str,
+    con: sqlite3.Connection | None = None,
+):
+    """
+    Rewrite only the ranges of `table` whose rows changed since the last write.
 
-    con = _connect()
+    Each range's checksum is kept in analysis_checksums; a range whose stored
+    checksum differs (or is new) has its rows deleted and re-inserted, the
+    rest are left alone. `range_expr` is the SQL expression giving a row's
+    range key. Returns the number of rows written.
+
+    With `con` given the writes join the caller's transaction, which the
+    caller commits (see analysis_batch.CoalescingWriter).
+    """
+    new_sums = _range_checksums(x, range_keys)
+
+    own_con = con is None
+    if own_con:
+        con = _connect()
     cur = con.cursor()
-    cur.executemany(
-        """
-        INSERT OR REPLACE INTO analysis_daily
-        (city,date,tmin,tmax,tavg,diurnal_range,delta_1,delta_7,roll_mean_7,roll_std_7,
-         anomaly_z,doy_sin,doy_cos,time_idx)
-        VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-        """,
-        [tuple(r) for r in x.itertuples(index=False, name=None)]
+    cur.execute(
+        "SELECT range_key, checksum FROM analysis_checksums WHERE city=? AND table_name=?",
+        (city_key, table)
     )
-    con.commit()
-    con.close()
-    return len(x)
+    old_sums = dict(cur.fetchall())
+    changed = [rk for rk, cs in new_sums.items() if old_sums.get(rk) != cs]
 
-def upsert_analysis_monthly(city_key: str, dfm: pd.DataFrame):
-    x = dfm.copy()
-    x["city"] = city_key
-    cols = ["city","year","month","tavg_mean","tavg_std","diurnal_mean","roll_std_mean","anomaly_mean","delta_1_mean"]
-    x = x[cols]
+    rows = x[range_keys.astype(str).isin(changed).to_numpy()]
+    rows = rows.assign(city=city_key)[["city"] + [c for c in x.columns]]
+    placeholders = ",".join("?" * len(rows.columns))
 
-    con = _connect()
-    cur = con.cursor()
     cur.executemany(
-        """
-        INSERT OR REPLACE INTO analysis_monthly
-        (city,year,month,tavg_mean,tavg_std,diurnal_mean,roll_std_mean,anomaly_mean,delta_1_mean)
-        VALUES (?,?,?,?,?,?,?,?,?)
-        """,
-        [tuple(r) for r in x.itertuples(index=False, name=None)]
+        f"DELETE FROM {table} WHERE city=? AND {range_expr}=?",
+        [(city_key, rk) for rk in changed]
     )
-    con.commit()
-    con.close()
-    return len(x)
+    cur.executemany(
+        f"INSERT OR REPLACE INTO {table} ({','.join(rows.columns)}) VALUES ({placeholders})",
+        list(rows.itertuples(index=False, name=None))
+    )
+    cur.executemany(
+        "INSERT OR REPLACE INTO analysis_checksums (city, table_name, range_key, checksum) VALUES (?,?,?,?)",
+        [(city_key, table, rk, new_sums[rk]) for rk in changed]
+    )
+    if own_con:
+        con.commit()
+        con.close()
+    return len(rows)
+
+def upsert_analysis_daily(city_key: str, df: pd.DataFrame, con: sqlite3.Connection | None = None):
+    # df columns must match analysis_daily fields (except city); only months
+    # whose rows changed since the last write are rewritten
+    x = df.copy()
+    x["date"] = pd.to_datetime(x["date"]).dt.date.astype(str)
+
+    cols = [
+        "date","tmin","tmax","tavg",
+        "diurnal_range","delta_1","delta_7","roll_mean_7","roll_std_7",
+        "anomaly_z","doy_sin","doy_cos","time_idx"
+    ]
+    x = x[cols].reset_index(drop=True)
+    return _diff_upsert("analysis_daily", city_key, x, x["date"].str[:7], "substr(date, 1, 7)", con=con)
+
+def upsert_analysis_monthly(city_key: str, dfm: pd.DataFrame, con: sqlite3.Connection | None = None):
+    # Only years whose monthly rows changed since the last write are rewritten
+    cols = ["year","month","tavg_mean","tavg_std","diurnal_mean","roll_std_mean","anomaly_mean","delta_1_mean"]
+    x = dfm[cols].reset_index(drop=True)
+    return _diff_upsert("analysis_monthly", city_key, x, x["year"].astype(str), "CAST(year AS TEXT)", con=con)
 
 def read_analysis_monthly(city_key: str):
     con = _connect()
@@ -132,16 +184,19 @@ def read_analysis_monthly(city_key: str):
     con.close()
     return df
 
-def run_log_start(run_id: str, endpoint: str, city: str, params: dict):
+def run_log_start(run_id: str, endpoint: str, city: str, params: dict, status: str = "running"):
     con = _connect()
     cur = con.cursor()
     cur.execute(
         """
-        INSERT OR REPLACE INTO execution_runs
+        INSERT INTO execution_runs
         (run_id, started_at, endpoint, city, status, params_json)
         VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(run_id) DO UPDATE SET
+            started_at=excluded.started_at, endpoint=excluded.endpoint, city=excluded.city,
+            status=excluded.status, params_json=excluded.params_json
         """,
-        (run_id, _dt.datetime.utcnow().isoformat(), endpoint, city, "running", json.dumps(params))
+        (run_id, _dt.datetime.utcnow().isoformat(), endpoint, city, status, json.dumps(params))
     )
     con.commit()
     con.close()
@@ -165,6 +220,107 @@ def run_log_end(run_id: str, status: str, duration_ms: int, result: dict | None
     con.commit()
     con.close()
 
+def run_claim_inflight(
+    run_id: str,
+    endpoint: str,
+    city: str,
+    params: dict,
+    params_hash: str,
+    data_start: str | None,
+    data_end: str | None,
+    stale_after_s: float,
+):
+    """
+    Single-flight claim for an analysis of `city` with `params_hash`.
+
+    Returns the run_id of an identical queued/running run if one exists (the
+    caller should attach to it), otherwise records `run_id` as queued, marks
+    the city's insights_cache row as running and returns None. The lock is
+    the execution_runs row of the identical run itself, not the city-wide
+    insights_cache status, which any other run of the city can overwrite.
+    BEGIN IMMEDIATE serializes concurrent claims across worker processes;
+    runs older than `stale_after_s` are treated as dead and no longer hold it.
+    """
+    now = _dt.datetime.utcnow()
+    cutoff = (now - _dt.timedelta(seconds=stale_after_s)).isoformat()
+
+    con = _connect()
+    con.isolation_level = None
+    cur = con.cursor()
+    try:
+        cur.execute("BEGIN IMMEDIATE")
+
+        cur.execute("""
+            SELECT run_id FROM execution_runs
+            WHERE city=? AND params_hash=? AND status IN ('queued', 'running') AND started_at>=?
+            ORDER BY started_at DESC LIMIT 1
+        """, (city, params_hash, cutoff))
+        found = cur.fetchone()
+        if found:
+            cur.execute("COMMIT")
+            return found[0]
+
+        cur.execute("""
+            INSERT OR REPLACE INTO execution_runs
+            (run_id, started_at, endpoint, city, status, params_json, params_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (run_id, now.isoformat(), endpoint, city, "queued", json.dumps(params), params_hash))
+        cur.execute("""
+            INSERT OR REPLACE INTO insights_cache
+            (city, updated_at, analysis_run_id, data_start, data_end, status, mongo_id, error, version)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (city, now.isoformat(), run_id, data_start, data_end, "running", None, None, 2))
+        cur.execute("COMMIT")
+        return None
+    except BaseException:
+        if con.in_transaction:
+            cur.execute("ROLLBACK")
+        raise
+    finally:
+        con.close()
+
+def run_log_progress(run_id: str, progress: dict):
+    con = _connect()
+    cur = con.cursor()
+    cur.execute(
+        "UPDATE execution_runs SET progress_json=? WHERE run_id=?",
+        (json.dumps(progress), run_id)
+    )
+    con.commit()
+    con.close()
+
+def fetch_run(run_id: str):
+    con = _connect()
+    cur = con.cursor()
+    cur.execute("""
+        SELECT run_id, started_at, finished_at, endpoint, city, status, duration_ms,
+               params_json, progress_json, result_json, error
+        FROM execution_runs
+        WHERE run_id=?
+    """, (run_id,))
+    row = cur.fetchone()
+    con.close()
+
+    if not row:
+        return None
+
+    (run_id, started_at, finished_at, endpoint, city, status, duration_ms,
+     params_json, progress_json, result_json, error) = row
+
+    return {
+        "run_id": run_id,
+        "started_at": started_at,
+        "finished_at": finished_at,
+        "endpoint": endpoint,
+        "city": city,
+        "status": status,
+        "duration_ms": duration_ms,
+        "params": json.loads(params_json) if params_json else None,
+        "progress": json.loads(progress_json) if progress_json else None,
+        "result": json.loads(result_json) if result_json else None,
+        "error": error
+    }
+
 def list_runs(limit: int = 30):
     con = _connect()
     df = pd.read_sql_query(
@@ -175,6 +331,43 @@ def list_runs(limit: int = 30):
     return df
     
     
+# -------------------- Step Memoization --------------------
+
+def upsert_step_cache(city_key: str, step: str, fingerprint: str, run_id: str, output_ref: str):
+    con = _connect()
+    cur = con.cursor()
+    cur.execute("""
+        INSERT OR REPLACE INTO analysis_step_cache
+        (city, step, fingerprint, run_id, output_ref, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (city_key, step, fingerprint, run_id, output_ref, _dt.datetime.utcnow().isoformat()))
+    con.commit()
+    con.close()
+
+def fetch_step_cache(city_key: str, step: str):
+    con = _connect()
+    cur = con.cursor()
+    cur.execute("""
+        SELECT fingerprint, run_id, output_ref, updated_at
+        FROM analysis_step_cache
+        WHERE city=? AND step=?
+    """, (city_key, step))
+    row = cur.fetchone()
+    con.close()
+
+    if not row:
+        return None
+
+    fingerprint, run_id, output_ref, updated_at = row
+
+    return {
+        "fingerprint": fingerprint,
+        "run_id": run_id,
+        "output_ref": output_ref,
+        "updated_at": updated_at
+    }
+
+
 # -------------------- Insight Handling --------------------
 
 def upsert_insights_cache(
@@ -266,6 +266,7 @@ def _serialize_tricluster(tric: dict, feature_columns: list[str]) -> dict:
         "rows": tric.get("rows", []),
         "cols": tric.get("cols", []),
         "contexts": tric.get("contexts", []),
+        "row_contexts": tric.get("row_contexts"),
         "feature_names": tric.get("feature_names", []),
         "feature_groups": tric.get("feature_groups", {"numeric": [], "symbolic": []}),
         "shape": tric.get("shape", {}),
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import atexit
+import collections
+import logging
+import queue
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+WORKER_SOURCE = Path(__file__).resolve().parent / "SpmfWorker.java"
+
+
+class SpmfWorkerError(RuntimeError):
+    pass
+
+
+class SpmfJobError(SpmfWorkerError):
+    """SPMF raised inside a healthy worker; the JVM can be reused."""
+
+
+# -----------------------------------------------------------------------------
+# Single long-lived JVM
+# -----------------------------------------------------------------------------
+
+class SpmfWorker:
+    """
+    One JVM running SpmfWorker.java. Requests and replies are single lines
+    on stdin/stdout; see the Java file for the protocol.
+    """
+
+    def __init__(self, jar: Path, startup_timeout_s: float = 60.0):
+        self.jar = Path(jar)
+        self._lines: queue.Queue = queue.Queue()
+        self._stderr_tail: collections.deque = collections.deque(maxlen=50)
+
+        self.proc = subprocess.Popen(
+            ["java", "-cp", str(self.jar), str(WORKER_SOURCE), str(self.jar)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+        )
+        threading.Thread(target=self._pump_stdout, daemon=True).start()
+        threading.Thread(target=self._pump_stderr, daemon=True).start()
+
+        reply = self._read_reply(startup_timeout_s)
+        if reply != "READY":
+            self.kill()
+            raise SpmfWorkerError(f"SPMF worker failed to start (got {reply!r}).\n{self.stderr_tail()}")
+
+    def _pump_stdout(self) -> None:
+        for line in self.proc.stdout:
+            self._lines.put(line.rstrip("\n"))
+        self._lines.put(None)  # EOF
+
+    def _pump_stderr(self) -> None:
+        # SPMF's own console output ends up here; keep only the tail for error messages
+        for line in self.proc.stderr:
+            self._stderr_tail.append(line.rstrip("\n"))
+
+    def stderr_tail(self) -> str:
+        return "\n".join(self._stderr_tail)
+
+    def is_alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def _read_reply(self, timeout_s: float | None) -> str | None:
+        try:
+            return self._lines.get(timeout=timeout_s)
+        except queue.Empty:
+            raise TimeoutError(f"SPMF worker did not answer within {timeout_s}s.")
+
+    def _send(self, line: str) -> None:
+        try:
+            self.proc.stdin.write(line + "\n")
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise SpmfWorkerError(f"SPMF worker pipe is closed: {e}") from e
+
+    def ping(self, timeout_s: float = 5.0) -> bool:
+        if not self.is_alive():
+            return False
+        try:
+            self._send("PING")
+            return self._read_reply(timeout_s) == "PONG"
+        except (TimeoutError, SpmfWorkerError):
+            return False
+
+    def run(self, spmf_args: list[str], timeout_s: float | None = None, binary: bool = False) -> None:
+        """
+        Run one SPMF job. With binary=True the input and output paths in
+        spmf_args are binary sequence / pattern files (see trihspam_io).
+        """
+        if any("\t" in a or "\n" in a for a in spmf_args):
+            raise ValueError("SPMF arguments must not contain tabs or newlines.")
+
+        command = "RUNBIN" if binary else "RUN"
+        self._send("\t".join([command] + [str(a) for a in spmf_args]))
+        reply = self._read_reply(timeout_s)
+
+        if reply is None:
+            raise SpmfWorkerError(f"SPMF worker exited during a job.\n{self.stderr_tail()}")
+        if reply.startswith("ERR"):
+            raise SpmfJobError(f"SPMF execution failed: {reply[4:]}\n{self.stderr_tail()}")
+        if reply != "OK":
+            raise SpmfWorkerError(f"Unexpected SPMF worker reply: {reply!r}")
+
+    def close(self) -> None:
+        if self.is_alive():
+            try:
+                self._send("QUIT")
+                self.proc.wait(timeout=5)
+            except Exception:
+                pass
+        self.kill()
+
+    def kill(self) -> None:
+        if self.is_alive():
+            self.proc.kill()
+            try:
+                self.proc.wait(timeout=5)
+            except Exception:
+                pass
+
+
+# -----------------------------------------------------------------------------
+# Pool
+# -----------------------------------------------------------------------------
+
+class SpmfWorkerPool:
+    """
+    Fixed-size pool of pre-started SPMF workers.
+
+    A job borrows an idle worker; crashed workers are replaced on the next
+    checkout, and a worker that times out is killed and restarted.
+    """
+
+    def __init__(self, jar: Path, size: int = 1, startup_timeout_s: float = 60.0):
+        if size <= 0:
+            raise ValueError("SPMF worker pool size must be positive.")
+        self.jar = Path(jar)
+        self.size = int(size)
+        self.startup_timeout_s = float(startup_timeout_s)
+        self._idle: queue.Queue = queue.Queue()
+        self._closed = False
+
+        for _ in range(self.size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self) -> SpmfWorker:
+        t0 = time.time()
+        worker = SpmfWorker(self.jar, startup_timeout_s=self.startup_timeout_s)
+        logger.info(f"SPMF_WORKER_START pid={worker.proc.pid} dt_ms={int((time.time() - t0) * 1000)}")
+        return worker
+
+    def run(self, spmf_args: list[str], timeout_s: float | None = None, binary: bool = False) -> None:
+        if self._closed:
+            raise SpmfWorkerError("SPMF worker pool is closed.")
+
+        worker = self._idle.get()
+        try:
+            if worker is None or not worker.is_alive():
+                if worker is not None:
+                    logger.warning(f"SPMF_WORKER_RESTART pid={worker.proc.pid} reason=crashed")
+                worker = None
+                worker = self._spawn()
+            worker.run(spmf_args, timeout_s=timeout_s, binary=binary)
+        except SpmfJobError:
+            raise
+        except (TimeoutError, SpmfWorkerError):
+            # The JVM may be stuck or half-way through a job: never reuse it
+            if worker is not None:
+                logger.warning(f"SPMF_WORKER_RESTART pid={worker.proc.pid} reason=job_failed")
+                worker.kill()
+            worker = None
+            raise
+        finally:
+            self._idle.put(worker)
+
+    def health_check(self, timeout_s: float = 5.0) -> dict:
+        """Ping every idle worker, restarting the ones that do not answer."""
+        checked = []
+        for _ in range(self.size):
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break  # busy workers are healthy enough
+            ok = worker is not None and worker.ping(timeout_s)
+            if not ok:
+                if worker is not None:
+                    worker.kill()
+                try:
+                    worker = self._spawn()
+                except Exception as e:
+                    logger.error(f"SPMF_WORKER_RESTART failed err={e}")
+                    worker = None
+            checked.append(ok)
+            self._idle.put(worker)
+
+        return {"size": self.size, "checked": len(checked), "healthy": int(sum(checked))}
+
+    def close(self) -> None:
+        self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if worker is not None:
+                worker.close()
+
+
+_POOLS: dict[tuple[str, int], SpmfWorkerPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_spmf_pool(jar: Path, size: int) -> SpmfWorkerPool:
+    """Process-wide pool per (jar, size), started on first use."""
+    key = (str(Path(jar).resolve()), int(size))
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = SpmfWorkerPool(Path(jar), size=size)
+            _POOLS[key] = pool
+        return pool
+
+
+@atexit.register
+def shutdown_spmf_pools() -> None:
+    with _POOLS_LOCK:
+        for pool in _POOLS.values():
+            pool.close()
+        _POOLS.clear()
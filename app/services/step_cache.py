@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .db import fetch_step_cache, upsert_step_cache
+from .trihspam_cache import read_entry, stage_key, write_entry
+from .utils import safe_city_dir
+
+logger = logging.getLogger(__name__)
+
+# Outputs of memoized run_city_analysis steps, one file per (city, step);
+# "" disables step memoization.
+STEP_CACHE_DIR = os.getenv("ANALYSIS_STEP_CACHE_DIR", "artifacts/step_cache") or None
+
+# Bump when a memoized step's output changes for the same inputs; older
+# fingerprints then no longer match.
+STEP_CACHE_VERSION = 2
+
+
+# -----------------------------------------------------------------------------
+# Fingerprints
+# -----------------------------------------------------------------------------
+
+def history_fingerprint(hist: pd.DataFrame) -> str:
+    """Row count, last date and checksum of a fetch_history() frame."""
+    h = hashlib.blake2b(digest_size=20)
+    dates = pd.to_datetime(hist["date"], errors="coerce")
+    h.update(f"v{STEP_CACHE_VERSION}|{len(hist)}|{dates.max()}".encode("utf-8"))
+    h.update(np.ascontiguousarray(dates.to_numpy(dtype="datetime64[ns]")).view(np.int64).data)
+    for c in ("tmin", "tmax", "tavg"):
+        h.update(np.ascontiguousarray(hist[c].to_numpy(dtype=np.float64)).data)
+    return h.hexdigest()
+
+
+def step_fingerprint(parent: str, step: str, **params) -> str:
+    """Fingerprint of `step` computed from `parent` (a history or step fingerprint) with `params`."""
+    return stage_key(parent, step=step, **params)
+
+
+# -----------------------------------------------------------------------------
+# Load / store
+# -----------------------------------------------------------------------------
+
+def _step_path(city_key: str, step: str) -> Path:
+    return Path(STEP_CACHE_DIR) / safe_city_dir(city_key) / f"{step}.npz"
+
+
+def load_step(city_key: str, step: str, fingerprint: str) -> tuple[dict, dict[str, np.ndarray]] | None:
+    """(meta, arrays) stored by the last run of `step` for the city, if its fingerprint matches."""
+    if STEP_CACHE_DIR is None:
+        return None
+    try:
+        row = fetch_step_cache(city_key, step)
+        if not row or row["fingerprint"] != fingerprint:
+            return None
+        entry = read_entry(row["output_ref"])
+    except Exception as e:
+        logger.warning(f"STEP_CACHE load failed step={step} err={e}")
+        return None
+    # The file is shared per (city, step); a concurrent run may have replaced it
+    if entry is None or entry[0].get("fingerprint") != fingerprint:
+        return None
+    meta, arrays = entry
+    return meta["output"], arrays
+
+
+def store_step(
+    city_key: str,
+    step: str,
+    fingerprint: str,
+    run_id: str,
+    meta: dict,
+    arrays: dict[str, np.ndarray] | None = None,
+) -> None:
+    """Record `step`'s output for the city; best effort, a failed write only costs a later miss."""
+    if STEP_CACHE_DIR is None:
+        return
+    path = _step_path(city_key, step)
+    try:
+        write_entry(path, {"fingerprint": fingerprint, "output": meta}, arrays or {})
+        upsert_step_cache(city_key, step, fingerprint, run_id, str(path))
+    except Exception as e:
+        logger.warning(f"STEP_CACHE store failed step={step} err={e}")
+
+
+# -----------------------------------------------------------------------------
+# DataFrame entries
+# -----------------------------------------------------------------------------
+
+def frame_to_entry(df: pd.DataFrame) -> tuple[dict, dict[str, np.ndarray]]:
+    """
+    Column arrays of a flat frame, strings as fixed-width unicode so no pickles
+    are needed. Missing values of object columns (None / NaN) are stored as ""
+    plus a `m{i}` mask, since str() would turn them into "None" / "nan".
+    """
+    arrays = {}
+    for i, c in enumerate(df.columns):
+        values = df[c].to_numpy()
+        if values.dtype == object:
+            missing = pd.isna(values)
+            if missing.any():
+                values = np.where(missing, "", values)
+                arrays[f"m{i}"] = missing
+            values = values.astype(str)
+        arrays[f"c{i}"] = values
+    return {"columns": [str(c) for c in df.columns]}, arrays
+
+
+def frame_from_entry(meta: dict, arrays: dict[str, np.ndarray]) -> pd.DataFrame:
+    """Inverse of frame_to_entry(); string columns come back as object dtype, missing values as NaN."""
+    data = {}
+    for i, c in enumerate(meta["columns"]):
+        values = arrays[f"c{i}"]
+        if values.dtype.kind == "U":
+            values = values.astype(object)
+            if f"m{i}" in arrays:
+                values[arrays[f"m{i}"]] = np.nan
+        data[c] = values
+    return pd.DataFrame(data, columns=meta["columns"])
@@ -1,3 +1,11 @@
+import hashlib
+import itertools
+import logging
+import os
+import time
+from dataclasses import fields
+from pathlib import Path
+
 import numpy as np
 import pandas as pd
 from sklearn.cluster import KMeans
@@ -7,10 +15,21 @@ from .analysis_features import (
     NUMERIC_FEATURES_V1,
     SYMBOLIC_FEATURES_V1,
     build_enriched_daily_features,
-    build_weather_windows,
-    build_trihspam_cube,
+    build_trihspam_cube_from_views,
+    build_weather_window_views,
+    windows_df_from_views,
+)
+from .trihspam_engine import TriHSPAMConfig, run_weather_trihspam, run_weather_trihspam_sweep
+from .trihspam_incremental import (
+    extend_trihspam_state,
+    load_state,
+    result_from_state,
+    run_trihspam_with_state,
+    save_state,
+    state_key,
 )
-from .trihspam_engine import TriHSPAMConfig, run_weather_trihspam
+
+logger = logging.getLogger(__name__)
 
 
 # -----------------------------------------------------------------------------
@@ -131,6 +150,11 @@ DEFAULT_SPM_ALGO = "fournier08closed"
 DEFAULT_TIME_RELAXED = False
 DEFAULT_COHERENCE_THRESHOLD = 0.5
 DEFAULT_OVERLAP_FILTER = 0.8
+DEFAULT_SPMF_WORKERS = int(os.getenv("SPMF_WORKERS", "0"))
+DEFAULT_SPMF_TIMEOUT_S = float(os.getenv("SPMF_TIMEOUT_S")) if os.getenv("SPMF_TIMEOUT_S") else None
+DEFAULT_N_JOBS = int(os.getenv("TRIHSPAM_N_JOBS")) if os.getenv("TRIHSPAM_N_JOBS") else None
+DEFAULT_CACHE_DIR = os.getenv("TRIHSPAM_CACHE_DIR", "artifacts/trihspam_cache") or None  # "" disables
+DEFAULT_CACHE_MAX_BYTES = int(os.getenv("TRIHSPAM_CACHE_MAX_MB", "1024")) * 1024 * 1024
 
 
 def _clean_positive_int(value, name: str) -> int:
@@ -157,6 +181,18 @@ def run_weather_triclustering_from_history(
     overlap_filter: float | None = DEFAULT_OVERLAP_FILTER,
     jar_path: str | None = None,
     keep_temp_files: bool = False,
+    spmf_workers: int = DEFAULT_SPMF_WORKERS,
+    spmf_timeout_s: float | None = DEFAULT_SPMF_TIMEOUT_S,
+    n_jobs: int | None = DEFAULT_N_JOBS,
+    max_patterns: int | None = None,
+    top_k_by_hvar3: int | None = None,
+    time_budget_s: float | None = None,
+    cache_dir: str | None = DEFAULT_CACHE_DIR,
+    cache_max_bytes: int = DEFAULT_CACHE_MAX_BYTES,
+    state_dir: str | None = None,
+    rebin_on_drift: bool = True,
+    return_windows_df: bool = False,
+    daily_df: pd.DataFrame | None = None,
 ) -> dict:
     """
     Full TriHSPAM weather pipeline from raw daily history.
@@ -166,6 +202,21 @@ def run_weather_triclustering_from_history(
         - tmin
         - tmax
         - tavg
+
+    With state_dir set, the run is incremental: a state saved there by a
+    previous run with the same parameters is extended with the windows added
+    since (see trihspam_incremental), and the new state replaces it. Older
+    windows keep the features they were built with. When there is no usable
+    state, the history rows under its windows changed, or the frozen bins
+    drifted and rebin_on_drift is set, everything is rebuilt and a fresh
+    state saved.
+
+    Windows are views over the daily feature table; the long-form windows_df
+    is only built (into debug["windows_df"]) with return_windows_df=True.
+
+    Callers that already built the daily features of hist_df (see
+    build_daily_feature_frame) pass trihspam_daily_view() of them as
+    daily_df, and they are not computed again.
     """
     window_size = _clean_positive_int(window_size, "window_size")
     stride = _clean_positive_int(stride, "stride")
@@ -175,28 +226,9 @@ def run_weather_triclustering_from_history(
     n_bins = _clean_positive_int(n_bins, "n_bins")
 
     print("Creating Daily df")
-    daily_df = build_enriched_daily_features(hist_df)
+    if daily_df is None:
+        daily_df = build_enriched_daily_features(hist_df)
     print("Daily Df created")
-    
-    print("Creating Windows metadata and df")
-    windows_meta, windows_df = build_weather_windows(
-        daily_df=daily_df,
-        window_size=window_size,
-        stride=stride,
-    )
-    print("Windows metadata and df created")
-    print(windows_meta)
-    
-    print("creating cube")
-    cube_info = build_trihspam_cube(
-        windows_df=windows_df,
-        feature_columns=FEATURE_COLUMNS_V1,
-        numeric_features=NUMERIC_FEATURES_V1,
-        symbolic_features=SYMBOLIC_FEATURES_V1,
-        window_size=window_size,
-    )
-    print("cube created")
-    print(cube_info)
 
     print("getting config")
     config = TriHSPAMConfig(
@@ -212,16 +244,74 @@ def run_weather_triclustering_from_history(
         overlap_filter=overlap_filter,
         jar_path=jar_path,
         keep_temp_files=keep_temp_files,
+        spmf_workers=int(spmf_workers),
+        spmf_timeout_s=spmf_timeout_s,
+        n_jobs=n_jobs,
+        max_patterns=max_patterns,
+        top_k_by_hvar3=top_k_by_hvar3,
+        time_budget_s=time_budget_s,
+        cache_dir=cache_dir,
+        cache_max_bytes=int(cache_max_bytes),
     )
     print("config ready",config)
 
-    print("getting result")
-    tri_result = run_weather_trihspam(
-        cube_info=cube_info,
-        config=config,
+    rebuild_reason = None
+    if state_dir is not None:
+        state_path = Path(state_dir) / f"{state_key(config, window_size, stride)}.npz"
+        incremental, rebuild_reason = _run_incremental(
+            daily_df, config, window_size, stride, state_path, rebin_on_drift
+        )
+        if incremental is not None:
+            return incremental
+        logger.info("TriHSPAM incremental run rebuilds from scratch: %s", rebuild_reason)
+
+    print("Creating Windows metadata and views")
+    views = build_weather_window_views(
+        daily_df=daily_df,
+        window_size=window_size,
+        stride=stride,
+    )
+    windows_meta = views["windows_meta"]
+    print("Windows metadata and views created")
+    print(windows_meta)
+    
+    print("creating cube")
+    cube_info = build_trihspam_cube_from_views(
+        views,
+        feature_columns=FEATURE_COLUMNS_V1,
+        numeric_features=NUMERIC_FEATURES_V1,
+        symbolic_features=SYMBOLIC_FEATURES_V1,
     )
+    print("cube created")
+    print(cube_info)
+
+
+    print("getting result")
+    if state_dir is None:
+        tri_result = run_weather_trihspam(
+            cube_info=cube_info,
+            config=config,
+        )
+    else:
+        tri_result, state = run_trihspam_with_state(
+            cube_info,
+            config,
+            window_size,
+            stride,
+            history_checksum=_history_checksum(daily_df, int(cube_info["n_windows"]), window_size, stride),
+        )
+        tri_result["engine"]["incremental"]["reason"] = rebuild_reason
+        if state is not None:
+            save_state(state_path, state)
     print("Result : ",tri_result)
 
+    debug = {
+        "daily_feature_columns": daily_df.columns.tolist(),
+        "windows_df_columns": _windows_df_columns(daily_df),
+    }
+    if return_windows_df:
+        debug["windows_df"] = windows_df_from_views(views)
+
     return {
         "method": "TriHSPAM",
         "window_size": int(window_size),
@@ -238,8 +328,251 @@ def run_weather_triclustering_from_history(
         "abstractions": tri_result["abstractions"],
         "triclusters": tri_result["triclusters"],
         # Optional debug payloads for development
+        "debug": debug,
+    }
+
+
+def _run_incremental(
+    daily_df: pd.DataFrame,
+    config: TriHSPAMConfig,
+    window_size: int,
+    stride: int,
+    state_path: Path,
+    rebin_on_drift: bool,
+) -> tuple[dict | None, str | None]:
+    """
+    (result, None) when the saved state could be reused, else (None, reason).
+    Windows start every `stride` days from the first day, so appending days
+    only adds windows after the ones in the state. The state is only reused
+    while the history rows its windows cover are unchanged (same checksum).
+    """
+    state = load_state(state_path, state_key(config, window_size, stride))
+    if state is None:
+        return None, "no_state"
+
+    first_date = pd.Timestamp(daily_df["date"].iloc[0]).strftime("%Y-%m-%d")
+    if not state.context["windows_meta"] or state.context["windows_meta"][0]["start_date"] != first_date:
+        return None, "history_changed"
+
+    n_windows = (len(daily_df) - window_size) // stride + 1 if len(daily_df) >= window_size else 0
+    if n_windows < state.n_windows:
+        return None, "history_changed"
+    if state.history_checksum != _history_checksum(daily_df, state.n_windows, window_size, stride):
+        return None, "history_changed"
+
+    windows_meta = list(state.context["windows_meta"])
+    if n_windows == state.n_windows:
+        tri_result, new_state = result_from_state(state, config), None
+    else:
+        # Only the days the new windows cover
+        tail_df = daily_df.iloc[state.n_windows * stride:].reset_index(drop=True)
+        tail_views = build_weather_window_views(
+            daily_df=tail_df,
+            window_size=window_size,
+            stride=stride,
+            first_window_id=state.n_windows,
+        )
+        tail_cube_info = build_trihspam_cube_from_views(
+            tail_views,
+            feature_columns=FEATURE_COLUMNS_V1,
+            numeric_features=NUMERIC_FEATURES_V1,
+            symbolic_features=SYMBOLIC_FEATURES_V1,
+        )
+        tri_result, new_state = extend_trihspam_state(
+            state,
+            tail_cube_info,
+            config,
+            rebin_on_drift=rebin_on_drift,
+            history_checksum=_history_checksum(daily_df, n_windows, window_size, stride),
+        )
+        if tri_result is None:
+            return None, "rebin_required"
+        windows_meta += tail_cube_info["windows_meta"]
+
+    if new_state is not None:
+        save_state(state_path, new_state)
+
+    return {
+        "method": "TriHSPAM",
+        "window_size": int(window_size),
+        "stride": int(stride),
+        "daily_rows": int(len(daily_df)),
+        "n_windows": int(len(windows_meta)),
+        "cube_shape": [state.cube.shape[0], int(len(windows_meta)), int(window_size)],
+        "feature_columns": list(FEATURE_COLUMNS_V1),
+        "numeric_features": list(NUMERIC_FEATURES_V1),
+        "symbolic_features": list(SYMBOLIC_FEATURES_V1),
+        "windows_meta": windows_meta,
+        "engine": tri_result["engine"],
+        "config": tri_result["config"],
+        "abstractions": tri_result["abstractions"],
+        "triclusters": tri_result["triclusters"],
         "debug": {
             "daily_feature_columns": daily_df.columns.tolist(),
-            "windows_df_columns": windows_df.columns.tolist(),
+            "windows_df_columns": _windows_df_columns(daily_df),
         },
-    }
\ No newline at end of file
+    }, None
+
+
+def _history_checksum(daily_df: pd.DataFrame, n_windows: int, window_size: int, stride: int) -> str:
+    """
+    Checksum of the daily rows (date, tmin, tmax, tavg) the first n_windows
+    windows cover. Derived features are left out: some, like anomaly_z, move
+    with every appended day, while saved windows keep the ones they were built with.
+    """
+    n_rows = (n_windows - 1) * stride + window_size if n_windows > 0 else 0
+    rows = daily_df.iloc[:n_rows]
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f"{n_rows}".encode("ascii"))
+    h.update(np.ascontiguousarray(pd.to_datetime(rows["date"]).to_numpy(dtype="datetime64[ns]")).view(np.int64).data)
+    for c in ("tmin", "tmax", "tavg"):
+        h.update(np.ascontiguousarray(rows[c].to_numpy(dtype=np.float64)).data)
+    return h.hexdigest()
+
+
+def _windows_df_columns(daily_df: pd.DataFrame) -> list[str]:
+    """Columns windows_df_from_views() would produce, without building it."""
+    return ["window_id", "context_idx", "date"] + [c for c in daily_df.columns if c != "date"]
+
+
+# -----------------------------------------------------------------------------
+# Parameter sweeps
+# -----------------------------------------------------------------------------
+
+def _default_trihspam_kwargs() -> dict:
+    """TriHSPAMConfig kwargs with the app defaults used by run_weather_triclustering_from_history."""
+    return {
+        "min_I": DEFAULT_MIN_I,
+        "min_J": DEFAULT_MIN_J,
+        "min_K": DEFAULT_MIN_K,
+        "disc_method": DEFAULT_DISC_METHOD,
+        "n_bins": DEFAULT_N_BINS,
+        "mv_method": DEFAULT_MV_METHOD,
+        "spm_algo": DEFAULT_SPM_ALGO,
+        "time_relaxed": DEFAULT_TIME_RELAXED,
+        "coherence_threshold": DEFAULT_COHERENCE_THRESHOLD,
+        "overlap_filter": DEFAULT_OVERLAP_FILTER,
+        "spmf_workers": DEFAULT_SPMF_WORKERS,
+        "spmf_timeout_s": DEFAULT_SPMF_TIMEOUT_S,
+        "n_jobs": DEFAULT_N_JOBS,
+        "cache_dir": DEFAULT_CACHE_DIR,
+        "cache_max_bytes": DEFAULT_CACHE_MAX_BYTES,
+    }
+
+
+def sweep_grid(**axes) -> list[dict]:
+    """
+    Cartesian product of parameter values, e.g.
+        sweep_grid(min_I=[3, 5, 8], n_bins=[3, 5], coherence_threshold=[0.3, 0.5])
+    """
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[n] for n in names))]
+
+
+def run_weather_triclustering_sweep(
+    hist_df: pd.DataFrame,
+    grid: list[dict],
+    **common,
+) -> dict:
+    """
+    Run TriHSPAM for every point of `grid`, sharing work between points.
+
+    Each grid point is a dict of window_size / stride and TriHSPAMConfig
+    fields; `common` gives values for all points, and anything left out takes
+    the same defaults as run_weather_triclustering_from_history(). Daily
+    features are built once, windows and the cube once per (window_size,
+    stride), and the points on one cube go through run_weather_trihspam_sweep(),
+    which shares discretization, mining and scoring between them.
+
+    Returns:
+        {
+            "table": one row per point: its parameters, result sizes and
+                     timings (shared stages report the shared stage's time),
+            "results": one run_weather_triclustering_from_history()-style
+                       result per point (without the debug payload),
+            "total_s": wall time of the whole sweep,
+        }
+    """
+    config_fields = {f.name for f in fields(TriHSPAMConfig)}
+    points = []
+    for entry in grid:
+        params = {"window_size": DEFAULT_WINDOW_SIZE, "stride": DEFAULT_STRIDE}
+        params.update(_default_trihspam_kwargs())
+        params.update(common)
+        params.update(entry)
+        unknown = set(params) - config_fields - {"window_size", "stride"}
+        if unknown:
+            raise ValueError(f"Unknown sweep parameters: {sorted(unknown)}")
+        params["window_size"] = _clean_positive_int(params["window_size"], "window_size")
+        params["stride"] = _clean_positive_int(params["stride"], "stride")
+        points.append(params)
+
+    varied = ["window_size", "stride"] + sorted({k for entry in grid for k in entry} - {"window_size", "stride"})
+
+    t_start = time.perf_counter()
+    daily_df = build_enriched_daily_features(hist_df)
+    features_s = time.perf_counter() - t_start
+
+    by_windowing: dict[tuple[int, int], list[int]] = {}
+    for position, params in enumerate(points):
+        by_windowing.setdefault((params["window_size"], params["stride"]), []).append(position)
+
+    table: list[dict | None] = [None] * len(points)
+    results: list[dict | None] = [None] * len(points)
+    for (window_size, stride), members in by_windowing.items():
+        t0 = time.perf_counter()
+        views = build_weather_window_views(
+            daily_df=daily_df,
+            window_size=window_size,
+            stride=stride,
+        )
+        windows_meta = views["windows_meta"]
+        cube_info = build_trihspam_cube_from_views(
+            views,
+            feature_columns=FEATURE_COLUMNS_V1,
+            numeric_features=NUMERIC_FEATURES_V1,
+            symbolic_features=SYMBOLIC_FEATURES_V1,
+        )
+        cube_s = time.perf_counter() - t0
+
+        configs = [
+            TriHSPAMConfig(**{k: v for k, v in points[p].items() if k in config_fields})
+            for p in members
+        ]
+        tri_results = run_weather_trihspam_sweep(cube_info, configs)
+
+        for position, tri_result in zip(members, tri_results):
+            engine = tri_result["engine"]
+            results[position] = {
+                "method": "TriHSPAM",
+                "window_size": int(window_size),
+                "stride": int(stride),
+                "daily_rows": int(len(daily_df)),
+                "n_windows": int(cube_info["n_windows"]),
+                "cube_shape": list(cube_info["cube"].shape),
+                "feature_columns": list(FEATURE_COLUMNS_V1),
+                "numeric_features": list(NUMERIC_FEATURES_V1),
+                "symbolic_features": list(SYMBOLIC_FEATURES_V1),
+                "windows_meta": windows_meta,
+                "engine": engine,
+                "config": tri_result["config"],
+                "abstractions": tri_result["abstractions"],
+                "triclusters": tri_result["triclusters"],
+            }
+            table[position] = {
+                **{k: points[position][k] for k in varied},
+                "n_windows": int(cube_info["n_windows"]),
+                "n_patterns_mined": engine["n_patterns_mined"],
+                "n_triclusters": engine["n_triclusters"],
+                "truncated": engine["truncated"],
+                "mining_group_size": engine["mining_group_size"],
+                "features_s": round(features_s, 4),
+                "cube_s": round(cube_s, 4),
+                **engine["timings"],
+            }
+
+    return {
+        "table": table,
+        "results": results,
+        "total_s": round(time.perf_counter() - t_start, 4),
+    }
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from .trihspam_cube import TriHSPAMCube
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout of any cached stage changes; old entries then miss
+# and age out through eviction.
+CACHE_VERSION = 2
+
+_META_KEY = "__meta__"
+
+
+# -----------------------------------------------------------------------------
+# Keys
+# -----------------------------------------------------------------------------
+
+def cube_fingerprint(cube: TriHSPAMCube) -> str:
+    """Content hash of a cube: its blocks, vocabularies and feature layout."""
+    h = hashlib.blake2b(digest_size=20)
+    h.update(json.dumps(
+        {
+            "version": CACHE_VERSION,
+            "shape": list(cube.shape),
+            "feature_columns": list(cube.feature_columns),
+            "numeric_feature_indices": list(cube.numeric_feature_indices),
+            "symbolic_feature_indices": list(cube.symbolic_feature_indices),
+            "vocabularies": [list(v) for v in cube.vocabularies],
+        },
+        sort_keys=True,
+    ).encode("utf-8"))
+    for block in (cube.numeric, cube.codes, cube.missing):
+        h.update(np.ascontiguousarray(block).data)
+    return h.hexdigest()
+
+
+def stage_key(parent: str, **params: Any) -> str:
+    """Key of a stage computed from `parent` (a fingerprint or stage key) with `params`."""
+    h = hashlib.blake2b(digest_size=20)
+    h.update(parent.encode("ascii"))
+    h.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+
+# -----------------------------------------------------------------------------
+# Disk cache
+# -----------------------------------------------------------------------------
+
+class TriHSPAMCache:
+    """
+    Content-addressed store for intermediate TriHSPAM stages.
+
+    An entry is a set of named numpy arrays plus a small JSON-able meta dict,
+    written as one uncompressed .npz (no pickles) under <root>/<kind>/<key>.npz.
+    Reads refresh the file's mtime, and writes evict the least recently used
+    entries until the cache fits in max_bytes.
+    """
+
+    def __init__(self, root: str | Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = int(max_bytes)
+
+    def _path(self, kind: str, key: str) -> Path:
+        return self.root / kind / f"{key}.npz"
+
+    def load(self, kind: str, key: str) -> tuple[dict, dict[str, np.ndarray]] | None:
+        path = self._path(kind, key)
+        entry = read_entry(path)
+        if entry is not None:
+            os.utime(path)
+        return entry
+
+    def store(self, kind: str, key: str, meta: dict, arrays: dict[str, np.ndarray]) -> None:
+        write_entry(self._path(kind, key), meta, arrays)
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        for path in self.root.glob("*/*.npz"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue  # evicted by another process
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+# -----------------------------------------------------------------------------
+# Entry files
+# -----------------------------------------------------------------------------
+
+def read_entry(path: str | Path) -> tuple[dict, dict[str, np.ndarray]] | None:
+    """(meta, arrays) from a file written by write_entry(); None when missing or unreadable."""
+    path = Path(path)
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+    except FileNotFoundError:
+        return None
+    except Exception as exc:
+        logger.warning("Dropping unreadable TriHSPAM cache entry %s: %s", path, exc)
+        path.unlink(missing_ok=True)
+        return None
+
+    meta = json.loads(arrays.pop(_META_KEY).tobytes().decode("utf-8"))
+    return meta, arrays
+
+
+def write_entry(path: str | Path, meta: dict, arrays: dict[str, np.ndarray]) -> None:
+    """Write named arrays plus a JSON-able meta dict as one .npz, atomically."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    payload = dict(arrays)
+    payload[_META_KEY] = np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8)
+
+    # Write next to the target and rename, so readers never see a partial file
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **payload)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
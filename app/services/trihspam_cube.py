@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+from typing import Any
+
+import numpy as np
+
+
+MISSING_CODE = -1
+CODE_DTYPE = np.int16
+
+
+# -----------------------------------------------------------------------------
+# Missing values
+# -----------------------------------------------------------------------------
+
+def _is_missing(value: Any) -> bool:
+    if value is None:
+        return True
+    if isinstance(value, str):
+        return value.strip() == ""
+    try:
+        return bool(np.isnan(value))
+    except Exception:
+        return False
+
+
+# -----------------------------------------------------------------------------
+# Typed cube container
+# -----------------------------------------------------------------------------
+
+@dataclass
+class TriHSPAMCube:
+    """
+    Typed (F, I, K) cube for TriHSPAM.
+
+    Numeric features live in a float64 (Fn, I, K) block (NaN = missing), symbolic
+    features in an int16 (Fs, I, K) block of category codes (-1 = missing) with
+    one sorted vocabulary per symbolic feature. `missing` is the (F, I, K) mask
+    over the original feature order.
+    """
+
+    feature_columns: list[str]
+    numeric_feature_indices: list[int]
+    symbolic_feature_indices: list[int]
+    numeric: np.ndarray
+    codes: np.ndarray
+    vocabularies: list[list[str]]
+    missing: np.ndarray
+    local_index: np.ndarray = field(init=False, repr=False)
+    is_numeric: np.ndarray = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        f_count = len(self.feature_columns)
+        self.local_index = np.full(f_count, -1, dtype=np.int64)
+        self.is_numeric = np.zeros(f_count, dtype=bool)
+        for local, f_idx in enumerate(self.numeric_feature_indices):
+            self.local_index[f_idx] = local
+            self.is_numeric[f_idx] = True
+        for local, f_idx in enumerate(self.symbolic_feature_indices):
+            self.local_index[f_idx] = local
+
+        if (self.local_index < 0).any():
+            raise ValueError("Every feature must be either numeric or symbolic.")
+        if len(self.vocabularies) != len(self.symbolic_feature_indices):
+            raise ValueError("One vocabulary is required per symbolic feature.")
+        if self.missing.shape != self.shape:
+            raise ValueError(f"missing mask shape {self.missing.shape} does not match cube shape {self.shape}.")
+
+    # -------------------------------------------------------------------------
+
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        block = self.numeric if self.numeric.shape[0] else self.codes
+        return (len(self.feature_columns), int(block.shape[1]), int(block.shape[2]))
+
+    @property
+    def n_observations(self) -> int:
+        return self.shape[1]
+
+    @property
+    def n_contexts(self) -> int:
+        return self.shape[2]
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.numeric.nbytes + self.codes.nbytes + self.missing.nbytes)
+
+    def value(self, f_idx: int, i_idx: int, k_idx: int) -> Any:
+        """Decoded cell value: float (NaN when missing), or category string (None when missing)."""
+        local = self.local_index[f_idx]
+        if self.is_numeric[f_idx]:
+            return float(self.numeric[local, i_idx, k_idx])
+        code = int(self.codes[local, i_idx, k_idx])
+        return None if code == MISSING_CODE else self.vocabularies[local][code]
+
+    def copy(self) -> "TriHSPAMCube":
+        return TriHSPAMCube(
+            feature_columns=list(self.feature_columns),
+            numeric_feature_indices=list(self.numeric_feature_indices),
+            symbolic_feature_indices=list(self.symbolic_feature_indices),
+            numeric=self.numeric.copy(),
+            codes=self.codes.copy(),
+            vocabularies=[list(v) for v in self.vocabularies],
+            missing=self.missing.copy(),
+        )
+
+    def to_object_cube(self) -> np.ndarray:
+        """Legacy (F, I, K) dtype=object view, for debugging and comparisons."""
+        out = np.empty(self.shape, dtype=object)
+        for local, f_idx in enumerate(self.numeric_feature_indices):
+            out[f_idx] = self.numeric[local]
+        for local, f_idx in enumerate(self.symbolic_feature_indices):
+            vocab = np.array(list(self.vocabularies[local]) + [None], dtype=object)
+            out[f_idx] = vocab[self.codes[local]]  # code -1 picks the trailing None
+        return out
+
+    # -------------------------------------------------------------------------
+
+    @classmethod
+    def from_blocks(
+        cls,
+        feature_columns: list[str],
+        numeric_feature_indices: list[int],
+        symbolic_feature_indices: list[int],
+        numeric: np.ndarray,
+        symbolic_values: np.ndarray,
+    ) -> "TriHSPAMCube":
+        """
+        numeric: float array (Fn, I, K); symbolic_values: object or str array (Fs, I, K)
+        of raw category values, encoded here into codes + vocabularies.
+        """
+        numeric = np.ascontiguousarray(numeric, dtype=np.float64)
+        i_count, k_count = (numeric.shape[1:] if numeric.shape[0] else symbolic_values.shape[1:])
+
+        codes = np.full((len(symbolic_feature_indices), i_count, k_count), MISSING_CODE, dtype=CODE_DTYPE)
+        vocabularies: list[list[str]] = []
+        for local in range(len(symbolic_feature_indices)):
+            codes[local], vocab = encode_categories(symbolic_values[local])
+            vocabularies.append(vocab)
+
+        return cls.from_codes(
+            feature_columns=feature_columns,
+            numeric_feature_indices=numeric_feature_indices,
+            symbolic_feature_indices=symbolic_feature_indices,
+            numeric=numeric,
+            codes=codes,
+            vocabularies=vocabularies,
+        )
+
+    @classmethod
+    def from_codes(
+        cls,
+        feature_columns: list[str],
+        numeric_feature_indices: list[int],
+        symbolic_feature_indices: list[int],
+        numeric: np.ndarray,
+        codes: np.ndarray,
+        vocabularies: list[list[str]],
+    ) -> "TriHSPAMCube":
+        """Cube from already encoded blocks; only the missing mask is derived."""
+        numeric = np.ascontiguousarray(numeric, dtype=np.float64)
+        codes = np.ascontiguousarray(codes, dtype=CODE_DTYPE)
+        f_count = len(feature_columns)
+        i_count, k_count = (numeric.shape[1:] if numeric.shape[0] else codes.shape[1:])
+
+        missing = np.zeros((f_count, i_count, k_count), dtype=bool)
+        for local, f_idx in enumerate(numeric_feature_indices):
+            missing[f_idx] = np.isnan(numeric[local])
+        for local, f_idx in enumerate(symbolic_feature_indices):
+            missing[f_idx] = codes[local] == MISSING_CODE
+
+        return cls(
+            feature_columns=list(feature_columns),
+            numeric_feature_indices=list(numeric_feature_indices),
+            symbolic_feature_indices=list(symbolic_feature_indices),
+            numeric=numeric,
+            codes=codes,
+            vocabularies=vocabularies,
+            missing=missing,
+        )
+
+    @classmethod
+    def from_object_cube(
+        cls,
+        cube: np.ndarray,
+        feature_columns: list[str],
+        numeric_feature_indices: list[int],
+        symbolic_feature_indices: list[int],
+    ) -> "TriHSPAMCube":
+        cube = np.asarray(cube, dtype=object)
+        numeric = np.empty((len(numeric_feature_indices),) + cube.shape[1:], dtype=np.float64)
+        for local, f_idx in enumerate(numeric_feature_indices):
+            flat = cube[f_idx].reshape(-1)
+            numeric[local] = np.array(
+                [np.nan if _is_missing(x) else float(x) for x in flat], dtype=np.float64
+            ).reshape(cube.shape[1:])
+
+        symbolic = cube[symbolic_feature_indices] if symbolic_feature_indices else np.empty((0,) + cube.shape[1:], dtype=object)
+        return cls.from_blocks(
+            feature_columns=feature_columns,
+            numeric_feature_indices=numeric_feature_indices,
+            symbolic_feature_indices=symbolic_feature_indices,
+            numeric=numeric,
+            symbolic_values=symbolic,
+        )
+
+
+def encode_categories(values: np.ndarray) -> tuple[np.ndarray, list[str]]:
+    """
+    Encode an array of raw category values into int16 codes against a sorted
+    vocabulary of their string forms. Missing values get MISSING_CODE.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind == "U":
+        # Plain strings: one np.unique, then only the distinct labels are
+        # checked for blanks (the only missing value a string can be).
+        vocab, inverse = np.unique(values.reshape(-1), return_inverse=True)
+        keep = np.char.strip(vocab) != ""
+        if int(keep.sum()) > np.iinfo(CODE_DTYPE).max:
+            raise ValueError(f"Too many categories for int16 codes: {int(keep.sum())}")
+        remap = np.where(keep, np.cumsum(keep) - 1, MISSING_CODE).astype(CODE_DTYPE)
+        return remap[inverse.reshape(-1)].reshape(values.shape), vocab[keep].tolist()
+
+    values = values.astype(object, copy=False)
+    flat = values.reshape(-1)
+    present = np.array([not _is_missing(x) for x in flat], dtype=bool)
+
+    codes = np.full(flat.shape, MISSING_CODE, dtype=CODE_DTYPE)
+    if present.any():
+        labels = np.array([str(x) for x in flat[present]], dtype=str)
+        vocab, inverse = np.unique(labels, return_inverse=True)
+        if vocab.size > np.iinfo(CODE_DTYPE).max:
+            raise ValueError(f"Too many categories for int16 codes: {vocab.size}")
+        codes[present] = inverse.astype(CODE_DTYPE)
+        vocabulary = vocab.tolist()
+    else:
+        vocabulary = []
+
+    return codes.reshape(values.shape), vocabulary
+
+
+# -----------------------------------------------------------------------------
+# Shared memory
+# -----------------------------------------------------------------------------
+
+_SHARED_BLOCKS = ("numeric", "codes", "missing")
+
+
+def share_cube(cube: TriHSPAMCube) -> tuple[shared_memory.SharedMemory, dict]:
+    """
+    Copy the cube blocks into one shared-memory segment.
+
+    Returns (segment, handle). The handle is small and picklable; pass it to
+    attach_cube() in another process. The caller owns the segment and must
+    close() and unlink() it when done.
+    """
+    layout = []
+    offset = 0
+    for name in _SHARED_BLOCKS:
+        block = getattr(cube, name)
+        offset = (offset + 63) // 64 * 64  # keep every block 64-byte aligned
+        layout.append((name, block.dtype.str, block.shape, offset))
+        offset += block.nbytes
+
+    segment = shared_memory.SharedMemory(create=True, size=max(1, offset))
+    for name, dtype, shape, start in layout:
+        view = np.ndarray(shape, dtype=dtype, buffer=segment.buf, offset=start)
+        view[...] = getattr(cube, name)
+
+    handle = {
+        "segment": segment.name,
+        "layout": layout,
+        "feature_columns": list(cube.feature_columns),
+        "numeric_feature_indices": list(cube.numeric_feature_indices),
+        "symbolic_feature_indices": list(cube.symbolic_feature_indices),
+        "vocabularies": [list(v) for v in cube.vocabularies],
+    }
+    return segment, handle
+
+
+def attach_cube(handle: dict) -> tuple[TriHSPAMCube, shared_memory.SharedMemory]:
+    """
+    Read-only cube backed by a segment created with share_cube() (no copy).
+    Keep the returned segment referenced for as long as the cube is used.
+    """
+    segment = shared_memory.SharedMemory(name=handle["segment"])
+    blocks = {}
+    for name, dtype, shape, start in handle["layout"]:
+        view = np.ndarray(tuple(shape), dtype=dtype, buffer=segment.buf, offset=start)
+        view.flags.writeable = False
+        blocks[name] = view
+
+    cube = TriHSPAMCube(
+        feature_columns=handle["feature_columns"],
+        numeric_feature_indices=handle["numeric_feature_indices"],
+        symbolic_feature_indices=handle["symbolic_feature_indices"],
+        vocabularies=handle["vocabularies"],
+        **blocks,
+    )
+    return cube, segment
@@ -4,12 +4,33 @@ import math
 import os
 import subprocess
 import tempfile
-from dataclasses import asdict, dataclass
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, replace
 from pathlib import Path
-from typing import Any
+from typing import Iterable, Iterator
 
 import numpy as np
 
+from .spmf_worker import get_spmf_pool
+from .trihspam_cache import TriHSPAMCache, cube_fingerprint, stage_key
+from .trihspam_cube import MISSING_CODE, TriHSPAMCube, _is_missing, attach_cube, share_cube
+from .trihspam_io import (
+    pack_subject_bitsets,
+    read_pattern_file,
+    unpack_subject_bitset,
+    write_sequence_file,
+)
+from .trihspam_miner import (
+    absolute_min_support,
+    bitset_to_sids,
+    embed_relaxed_pattern,
+    mine_aligned_patterns,
+    mine_relaxed_patterns,
+    relaxed_occurrence_masks,
+    vertical_index_from_item_array,
+)
+
 
 # -----------------------------------------------------------------------------
 # Config
@@ -24,11 +45,24 @@ class TriHSPAMConfig:
     n_bins: int = 5
     mv_method: str | None = None          # None | "locf"
     spm_algo: str = "fournier08closed"    # "fournier08closed" | "clospan" | "prefixspan" | "spam"
-    time_relaxed: bool = False            # v1: keep False
+                                          # | "native_fournier08closed" | "native_prefixspan"
+    time_relaxed: bool = False            # True: patterns may start at a different offset in each row
     coherence_threshold: float = 0.5
     overlap_filter: float | None = 0.8    # None to disable
     jar_path: str | None = None           # defaults to app/services/spmf_vd.jar
     keep_temp_files: bool = False
+    spmf_workers: int = 0                 # >0: reuse a pool of long-lived SPMF JVMs
+    spmf_timeout_s: float | None = None   # per mining job
+    n_jobs: int | None = None             # >1 (or -1 = all cores): score candidates in a process pool
+    max_patterns: int | None = None       # cap on mined patterns per mining pass
+    top_k_by_hvar3: int | None = None     # keep only the k most coherent triclusters
+    time_budget_s: float | None = None    # wall-clock budget for mining + scoring + filtering (best-so-far when exceeded)
+    cache_dir: str | None = None          # on-disk cache of abstractions / sequences / patterns
+    cache_max_bytes: int = 1 << 30
+
+
+SPMF_ALGOS = {"fournier08closed", "clospan", "prefixspan", "spam"}
+NATIVE_ALGOS = {"native_fournier08closed", "native_prefixspan"}
 
 
 # -----------------------------------------------------------------------------
@@ -44,7 +78,7 @@ def run_weather_trihspam(
 
     Expected cube_info format from build_trihspam_cube(...):
     {
-        "cube": np.ndarray of shape (F, I, K),
+        "cube": TriHSPAMCube of shape (F, I, K) (a legacy dtype=object ndarray is converted),
         "feature_columns": [...],
         "numeric_features": [...],
         "symbolic_features": [...],
@@ -56,84 +90,307 @@ def run_weather_trihspam(
         "window_size": ...
     }
     """
-    _validate_cube_info(cube_info)
-    _validate_config(config)
+    return run_weather_trihspam_sweep(cube_info, [config])[0]
 
-    if config.time_relaxed:
-        raise NotImplementedError(
-            "time_relaxed=True is not implemented in this first integration. "
-            "Use aligned TC-triclusters first."
+
+def run_weather_trihspam_sweep(
+    cube_info: dict,
+    configs: list[TriHSPAMConfig],
+) -> list[dict]:
+    """
+    Run several configs over one cube, sharing the stages they have in common.
+
+    LOCF, discretization and sequence encoding run once per distinct
+    (mv_method, disc_method, n_bins, time_relaxed). Configs that differ only
+    in min_I / min_J / coherence_threshold / overlap_filter / top_k_by_hvar3
+    (and min_K, except for the closed time-constrained algorithms, which mine
+    with it) form a mining group: the group is mined once at its lowest
+    thresholds and its candidates are scored in one batch; each config then
+    keeps the candidates meeting its own thresholds. Closed and frequent
+    pattern sets at a higher support are exactly the mined patterns with that
+    support, so the results match separate runs.
+
+    Returns one run_weather_trihspam() result per config, in order. Stage
+    timings (engine["timings"]) and n_patterns_mined are those of the shared
+    stage, so configs of one group report the same prepare_s / mine_s / score_s.
+    A time_budget_s covers a whole group, from preparing it to filtering its
+    last config.
+    """
+    _validate_cube_info(cube_info)
+    for config in configs:
+        _validate_config(config)
+
+    raw_cube = _as_typed_cube(cube_info)
+    context = _cube_context(cube_info, raw_cube)
+
+    groups: dict[tuple, list[int]] = {}
+    for position, config in enumerate(configs):
+        groups.setdefault(_mining_group_key(config), []).append(position)
+
+    prepared: dict[tuple, dict] = {}
+    shared = {"raw_cube": raw_cube, "cube_key": None, "imputed": {}}
+    results: list[dict | None] = [None] * len(configs)
+    for members in groups.values():
+        group_configs = [configs[p] for p in members]
+        mine_config = _mining_config(group_configs)
+        deadline = _deadline(mine_config)
+
+        prep_key = (
+            mine_config.mv_method,
+            mine_config.disc_method,
+            mine_config.n_bins,
+            mine_config.time_relaxed,
+            mine_config.cache_dir,
+            mine_config.cache_max_bytes,
         )
+        if prep_key not in prepared:
+            prepared[prep_key] = _prepare_stages(mine_config, context, shared)
+        prep = prepared[prep_key]
+        mined = _mine_and_score(prep, mine_config, deadline=deadline)
+
+        for position, config in zip(members, group_configs):
+            t0 = time.perf_counter()
+            mining_stats = dict(mined["stats"])
+            triclusters = _select_triclusters(
+                mined["candidates"], mined["scores"], config, prep, context, mining_stats, deadline=deadline
+            )
+            results[position] = _trihspam_result(
+                config=config,
+                cube=prep["cube"],
+                sequences=prep["sequences"],
+                abstractions=prep["abstractions"],
+                triclusters=triclusters,
+                mining_stats=mining_stats,
+                cache_hits=mined["cache_hits"],
+                context=context,
+                timings={
+                    "prepare_s": prep["prepare_s"],
+                    "mine_s": mined["mine_s"],
+                    "score_s": mined["score_s"],
+                    "filter_s": time.perf_counter() - t0,
+                },
+                group_size=len(members),
+            )
 
-    cube = np.array(cube_info["cube"], dtype=object, copy=True)
-    feature_columns = list(cube_info["feature_columns"])
-    numeric_features = list(cube_info["numeric_features"])
-    symbolic_features = list(cube_info["symbolic_features"])
-    numeric_feature_indices = list(cube_info["numeric_feature_indices"])
-    symbolic_feature_indices = list(cube_info["symbolic_feature_indices"])
-    windows_meta = list(cube_info.get("windows_meta", []))
-    window_ids = list(cube_info.get("window_ids", list(range(cube.shape[1]))))
+    return results
 
-    if config.mv_method == "locf":
-        cube = _impute_missing_with_locf_cube(cube)
 
-    abstractions = _build_abstractions(
+# -----------------------------------------------------------------------------
+# Sweep helpers
+# -----------------------------------------------------------------------------
+
+def _cube_context(cube_info: dict, cube: TriHSPAMCube) -> dict:
+    """Feature layout and window metadata that tricluster records refer to."""
+    return {
+        "feature_columns": list(cube_info["feature_columns"]),
+        "numeric_features": list(cube_info["numeric_features"]),
+        "symbolic_features": list(cube_info["symbolic_features"]),
+        "numeric_feature_indices": list(cube_info["numeric_feature_indices"]),
+        "symbolic_feature_indices": list(cube_info["symbolic_feature_indices"]),
+        "windows_meta": list(cube_info.get("windows_meta", [])),
+        "window_ids": list(cube_info.get("window_ids", list(range(cube.shape[1])))),
+    }
+
+
+def _prepare_stages(config: TriHSPAMConfig, context: dict, shared: dict) -> dict:
+    """
+    LOCF + abstractions + sequences for one config. `shared` holds the raw
+    cube and what can be reused across calls: its fingerprint and imputed copies.
+    """
+    t0 = time.perf_counter()
+    raw_cube = shared["raw_cube"]
+    cache = TriHSPAMCache(config.cache_dir, config.cache_max_bytes) if config.cache_dir else None
+    if cache is not None and shared["cube_key"] is None:
+        shared["cube_key"] = cube_fingerprint(raw_cube)
+    if config.mv_method not in shared["imputed"]:
+        shared["imputed"][config.mv_method] = (
+            _impute_missing_with_locf_cube(raw_cube) if config.mv_method == "locf" else raw_cube
+        )
+    cube = shared["imputed"][config.mv_method]
+    keys = _stage_keys(shared["cube_key"], config) if cache is not None else {}
+    cache_hits = dict.fromkeys(("abstractions", "sequences", "patterns"), False)
+
+    abstractions, cache_hits["abstractions"] = _abstractions_stage(
         cube=cube,
-        numeric_feature_indices=numeric_feature_indices,
-        symbolic_feature_indices=symbolic_feature_indices,
-        disc_method=config.disc_method,
-        n_bins=config.n_bins,
+        config=config,
+        numeric_feature_indices=context["numeric_feature_indices"],
+        symbolic_feature_indices=context["symbolic_feature_indices"],
+        cache=cache,
+        key=keys.get("abstractions"),
     )
-
-    sequences = _cube_to_sequences(
+    sequences, cache_hits["sequences"] = _sequences_stage(
         cube=cube,
         abstractions=abstractions,
-        relaxed=config.time_relaxed,
+        config=config,
+        cache=cache,
+        key=keys.get("sequences"),
     )
+    return {
+        "cube": cube,
+        "cube_key": shared["cube_key"],
+        "cache": cache,
+        "abstractions": abstractions,
+        "sequences": sequences,
+        "cache_hits": cache_hits,
+        "prepare_s": time.perf_counter() - t0,
+    }
 
-    item_to_int, reverse_map = _build_item_dictionary(sequences)
 
-    patterns = _mine_patterns_with_spmf(
-        sequences=sequences,
-        item_to_int=item_to_int,
-        reverse_map=reverse_map,
-        n_observations=cube.shape[1],
-        min_I=config.min_I,
-        min_K=config.min_K,
-        spm_algo=config.spm_algo,
-        jar_path=config.jar_path,
-        keep_temp_files=config.keep_temp_files,
+def _mine_and_score(prep: dict, mine_config: TriHSPAMConfig, deadline: float | None = None) -> dict:
+    """
+    Mine the prepared sequences and score every candidate in one batch.
+
+    Past `deadline` (a time.monotonic() value) candidate building stops and
+    unscored candidates get an infinite score; stats["truncated"] is then
+    "time_budget".
+    """
+    t0 = time.perf_counter()
+    cache = prep["cache"]
+    cache_hits = dict(prep["cache_hits"])
+    mining_stats = {"n_patterns": 0, "truncated": None, "min_I": mine_config.min_I}
+    patterns, cache_hits["patterns"] = _patterns_stage(
+        sequences=prep["sequences"],
+        config=mine_config,
+        n_observations=prep["cube"].shape[1],
+        stats=mining_stats,
+        cache=cache,
+        key=_stage_keys(prep["cube_key"], mine_config)["patterns"] if cache is not None else None,
+        deadline=deadline,
+    )
+    min_kept = mine_config.top_k_by_hvar3 or 1
+    candidates = []
+    for pattern_row in patterns:
+        if len(candidates) >= min_kept and _past(deadline):
+            mining_stats["truncated"] = mining_stats["truncated"] or "time_budget"
+            break
+        axes = _pattern_axes(
+            pattern_row,
+            min_I=mine_config.min_I,
+            min_J=mine_config.min_J,
+            min_K=mine_config.min_K,
+            relaxed=mine_config.time_relaxed,
+        )
+        if axes is not None:
+            candidates.append((pattern_row, axes))
+    mine_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    scores = _score_candidates(
+        prep["cube"],
+        [axes for _, axes in candidates],
+        n_jobs=mine_config.n_jobs,
+        deadline=deadline,
+        stats=mining_stats,
+    )
+    return {
+        "candidates": candidates,
+        "scores": scores,
+        "stats": mining_stats,
+        "cache_hits": cache_hits if cache is not None else None,
+        "mine_s": mine_s,
+        "score_s": time.perf_counter() - t0,
+    }
+
+
+# Fields that only filter or post-process the mined patterns of a group
+_PER_CONFIG_FIELDS = {"min_I", "min_J", "coherence_threshold", "overlap_filter", "top_k_by_hvar3"}
+_CLOSED_TIME_ALGOS = {"fournier08closed", "native_fournier08closed"}
+
+
+def _mining_group_key(config: TriHSPAMConfig) -> tuple:
+    per_config = set(_PER_CONFIG_FIELDS)
+    if config.spm_algo not in _CLOSED_TIME_ALGOS:
+        per_config.add("min_K")  # only a filter for the other algorithms
+    return tuple(sorted((k, v) for k, v in asdict(config).items() if k not in per_config))
+
+
+def _mining_config(group: list[TriHSPAMConfig]) -> TriHSPAMConfig:
+    """Config the group is mined with: its lowest min_I / min_J / min_K."""
+    return replace(
+        group[0],
+        min_I=min(c.min_I for c in group),
+        min_J=min(c.min_J for c in group),
+        min_K=min(c.min_K for c in group),
+    )
+
+
+def _deadline(config: TriHSPAMConfig) -> float | None:
+    return time.monotonic() + config.time_budget_s if config.time_budget_s is not None else None
+
+
+def _past(deadline: float | None) -> bool:
+    return deadline is not None and time.monotonic() >= deadline
+
+
+def _select_triclusters(
+    candidates: list[tuple[dict, tuple]],
+    scores: np.ndarray,
+    config: TriHSPAMConfig,
+    prep: dict,
+    context: dict,
+    mining_stats: dict,
+    deadline: float | None = None,
+) -> list[dict]:
+    """
+    Triclusters of one config out of its group's scored candidates.
+
+    With a `deadline`, candidates are built best score first, and building and
+    overlap filtering stop once it has passed and at least top_k_by_hvar3 (or
+    one) triclusters are kept; mining_stats["truncated"] is then "time_budget".
+    """
+    # Support a separate run at config.min_I would have mined with
+    min_support = max(
+        absolute_min_support(config.min_I, prep["cube"].shape[1]),
+        int(mining_stats["min_I"]),
     )
+    min_kept = config.top_k_by_hvar3 or 1
+
+    order = range(len(candidates))
+    if deadline is not None:
+        # Stable, so duplicates (equal axes, equal scores) keep their order
+        order = np.argsort(np.asarray(scores, dtype=np.float64), kind="stable")
 
     triclusters = []
-    for pattern_idx, pattern_row in enumerate(patterns):
-        tric = _pattern_to_tricluster(
-            pattern_row=pattern_row,
-            cube=cube,
-            feature_columns=feature_columns,
-            numeric_feature_indices=numeric_feature_indices,
-            symbolic_feature_indices=symbolic_feature_indices,
-            windows_meta=windows_meta,
-            window_ids=window_ids,
-            min_I=config.min_I,
-            min_J=config.min_J,
-            min_K=config.min_K,
-            coherence_threshold=config.coherence_threshold,
-            relaxed=config.time_relaxed,
-            tricluster_id=pattern_idx,
+    for position in order:
+        if len(triclusters) >= min_kept and _past(deadline):
+            mining_stats["truncated"] = mining_stats["truncated"] or "time_budget"
+            break
+        (pattern_row, axes), h_score = candidates[position], scores[position]
+        if h_score > config.coherence_threshold:
+            continue
+        if len(pattern_row["subject_ids"]) < min_support:
+            continue
+        if len(pattern_row["cols"]) < config.min_J or len(pattern_row["contexts"]) < config.min_K:
+            continue
+        triclusters.append(
+            _build_tricluster(
+                pattern_row=pattern_row,
+                axes=axes,
+                h_score=h_score,
+                sequences=prep["sequences"],
+                feature_columns=context["feature_columns"],
+                numeric_feature_indices=context["numeric_feature_indices"],
+                symbolic_feature_indices=context["symbolic_feature_indices"],
+                windows_meta=context["windows_meta"],
+                window_ids=context["window_ids"],
+                tricluster_id=pattern_row["index"],
+            )
         )
-        if tric is not None:
-            triclusters.append(tric)
 
     # Remove exact duplicates
     triclusters = _deduplicate_triclusters(triclusters)
 
     # Optional overlap filtering
     if config.overlap_filter is not None:
+        filter_stats = {"truncated": None}
         triclusters = _filter_overlapping_triclusters(
             triclusters,
             overlap_threshold=float(config.overlap_filter),
+            deadline=deadline,
+            min_kept=min_kept,
+            stats=filter_stats,
         )
+        mining_stats["truncated"] = mining_stats["truncated"] or filter_stats["truncated"]
 
     triclusters.sort(
         key=lambda x: (
@@ -144,27 +401,216 @@ def run_weather_trihspam(
             -x["shape"]["features"],
         )
     )
+    if config.top_k_by_hvar3 is not None:
+        triclusters = triclusters[:config.top_k_by_hvar3]
+    return triclusters
+
 
+def _trihspam_result(
+    config: TriHSPAMConfig,
+    cube: TriHSPAMCube,
+    sequences: EncodedSequences,
+    abstractions: dict,
+    triclusters: list[dict],
+    mining_stats: dict,
+    cache_hits: dict | None,
+    context: dict,
+    timings: dict,
+    group_size: int,
+) -> dict:
     return {
         "config": asdict(config),
         "engine": {
-            "aligned_only": True,
+            "aligned_only": not config.time_relaxed,
             "spm_algorithm": config.spm_algo,
             "n_input_observations": int(cube.shape[1]),
             "n_features": int(cube.shape[0]),
             "window_size": int(cube.shape[2]),
             "n_sequences": int(len(sequences)),
-            "n_patterns_mined": int(len(patterns)),
+            "n_patterns_mined": int(mining_stats["n_patterns"]),
+            "truncated": mining_stats["truncated"] is not None,
+            "truncation_reason": mining_stats["truncated"],
+            "effective_min_I": max(int(mining_stats["min_I"]), int(config.min_I)),
             "n_triclusters": int(len(triclusters)),
+            "cache_hits": cache_hits,
+            "timings": {name: round(float(value), 4) for name, value in timings.items()},
+            "mining_group_size": int(group_size),
         },
-        "feature_columns": feature_columns,
-        "numeric_features": numeric_features,
-        "symbolic_features": symbolic_features,
+        "feature_columns": context["feature_columns"],
+        "numeric_features": context["numeric_features"],
+        "symbolic_features": context["symbolic_features"],
         "abstractions": abstractions,
         "triclusters": triclusters,
     }
 
 
+# -----------------------------------------------------------------------------
+# Cached stages
+# -----------------------------------------------------------------------------
+# Each stage is keyed by the key of its input plus the parameters it depends
+# on. A re-run that only changes coherence_threshold / overlap_filter /
+# top_k_by_hvar3 therefore finds its mined patterns and goes straight to scoring.
+
+def _stage_keys(cube_key: str, config: TriHSPAMConfig) -> dict[str, str]:
+    abstractions = stage_key(
+        cube_key,
+        stage="abstractions",
+        mv_method=config.mv_method,
+        disc_method=config.disc_method,
+        n_bins=config.n_bins,
+    )
+    sequences = stage_key(abstractions, stage="sequences", time_relaxed=config.time_relaxed)
+    # Only complete mining results are stored, and those do not depend on
+    # max_patterns / time_budget_s, which can only cut a run short.
+    patterns = stage_key(
+        sequences,
+        stage="patterns",
+        min_I=config.min_I,
+        min_J=config.min_J,
+        min_K=config.min_K,
+        spm_algo=config.spm_algo,
+    )
+    return {"abstractions": abstractions, "sequences": sequences, "patterns": patterns}
+
+
+def _abstractions_stage(
+    cube: TriHSPAMCube,
+    config: TriHSPAMConfig,
+    numeric_feature_indices: list[int],
+    symbolic_feature_indices: list[int],
+    cache: TriHSPAMCache | None,
+    key: str | None,
+) -> tuple[dict, bool]:
+    if cache is not None:
+        entry = cache.load("abstractions", key)
+        if entry is not None:
+            meta, _ = entry
+            return {int(f_idx): abstraction for f_idx, abstraction in meta["abstractions"]}, True
+
+    abstractions = _build_abstractions(
+        cube=cube,
+        numeric_feature_indices=numeric_feature_indices,
+        symbolic_feature_indices=symbolic_feature_indices,
+        disc_method=config.disc_method,
+        n_bins=config.n_bins,
+    )
+    if cache is not None:
+        cache.store("abstractions", key, {"abstractions": list(abstractions.items())}, {})
+    return abstractions, False
+
+
+def _sequences_stage(
+    cube: TriHSPAMCube,
+    abstractions: dict,
+    config: TriHSPAMConfig,
+    cache: TriHSPAMCache | None,
+    key: str | None,
+) -> tuple[EncodedSequences, bool]:
+    if cache is not None:
+        entry = cache.load("sequences", key)
+        if entry is not None:
+            meta, arrays = entry
+            return EncodedSequences(item_ids=arrays["item_ids"], **meta), True
+
+    sequences = _cube_to_sequences(
+        cube=cube,
+        abstractions=abstractions,
+        relaxed=config.time_relaxed,
+    )
+    if cache is not None:
+        meta = {"labels": sequences.labels, "n_symbols": sequences.n_symbols, "relaxed": sequences.relaxed}
+        cache.store("sequences", key, meta, {"item_ids": sequences.item_ids})
+    return sequences, False
+
+
+def _patterns_stage(
+    sequences: EncodedSequences,
+    config: TriHSPAMConfig,
+    n_observations: int,
+    stats: dict,
+    cache: TriHSPAMCache | None,
+    key: str | None,
+    deadline: float | None = None,
+) -> tuple[Iterable[dict], bool]:
+    """
+    Mined pattern rows (see _mine_patterns). Without a cache they stream;
+    with one they are materialized so a complete run can be stored.
+    """
+    if cache is not None:
+        entry = cache.load("patterns", key)
+        if entry is not None:
+            meta, arrays = entry
+            stats.update(meta["stats"])
+            return _unpack_patterns(arrays, sequences), True
+
+    patterns = _mine_in_passes(
+        sequences=sequences,
+        config=config,
+        n_observations=n_observations,
+        stats=stats,
+        deadline=deadline,
+    )
+    if cache is None:
+        return patterns, False
+
+    patterns = list(patterns)
+    if stats["truncated"] is None:
+        cache.store("patterns", key, {"stats": dict(stats)}, _pack_patterns(patterns, len(sequences)))
+    return patterns, False
+
+
+def _pack_patterns(rows: list[dict], n_sequences: int) -> dict[str, np.ndarray]:
+    """
+    Pattern rows as flat arrays with offsets: itemset_ptr indexes item_ptr per
+    pattern, item_ptr indexes the int32 items per itemset, and sid_words holds
+    one subject-id bitset per pattern (see trihspam_io). Relaxed row_contexts
+    are concatenated row-major. cols / contexts are not stored; they follow
+    from the item ids.
+    """
+    itemsets = [itemset for row in rows for itemset in row["itemset_ids"]]
+    arrays = {
+        "index": np.array([row["index"] for row in rows], dtype=np.int64),
+        "support": np.array([row["support"] for row in rows], dtype=np.int64),
+        "itemset_ptr": _offsets(len(row["itemset_ids"]) for row in rows),
+        "item_ptr": _offsets(len(itemset) for itemset in itemsets),
+        "items": np.fromiter((item for itemset in itemsets for item in itemset), dtype=np.int32),
+        "sid_words": pack_subject_bitsets([row["subject_ids"] for row in rows], n_sequences),
+    }
+    if rows and "row_contexts" in rows[0]:
+        arrays["row_contexts"] = np.concatenate(
+            [np.asarray(row["row_contexts"], dtype=np.int16).ravel() for row in rows]
+        )
+    return arrays
+
+
+def _unpack_patterns(arrays: dict[str, np.ndarray], sequences: EncodedSequences) -> list[dict]:
+    feat_of, ctx_of = sequences.axes_table()
+    itemset_ptr = arrays["itemset_ptr"].tolist()
+    item_ptr = arrays["item_ptr"].tolist()
+    items = arrays["items"].tolist()
+    sid_words = arrays["sid_words"]
+    row_contexts = arrays.get("row_contexts")
+
+    rows = []
+    rc_offset = 0
+    for p, (index, support) in enumerate(zip(arrays["index"].tolist(), arrays["support"].tolist())):
+        itemset_ids = [items[item_ptr[s]:item_ptr[s + 1]] for s in range(itemset_ptr[p], itemset_ptr[p + 1])]
+        row = _pattern_row(index, itemset_ids, support, feat_of, ctx_of, min_J=1, min_K=1)
+        row["subject_ids"] = unpack_subject_bitset(sid_words[p])
+        if row_contexts is not None:
+            size = len(row["subject_ids"]) * len(itemset_ids)
+            block = row_contexts[rc_offset:rc_offset + size].astype(np.int64)
+            row["row_contexts"] = block.reshape(len(row["subject_ids"]), len(itemset_ids))
+            rc_offset += size
+        rows.append(row)
+    return rows
+
+
+def _offsets(lengths: Iterable[int]) -> np.ndarray:
+    counts = np.fromiter(lengths, dtype=np.int64)
+    return np.concatenate([np.zeros(1, dtype=np.int64), np.cumsum(counts)])
+
+
 # -----------------------------------------------------------------------------
 # Validation
 # -----------------------------------------------------------------------------
@@ -182,9 +628,11 @@ def _validate_cube_info(cube_info: dict) -> None:
     if missing:
         raise ValueError(f"cube_info is missing keys: {missing}")
 
-    cube = np.asarray(cube_info["cube"], dtype=object)
-    if cube.ndim != 3:
-        raise ValueError(f"cube must be 3D with shape (F, I, K). Got shape={cube.shape}")
+    cube = cube_info["cube"]
+    if not isinstance(cube, TriHSPAMCube):
+        cube = np.asarray(cube, dtype=object)
+        if cube.ndim != 3:
+            raise ValueError(f"cube must be 3D with shape (F, I, K). Got shape={cube.shape}")
 
     f = cube.shape[0]
     feature_columns = cube_info["feature_columns"]
@@ -194,6 +642,18 @@ def _validate_cube_info(cube_info: dict) -> None:
         )
 
 
+def _as_typed_cube(cube_info: dict) -> TriHSPAMCube:
+    cube = cube_info["cube"]
+    if isinstance(cube, TriHSPAMCube):
+        return cube
+    return TriHSPAMCube.from_object_cube(
+        cube,
+        feature_columns=list(cube_info["feature_columns"]),
+        numeric_feature_indices=list(cube_info["numeric_feature_indices"]),
+        symbolic_feature_indices=list(cube_info["symbolic_feature_indices"]),
+    )
+
+
 def _validate_config(config: TriHSPAMConfig) -> None:
     if config.min_I <= 0:
         raise ValueError("min_I must be positive.")
@@ -205,45 +665,63 @@ def _validate_config(config: TriHSPAMConfig) -> None:
         raise ValueError("n_bins must be positive.")
     if config.disc_method not in {"eq_size", "eq_width"}:
         raise ValueError("disc_method must be 'eq_size' or 'eq_width'.")
-    if config.spm_algo not in {"fournier08closed", "clospan", "prefixspan", "spam"}:
+    if config.spm_algo not in SPMF_ALGOS | NATIVE_ALGOS:
         raise ValueError("Unsupported spm_algo.")
     if config.mv_method not in {None, "locf"}:
         raise ValueError("mv_method must be None or 'locf'.")
+    if config.spmf_workers < 0:
+        raise ValueError("spmf_workers must be >= 0.")
+    if config.spmf_timeout_s is not None and config.spmf_timeout_s <= 0:
+        raise ValueError("spmf_timeout_s must be positive or None.")
+    if config.n_jobs is not None and (config.n_jobs == 0 or config.n_jobs < -1):
+        raise ValueError("n_jobs must be None, -1 or a positive integer.")
+    if config.max_patterns is not None and config.max_patterns <= 0:
+        raise ValueError("max_patterns must be positive or None.")
+    if config.top_k_by_hvar3 is not None and config.top_k_by_hvar3 <= 0:
+        raise ValueError("top_k_by_hvar3 must be positive or None.")
+    if config.time_budget_s is not None and config.time_budget_s <= 0:
+        raise ValueError("time_budget_s must be positive or None.")
+    if config.cache_max_bytes <= 0:
+        raise ValueError("cache_max_bytes must be positive.")
 
 
 # -----------------------------------------------------------------------------
 # Missing values
 # -----------------------------------------------------------------------------
 
-def _is_missing(value: Any) -> bool:
-    if value is None:
-        return True
-    if isinstance(value, str):
-        return value.strip() == ""
-    try:
-        return bool(np.isnan(value))
-    except Exception:
-        return False
-
-
-def _impute_missing_with_locf_cube(cube: np.ndarray) -> np.ndarray:
+def _impute_missing_with_locf_cube(cube: TriHSPAMCube) -> TriHSPAMCube:
     """
     LOCF along the time axis, for each feature-observation pair.
-    cube shape: (F, I, K)
+    cube shape: (F, I, K). Leading gaps stay missing.
     """
-    out = np.array(cube, dtype=object, copy=True)
-    f_count, i_count, k_count = out.shape
+    numeric = _forward_fill_last_axis(cube.numeric, np.isnan(cube.numeric))
+    codes = _forward_fill_last_axis(cube.codes, cube.codes == MISSING_CODE)
+
+    missing = np.empty_like(cube.missing)
+    missing[cube.numeric_feature_indices] = np.isnan(numeric)
+    missing[cube.symbolic_feature_indices] = codes == MISSING_CODE
+
+    return TriHSPAMCube(
+        feature_columns=list(cube.feature_columns),
+        numeric_feature_indices=list(cube.numeric_feature_indices),
+        symbolic_feature_indices=list(cube.symbolic_feature_indices),
+        numeric=numeric,
+        codes=codes,
+        vocabularies=[list(v) for v in cube.vocabularies],
+        missing=missing,
+    )
 
-    for f_idx in range(f_count):
-        for i_idx in range(i_count):
-            last_value = None
-            for k_idx in range(k_count):
-                val = out[f_idx, i_idx, k_idx]
-                if _is_missing(val):
-                    out[f_idx, i_idx, k_idx] = last_value
-                else:
-                    last_value = val
-    return out
+
+def _forward_fill_last_axis(values: np.ndarray, missing: np.ndarray) -> np.ndarray:
+    """
+    Forward fill along the last axis: each missing cell takes the value at the
+    latest present index before it, found with a running maximum over the
+    present indices. Leading gaps point at index 0, which is itself missing.
+    """
+    positions = np.arange(values.shape[-1])
+    source = np.where(missing, 0, positions)
+    np.maximum.accumulate(source, axis=-1, out=source)
+    return np.take_along_axis(values, source, axis=-1)
 
 
 # -----------------------------------------------------------------------------
@@ -251,7 +729,7 @@ def _impute_missing_with_locf_cube(cube: np.ndarray) -> np.ndarray:
 # -----------------------------------------------------------------------------
 
 def _build_abstractions(
-    cube: np.ndarray,
+    cube: TriHSPAMCube,
     numeric_feature_indices: list[int],
     symbolic_feature_indices: list[int],
     disc_method: str,
@@ -260,13 +738,8 @@ def _build_abstractions(
     abstractions: dict[int, dict] = {}
 
     for f_idx in numeric_feature_indices:
-        values = []
-        flat = cube[f_idx].reshape(-1)
-        for x in flat:
-            if not _is_missing(x):
-                values.append(float(x))
-
-        values_arr = np.array(values, dtype=float)
+        block = cube.numeric[cube.local_index[f_idx]]
+        values_arr = block[~np.isnan(block)]
         if values_arr.size == 0:
             abstractions[f_idx] = {
                 "type": "numeric",
@@ -300,12 +773,10 @@ def _build_abstractions(
         }
 
     for f_idx in symbolic_feature_indices:
-        vals = []
-        flat = cube[f_idx].reshape(-1)
-        for x in flat:
-            if not _is_missing(x):
-                vals.append(str(x))
-        unique_vals = sorted(set(vals))
+        local = cube.local_index[f_idx]
+        vocab = cube.vocabularies[local]
+        present = np.unique(cube.codes[local])
+        unique_vals = sorted(vocab[int(c)] for c in present if c != MISSING_CODE)
         abstractions[f_idx] = {
             "type": "symbolic",
             "values": unique_vals,
@@ -314,114 +785,199 @@ def _build_abstractions(
     return abstractions
 
 
-def _assign_numeric_bin(value: Any, abstraction: dict) -> str | None:
-    if _is_missing(value):
-        return None
+def _encode_symbols(cube: TriHSPAMCube, abstractions: dict) -> tuple[np.ndarray, list[list[str]]]:
+    """
+    Discretize the whole cube at once.
+
+    Returns:
+        symbols: int16 (F, I, K), index into the feature's labels, -1 when missing
+        labels: per feature, symbol index -> label ("bin2", "hot", ...)
+    """
+    f_count, i_count, k_count = cube.shape
+    symbols = np.full((f_count, i_count, k_count), -1, dtype=np.int16)
+    labels: list[list[str]] = []
 
-    value = float(value)
-    edges = np.array(abstraction.get("edges", []), dtype=float)
-    labels = list(abstraction.get("labels", []))
+    for f_idx in range(f_count):
+        abstraction = abstractions[f_idx]
+        local = cube.local_index[f_idx]
 
-    if edges.size < 2 or len(labels) <= 1:
-        return "bin0"
+        if abstraction["type"] == "numeric":
+            feat_labels = list(abstraction.get("labels", [])) or ["bin0"]
+            edges = np.asarray(abstraction.get("edges", []), dtype=float)
+            block = cube.numeric[local]
+            present = ~np.isnan(block)
 
-    # searchsorted over inner edges gives 0..n_bins-1
-    inner = edges[1:-1]
-    idx = int(np.searchsorted(inner, value, side="right"))
-    idx = max(0, min(idx, len(labels) - 1))
-    return labels[idx]
+            if edges.size < 2 or len(feat_labels) <= 1:
+                bins = np.zeros(block.shape, dtype=np.int64)
+            else:
+                # searchsorted over inner edges gives 0..n_bins-1
+                bins = np.searchsorted(edges[1:-1], block, side="right")
+                bins = np.clip(bins, 0, len(feat_labels) - 1)
+            symbols[f_idx] = np.where(present, bins, -1)
+        else:
+            feat_labels = list(abstraction.get("values", []))
+            position = {value: idx for idx, value in enumerate(feat_labels)}
+            # vocabulary code -> abstraction index; the trailing -1 serves code -1 (missing)
+            lookup = np.array(
+                [position.get(value, -1) for value in cube.vocabularies[local]] + [-1],
+                dtype=np.int16,
+            )
+            symbols[f_idx] = lookup[cube.codes[local]]
 
+        labels.append(feat_labels)
 
-def _assign_symbolic_value(value: Any) -> str | None:
-    if _is_missing(value):
-        return None
-    return str(value)
+    return symbols, labels
 
 
 # -----------------------------------------------------------------------------
 # Sequence conversion
 # -----------------------------------------------------------------------------
 
-def _cube_to_sequences(
-    cube: np.ndarray,
-    abstractions: dict,
-    relaxed: bool = False,
-) -> dict[str, list[list[str]]]:
-    """
-    Convert cube (F, I, K) to observation-wise sequences.
-    Returns:
-        {
-            "X0": [["f0_0#bin1", "f1_0#cold"], ["f0_1#bin2"], ...],
-            "X1": ...
-        }
+@dataclass
+class EncodedSequences:
     """
-    f_count, i_count, k_count = cube.shape
-    result: dict[str, list[list[str]]] = {}
-
-    for obs_idx in range(i_count):
-        itemsets: list[list[str]] = []
-        for ctx_idx in range(k_count):
-            items: list[str] = []
-            for feat_idx in range(f_count):
-                abstraction = abstractions[feat_idx]
-                raw_val = cube[feat_idx, obs_idx, ctx_idx]
-
-                if abstraction["type"] == "numeric":
-                    symbol = _assign_numeric_bin(raw_val, abstraction)
-                else:
-                    symbol = _assign_symbolic_value(raw_val)
-
-                if symbol is None:
-                    continue
+    Observation-wise sequences as integer item ids.
 
-                feature_token = f"f{feat_idx}" if relaxed else f"f{feat_idx}_{ctx_idx}"
-                items.append(f"{feature_token}#{symbol}")
-
-            items.sort()
-            itemsets.append(items)
+    item_ids[i, k, f] is the id of feature f's symbol at context k of
+    observation i (0 when missing). Ids are arithmetic over (feat, ctx, symbol):
+        aligned: 1 + (ctx * F + feat) * S + symbol   -> token "f{feat}_{ctx}#{label}"
+        relaxed: 1 + feat * S + symbol               -> token "f{feat}#{label}"
+    so the ids of one itemset are already in ascending order, as SPMF expects.
+    """
 
-        result[f"X{obs_idx}"] = itemsets
+    item_ids: np.ndarray
+    labels: list[list[str]]
+    n_symbols: int
+    relaxed: bool
+
+    def __len__(self) -> int:
+        return int(self.item_ids.shape[0])
+
+    @property
+    def n_contexts(self) -> int:
+        return int(self.item_ids.shape[1])
+
+    @property
+    def n_features(self) -> int:
+        return int(self.item_ids.shape[2])
+
+    def decode(self, item_id: int) -> tuple[int, int | None, int]:
+        """item id -> (feat, ctx, symbol); ctx is None in relaxed mode."""
+        rest, symbol = divmod(int(item_id) - 1, self.n_symbols)
+        if self.relaxed:
+            return rest, None, symbol
+        ctx_idx, feat_idx = divmod(rest, self.n_features)
+        return feat_idx, ctx_idx, symbol
+
+    @property
+    def max_item_id(self) -> int:
+        slots = self.n_features if self.relaxed else self.n_contexts * self.n_features
+        return slots * self.n_symbols
+
+    def axes_table(self) -> tuple[list[int], list[int]]:
+        """
+        Lookup lists indexed by item id: feature index and context index
+        (-1 in relaxed mode). Index 0 is unused.
+        """
+        ids = np.arange(self.max_item_id + 1, dtype=np.int64)
+        rest = np.maximum(ids - 1, 0) // self.n_symbols
+        if self.relaxed:
+            return rest.tolist(), [-1] * ids.size
+        return (rest % self.n_features).tolist(), (rest // self.n_features).tolist()
+
+    def token(self, item_id: int) -> str:
+        feat_idx, ctx_idx, symbol = self.decode(item_id)
+        feature_token = f"f{feat_idx}" if ctx_idx is None else f"f{feat_idx}_{ctx_idx}"
+        return f"{feature_token}#{self.labels[feat_idx][symbol]}"
 
-    return result
 
+def _cube_to_sequences(
+    cube: TriHSPAMCube,
+    abstractions: dict,
+    relaxed: bool = False,
+) -> EncodedSequences:
+    """
+    Convert cube (F, I, K) to observation-wise integer sequences.
+    Observation i is the sequence X{i}; its k-th itemset is item_ids[i, k].
+    """
+    symbols, labels = _encode_symbols(cube, abstractions)
+    f_count, _, k_count = symbols.shape
+    n_symbols = max(1, max(len(x) for x in labels)) if labels else 1
 
-def _build_item_dictionary(sequences: dict[str, list[list[str]]]) -> tuple[dict[str, int], dict[int, str]]:
-    item_to_int: dict[str, int] = {}
-    next_id = 1
+    feat = np.arange(f_count, dtype=np.int64)[:, None, None]
+    if relaxed:
+        slot = feat
+    else:
+        slot = np.arange(k_count, dtype=np.int64)[None, None, :] * f_count + feat
 
-    for itemsets in sequences.values():
-        for itemset in itemsets:
-            for item in itemset:
-                if item not in item_to_int:
-                    item_to_int[item] = next_id
-                    next_id += 1
+    ids = np.where(symbols >= 0, 1 + slot * n_symbols + symbols, 0)
+    dtype = np.int32 if ids.size == 0 or ids.max() < np.iinfo(np.int32).max else np.int64
 
-    reverse_map = {v: k for k, v in item_to_int.items()}
-    return item_to_int, reverse_map
+    return EncodedSequences(
+        item_ids=np.ascontiguousarray(ids.transpose(1, 2, 0), dtype=dtype),
+        labels=labels,
+        n_symbols=int(n_symbols),
+        relaxed=bool(relaxed),
+    )
 
 
 def _write_spmf_input(
-    sequences: dict[str, list[list[str]]],
-    item_to_int: dict[str, int],
+    sequences: EncodedSequences,
     output_path: Path,
     include_timestamps: bool,
 ) -> None:
-    with output_path.open("w", encoding="utf-8") as f:
-        for _, itemsets in sequences.items():
-            parts: list[str] = []
-            time_idx = 0
-            for itemset in itemsets:
-                if include_timestamps:
-                    parts.append(f"<{time_idx}>")
-                    time_idx += 1
+    """
+    Write SPMF's text format straight from the item id array.
+
+    Each context becomes a row of [<k>] id_0 .. id_{F-1} -1 and each sequence
+    ends with -2. Every token is a code into a table holding the text of each
+    distinct token (item ids, <k>, -1, -2), formatted once; the file is then
+    assembled from that table with array operations, with no string per cell.
+    Missing ids (0) and empty itemsets are masked out.
+    """
+    i_count, k_count, f_count = sequences.item_ids.shape
+    ids = sequences.item_ids.astype(np.int64)
+    present = ids > 0
+    non_empty = present.any(axis=2)
+
+    # Token codes: item id as is, then -1, -2 and the <k> timestamps
+    n_items = int(sequences.max_item_id)
+    end_itemset, end_sequence, first_time = n_items + 1, n_items + 2, n_items + 3
+    table = np.array(
+        [b""]
+        + [str(x).encode("ascii") for x in range(1, n_items + 1)]
+        + [b"-1", b"-2"]
+        + [f"<{k}>".encode("ascii") for k in range(k_count)]
+    )
+
+    lead = 1 if include_timestamps else 0
+    width = lead + f_count + 1
+    codes = np.zeros((i_count, k_count, width), dtype=np.int64)
+    keep = np.zeros((i_count, k_count, width), dtype=bool)
+
+    if include_timestamps:
+        codes[:, :, 0] = first_time + np.arange(k_count)[None, :]
+        keep[:, :, 0] = non_empty
+    codes[:, :, lead:lead + f_count] = ids
+    keep[:, :, lead:lead + f_count] = present
+    codes[:, :, -1] = end_itemset
+    keep[:, :, -1] = non_empty
+
+    codes = np.concatenate([codes.reshape(i_count, -1), np.full((i_count, 1), end_sequence)], axis=1)
+    keep = np.concatenate([keep.reshape(i_count, -1), np.ones((i_count, 1), dtype=bool)], axis=1)
+    tokens = codes[keep]
 
-                if itemset:
-                    encoded_items = [str(item_to_int[item]) for item in itemset]
-                    parts.extend(encoded_items)
-                    parts.append("-1")
+    # One fixed-width byte row per token plus its separator: a space, or a
+    # newline after the -2 closing each sequence
+    token_width = table.dtype.itemsize
+    chars = np.zeros((tokens.size, token_width + 1), dtype=np.uint8)
+    chars[:, :token_width] = table[tokens].view(np.uint8).reshape(tokens.size, token_width)
+    lengths = np.char.str_len(table)[tokens]
+    chars[np.arange(tokens.size), lengths] = np.where(tokens == end_sequence, ord("\n"), ord(" "))
 
-            parts.append("-2")
-            f.write(" ".join(parts) + "\n")
+    text = chars[np.arange(token_width + 1)[None, :] <= lengths[:, None]]
+    with output_path.open("wb") as f:
+        text.tofile(f)
 
 
 # -----------------------------------------------------------------------------
@@ -432,17 +988,301 @@ def _default_jar_path() -> Path:
     return Path(__file__).resolve().parent / "spmf_vd.jar"
 
 
+def _mine_in_passes(
+    sequences: EncodedSequences,
+    config: TriHSPAMConfig,
+    n_observations: int,
+    stats: dict,
+    deadline: float | None = None,
+) -> Iterable[dict]:
+    """
+    Mine with config.max_patterns / `deadline` (the time.monotonic() at which
+    config.time_budget_s runs out) as limits.
+
+    Without limits this is a single streaming pass at config.min_I. With
+    limits, passes run from high to low support (8x, 4x, 2x, 1x min_I), so
+    cheap, well-supported patterns come first. When a pass hits a limit, the
+    last pass that finished is returned (or the partial pass, if none did),
+    and stats["truncated"] records why. stats["min_I"] is the support the
+    returned patterns were mined at.
+    """
+    common = dict(
+        sequences=sequences,
+        n_observations=n_observations,
+        min_J=config.min_J,
+        min_K=config.min_K,
+        spm_algo=config.spm_algo,
+        jar_path=config.jar_path,
+        keep_temp_files=config.keep_temp_files,
+        spmf_workers=config.spmf_workers,
+        spmf_timeout_s=config.spmf_timeout_s,
+    )
+
+    if config.max_patterns is None and config.time_budget_s is None:
+        stats["min_I"] = config.min_I
+        return _mine_patterns(min_I=config.min_I, stats=stats, **common)
+
+    if deadline is None:
+        deadline = _deadline(config)
+    levels = sorted({min(config.min_I * factor, n_observations) for factor in (8, 4, 2)} | {config.min_I}, reverse=True)
+
+    best_rows: list[dict] | None = None
+    reason = None
+    for level in levels:
+        pass_stats = {"n_patterns": 0, "truncated": None, "min_I": level}
+        rows = list(
+            _mine_patterns(
+                min_I=level,
+                deadline=deadline,
+                max_patterns=config.max_patterns,
+                stats=pass_stats,
+                **common,
+            )
+        )
+        if pass_stats["truncated"] is None or best_rows is None:
+            best_rows = rows
+            stats.update(pass_stats)
+        if pass_stats["truncated"] is not None:
+            reason = pass_stats["truncated"]
+            break
+
+    stats["truncated"] = reason
+    return best_rows or []
+
+
+def _mine_patterns(
+    sequences: EncodedSequences,
+    n_observations: int,
+    min_I: int,
+    min_K: int,
+    spm_algo: str,
+    jar_path: str | None,
+    keep_temp_files: bool,
+    spmf_workers: int = 0,
+    spmf_timeout_s: float | None = None,
+    min_J: int = 1,
+    stats: dict | None = None,
+    deadline: float | None = None,
+    max_patterns: int | None = None,
+    touching_from: int = 0,
+) -> Iterator[dict]:
+    """
+    Lazily yields mined patterns that pass min_I / min_J / min_K, as rows:
+        {
+            "index": 17,                      # position among all mined patterns
+            "itemset_ids": [[13, 58], [71]],  # item ids per itemset, ascending
+            "support": 5,
+            "subject_ids": [0, 1, 2, 4, 8],
+            "cols": [0, 3],                   # feature indices
+            "contexts": [0, 1],               # context indices
+        }
+    Relaxed sequences have no fixed contexts: "contexts" is then the itemset
+    positions 0..m-1, and "row_contexts" an (n_rows, m) array with the
+    timestamps each itemset matched in each row of subject_ids.
+    stats["n_patterns"] counts every mined pattern, filtered or not. Mining
+    stops early at `deadline` (a time.monotonic() value) or after
+    `max_patterns` mined patterns, setting stats["truncated"].
+    touching_from > 0 restricts the native miners to patterns supported by
+    some sequence at or after that index (SPMF cannot do this and raises).
+    """
+    if spm_algo in NATIVE_ALGOS:
+        return _mine_patterns_native(
+            sequences=sequences,
+            n_observations=n_observations,
+            min_I=min_I,
+            min_J=min_J,
+            min_K=min_K,
+            spm_algo=spm_algo,
+            stats=stats,
+            deadline=deadline,
+            max_patterns=max_patterns,
+            touching_from=touching_from,
+        )
+    if touching_from:
+        raise ValueError("touching_from is only supported by the native miners.")
+    return _mine_patterns_with_spmf(
+        sequences=sequences,
+        n_observations=n_observations,
+        min_I=min_I,
+        min_J=min_J,
+        min_K=min_K,
+        spm_algo=spm_algo,
+        jar_path=jar_path,
+        keep_temp_files=keep_temp_files,
+        spmf_workers=spmf_workers,
+        spmf_timeout_s=spmf_timeout_s,
+        stats=stats,
+        deadline=deadline,
+        max_patterns=max_patterns,
+    )
+
+
+def _mine_patterns_native(
+    sequences: EncodedSequences,
+    n_observations: int,
+    min_I: int,
+    min_J: int,
+    min_K: int,
+    spm_algo: str,
+    stats: dict | None = None,
+    deadline: float | None = None,
+    max_patterns: int | None = None,
+    touching_from: int = 0,
+) -> Iterator[dict]:
+    """
+    In-process replacement for the jar.
+
+    native_fournier08closed mirrors the Fournier08-Closed+time call below
+    (interval 1..1, whole interval >= min_K-1, closed patterns only);
+    native_prefixspan mirrors PrefixSpan_AGP (all frequent patterns).
+    """
+    if sequences.relaxed:
+        yield from _mine_relaxed_native(
+            sequences=sequences,
+            n_observations=n_observations,
+            min_I=min_I,
+            min_J=min_J,
+            min_K=min_K,
+            spm_algo=spm_algo,
+            stats=stats,
+            deadline=deadline,
+            max_patterns=max_patterns,
+            touching_from=touching_from,
+        )
+        return
+
+    vertical = vertical_index_from_item_array(sequences.item_ids)
+    item_ctx = {item_id: sequences.decode(item_id)[1] for item_id in vertical}
+
+    closed_time = spm_algo == "native_fournier08closed"
+    miner_stats: dict = {}
+    mined = mine_aligned_patterns(
+        vertical=vertical,
+        item_ctx=item_ctx,
+        min_support=absolute_min_support(min_I, n_observations),
+        closed=closed_time,
+        contiguous=closed_time,
+        min_span=max(1, min_K) if closed_time else 1,
+        deadline=deadline,
+        max_results=max_patterns,
+        stats=miner_stats,
+        touching_from=touching_from,
+    )
+    if stats is not None and miner_stats.get("truncated"):
+        stats["truncated"] = miner_stats["truncated"]
+
+    feat_of, ctx_of = sequences.axes_table()
+    for index, (itemset_ids, bits) in enumerate(mined):
+        if _past(deadline):
+            if stats is not None:
+                stats["truncated"] = "time_budget"
+            break
+        if stats is not None:
+            stats["n_patterns"] += 1
+        support = bits.bit_count()
+        if support < min_I:
+            continue
+        row = _pattern_row(index, itemset_ids, support, feat_of, ctx_of, min_J, min_K)
+        if row is not None:
+            row["subject_ids"] = bitset_to_sids(bits)
+            yield row
+
+
+def _mine_relaxed_native(
+    sequences: EncodedSequences,
+    n_observations: int,
+    min_I: int,
+    min_J: int,
+    min_K: int,
+    spm_algo: str,
+    stats: dict | None = None,
+    deadline: float | None = None,
+    max_patterns: int | None = None,
+    touching_from: int = 0,
+) -> Iterator[dict]:
+    """
+    Relaxed counterpart of the native miners: native_fournier08closed gives
+    closed patterns of consecutive itemsets at any offset, native_prefixspan
+    all frequent patterns with gaps. Matched timestamps come straight from the
+    miner as row_contexts.
+    """
+    closed_time = spm_algo == "native_fournier08closed"
+    miner_stats: dict = {}
+    mined = mine_relaxed_patterns(
+        relaxed_occurrence_masks(sequences.item_ids),
+        min_support=absolute_min_support(min_I, n_observations),
+        closed=closed_time,
+        contiguous=closed_time,
+        min_span=max(1, min_K) if closed_time else 1,
+        deadline=deadline,
+        max_results=max_patterns,
+        stats=miner_stats,
+        touching_from=touching_from,
+    )
+    if stats is not None and miner_stats.get("truncated"):
+        stats["truncated"] = miner_stats["truncated"]
+
+    feat_of, ctx_of = sequences.axes_table()
+    for index, (itemset_ids, rows, positions) in enumerate(mined):
+        if _past(deadline):
+            if stats is not None:
+                stats["truncated"] = "time_budget"
+            break
+        if stats is not None:
+            stats["n_patterns"] += 1
+        if rows.size < min_I:
+            continue
+        row = _pattern_row(index, itemset_ids, int(rows.size), feat_of, ctx_of, min_J, min_K)
+        if row is not None:
+            row["subject_ids"] = rows.tolist()
+            row["row_contexts"] = positions
+            yield row
+
+
+def _pattern_row(
+    index: int,
+    itemset_ids: list[list[int]],
+    support: int,
+    feat_of: list[int],
+    ctx_of: list[int],
+    min_J: int,
+    min_K: int,
+) -> dict | None:
+    """Pattern row without subject ids, or None when it spans too few features/contexts."""
+    cols = {feat_of[item_id] for itemset in itemset_ids for item_id in itemset}
+    if len(cols) < min_J:
+        return None
+    contexts = {ctx_of[item_id] for itemset in itemset_ids for item_id in itemset}
+    if -1 in contexts:
+        # Relaxed items: one context per itemset, placed per row
+        contexts = set(range(len(itemset_ids)))
+    if len(contexts) < min_K:
+        return None
+
+    return {
+        "index": index,
+        "itemset_ids": [sorted(itemset) for itemset in itemset_ids],
+        "support": support,
+        "cols": sorted(cols),
+        "contexts": sorted(contexts),
+    }
+
+
 def _mine_patterns_with_spmf(
-    sequences: dict[str, list[list[str]]],
-    item_to_int: dict[str, int],
-    reverse_map: dict[int, str],
+    sequences: EncodedSequences,
     n_observations: int,
     min_I: int,
+    min_J: int,
     min_K: int,
     spm_algo: str,
     jar_path: str | None,
     keep_temp_files: bool,
-) -> list[dict]:
+    spmf_workers: int = 0,
+    spmf_timeout_s: float | None = None,
+    stats: dict | None = None,
+    deadline: float | None = None,
+    max_patterns: int | None = None,
+) -> Iterator[dict]:
     jar = Path(jar_path) if jar_path else _default_jar_path()
     if not jar.exists():
         raise FileNotFoundError(
@@ -464,26 +1304,28 @@ def _mine_patterns_with_spmf(
 
     if keep_temp_files:
         temp_dir = Path(tempfile.mkdtemp(prefix="trihspam_"))
-        input_path = temp_dir / "spmf_input.txt"
-        output_path = temp_dir / "spmf_output.txt"
     else:
         temp_dir_obj = tempfile.TemporaryDirectory(prefix="trihspam_")
         temp_dir = Path(temp_dir_obj.name)
-        input_path = temp_dir / "spmf_input.txt"
-        output_path = temp_dir / "spmf_output.txt"
 
+    # The worker exchanges binary files (see trihspam_io) and does the text
+    # conversion in the JVM; a one-off `java -jar` run needs SPMF's text format.
+    binary = spmf_workers > 0
     include_timestamps = spm_algo == "fournier08closed"
-    _write_spmf_input(
-        sequences=sequences,
-        item_to_int=item_to_int,
-        output_path=input_path,
-        include_timestamps=include_timestamps,
-    )
+    if binary:
+        input_path = temp_dir / "spmf_input.tseq"
+        output_path = temp_dir / "spmf_output.tpat"
+        write_sequence_file(input_path, sequences.item_ids, include_timestamps=include_timestamps)
+    else:
+        input_path = temp_dir / "spmf_input.txt"
+        output_path = temp_dir / "spmf_output.txt"
+        _write_spmf_input(
+            sequences=sequences,
+            output_path=input_path,
+            include_timestamps=include_timestamps,
+        )
 
-    cmd = [
-        "java",
-        "-jar",
-        str(jar),
+    spmf_args = [
         "run",
         spmf_name,
         str(input_path),
@@ -495,16 +1337,77 @@ def _mine_patterns_with_spmf(
         # Following the reference repo:
         # min interval = 1, max interval = 1, min whole interval = min_K-1, max whole interval = K-1
         # Since this is aligned TC-triclustering, we keep the same idea.
-        cmd.extend(["1", "1", str(max(0, min_K - 1)), str(max(0, _infer_sequence_length(sequences) - 1))])
+        spmf_args.extend(["1", "1", str(max(0, min_K - 1)), str(max(0, sequences.n_contexts - 1))])
     else:
-        cmd.append("true")
+        spmf_args.append("true")
 
-    proc = subprocess.run(
-        cmd,
-        capture_output=True,
-        text=True,
-        check=False,
-    )
+    # The remaining time budget bounds the job like spmf_timeout_s does; only
+    # a timeout caused by the budget is reported as truncation.
+    timeout_s = spmf_timeout_s
+    budget_bound = False
+    if deadline is not None:
+        remaining = max(0.001, deadline - time.monotonic())
+        if timeout_s is None or remaining <= timeout_s:
+            timeout_s, budget_bound = remaining, True
+
+    try:
+        try:
+            if binary:
+                get_spmf_pool(jar, spmf_workers).run(spmf_args, timeout_s=timeout_s, binary=True)
+            else:
+                _run_spmf_subprocess(["java", "-jar", str(jar)] + spmf_args, timeout_s=timeout_s)
+        except TimeoutError:
+            if not budget_bound:
+                raise
+            if stats is not None:
+                stats["truncated"] = "time_budget"
+            return
+
+        patterns = (_iter_binary_patterns if binary else _iter_spmf_patterns)(
+            output_path,
+            sequences=sequences,
+            min_I=min_I,
+            min_J=min_J,
+            min_K=min_K,
+            stats=stats,
+            max_patterns=max_patterns,
+            deadline=deadline,
+        )
+        if not sequences.relaxed:
+            yield from patterns
+            return
+
+        # SPMF does not report where a relaxed pattern matched; place it in
+        # each supporting row with the same bitmask matching the native miner uses.
+        occ = relaxed_occurrence_masks(sequences.item_ids)
+        for row in patterns:
+            rows, positions = embed_relaxed_pattern(
+                occ,
+                np.asarray(row["subject_ids"], dtype=np.int64),
+                row["itemset_ids"],
+                contiguous=include_timestamps,
+            )
+            if rows.size < min_I:
+                continue
+            row["subject_ids"] = rows.tolist()
+            row["row_contexts"] = positions
+            yield row
+    finally:
+        if not keep_temp_files:
+            temp_dir_obj.cleanup()
+
+
+def _run_spmf_subprocess(cmd: list[str], timeout_s: float | None) -> None:
+    try:
+        proc = subprocess.run(
+            cmd,
+            capture_output=True,
+            text=True,
+            check=False,
+            timeout=timeout_s,
+        )
+    except subprocess.TimeoutExpired:
+        raise TimeoutError(f"SPMF did not finish within {timeout_s}s.\nCommand: {' '.join(cmd)}")
 
     if proc.returncode != 0:
         raise RuntimeError(
@@ -514,112 +1417,156 @@ def _mine_patterns_with_spmf(
             f"stderr:\n{proc.stderr}"
         )
 
-    patterns = _parse_spmf_output(output_path, reverse_map)
 
-    if not keep_temp_files:
-        temp_dir_obj.cleanup()
-
-    return patterns
-
-
-def _infer_sequence_length(sequences: dict[str, list[list[str]]]) -> int:
-    if not sequences:
-        return 0
-    first_key = next(iter(sequences.keys()))
-    return len(sequences[first_key])
-
-
-def _parse_spmf_output(output_path: Path, reverse_map: dict[int, str]) -> list[dict]:
+def _iter_spmf_patterns(
+    output_path: Path,
+    sequences: EncodedSequences,
+    min_I: int = 1,
+    min_J: int = 1,
+    min_K: int = 1,
+    stats: dict | None = None,
+    max_patterns: int | None = None,
+    deadline: float | None = None,
+) -> Iterator[dict]:
     """
-    Returns a list of dicts:
-    [
-        {
-            "pattern_string": "(f0_0#bin1 f3_0#hot) (f0_1#bin2)",
-            "pattern_itemsets": [["f0_0#bin1","f3_0#hot"], ["f0_1#bin2"]],
-            "support": 5,
-            "subject_ids": [0,1,2,4,8]
-        },
-        ...
-    ]
+    Stream SPMF's output file one line at a time, yielding the rows described
+    in _mine_patterns(). Item ids are decoded to (feat, ctx) with lookup lists
+    instead of token strings, and a pattern is rejected on its #SUP: count and
+    its feature / context spans before its subject ids are parsed.
     """
     if not output_path.exists():
-        return []
+        return
 
-    rows = []
+    feat_of, ctx_of = sequences.axes_table()
+    max_item_id = len(feat_of) - 1
+
+    index = 0
     with output_path.open("r", encoding="utf-8") as f:
         for raw_line in f:
             line = raw_line.strip()
             if not line:
                 continue
 
-            before_sup, support, subject_ids = _split_spmf_line(line)
-            itemsets = _decode_pattern_tokens(before_sup.split(), reverse_map)
-            if not itemsets:
+            body, _, tail = line.partition("#SUP:")
+            itemset_ids = _decode_pattern_ids(body.split(), max_item_id)
+            if not itemset_ids:
                 continue
 
-            pattern_string = " ".join(
-                "(" + " ".join(itemset) + ")" for itemset in itemsets
-            )
+            if max_patterns is not None and index >= max_patterns:
+                if stats is not None:
+                    stats["truncated"] = "max_patterns"
+                break
+            if _past(deadline):
+                if stats is not None:
+                    stats["truncated"] = "time_budget"
+                break
 
-            rows.append(
-                {
-                    "pattern_string": pattern_string,
-                    "pattern_itemsets": itemsets,
-                    "support": support,
-                    "subject_ids": subject_ids,
-                }
-            )
+            pattern_index = index
+            index += 1
+            if stats is not None:
+                stats["n_patterns"] += 1
 
-    return rows
+            support_part, has_sids, sid_part = tail.partition("#SID:")
+            try:
+                support = int(support_part.split()[0])
+            except (IndexError, ValueError):
+                support = 0
+            if has_sids and support and support < min_I:
+                continue
 
+            row = _pattern_row(pattern_index, itemset_ids, support, feat_of, ctx_of, min_J, min_K)
+            if row is None:
+                continue
 
-def _split_spmf_line(line: str) -> tuple[str, int, list[int]]:
-    before_sup = line
-    support = 0
-    subject_ids: list[int] = []
+            subject_ids = sorted({int(tok) for tok in sid_part.split() if tok.lstrip("-").isdigit()})
+            if len(subject_ids) < min_I:
+                continue
+            row["subject_ids"] = subject_ids
+            yield row
 
-    if "#SUP:" in line:
-        before_sup, after_sup = line.split("#SUP:", 1)
-        after_sup = after_sup.strip()
 
-        if "#SID:" in after_sup:
-            support_part, sid_part = after_sup.split("#SID:", 1)
-            try:
-                support = int(support_part.strip())
-            except Exception:
-                support = 0
+def _iter_binary_patterns(
+    output_path: Path,
+    sequences: EncodedSequences,
+    min_I: int = 1,
+    min_J: int = 1,
+    min_K: int = 1,
+    stats: dict | None = None,
+    max_patterns: int | None = None,
+    deadline: float | None = None,
+) -> Iterator[dict]:
+    """
+    _iter_spmf_patterns() for a binary pattern file written by the SPMF
+    worker. The file is memory-mapped; subject ids are only unpacked from
+    their bitsets for patterns that pass the support and span checks.
+    """
+    if not output_path.exists():
+        return
 
-            sid_tokens = sid_part.strip().split()
-            for tok in sid_tokens:
-                try:
-                    subject_ids.append(int(tok))
-                except Exception:
-                    continue
-        else:
-            try:
-                support = int(after_sup.strip().split()[0])
-            except Exception:
-                support = 0
+    arrays = read_pattern_file(output_path)
+    if arrays["n_sequences"] != len(sequences):
+        raise RuntimeError(
+            f"SPMF worker returned patterns over {arrays['n_sequences']} sequences, expected {len(sequences)}."
+        )
+
+    feat_of, ctx_of = sequences.axes_table()
+    max_item_id = len(feat_of) - 1
+    pattern_ptr = arrays["pattern_ptr"].tolist()
+    itemset_ptr = arrays["itemset_ptr"].tolist()
+    items = arrays["items"].tolist()
+    supports = arrays["support"].tolist()
+    sid_words = arrays["sid_words"]
+
+    index = 0
+    for p, support in enumerate(supports):
+        itemset_ids = []
+        for s in range(pattern_ptr[p], pattern_ptr[p + 1]):
+            itemset = [item_id for item_id in items[itemset_ptr[s]:itemset_ptr[s + 1]] if 0 < item_id <= max_item_id]
+            if itemset:
+                itemset_ids.append(itemset)
+        if not itemset_ids:
+            continue
 
-    return before_sup.strip(), support, sorted(set(subject_ids))
+        if max_patterns is not None and index >= max_patterns:
+            if stats is not None:
+                stats["truncated"] = "max_patterns"
+            break
+        if _past(deadline):
+            if stats is not None:
+                stats["truncated"] = "time_budget"
+            break
 
+        pattern_index = index
+        index += 1
+        if stats is not None:
+            stats["n_patterns"] += 1
 
-def _decode_pattern_tokens(tokens: list[str], reverse_map: dict[int, str]) -> list[list[str]]:
-    itemsets: list[list[str]] = []
-    current: list[str] = []
+        if support and support < min_I:
+            continue
 
-    for tok in tokens:
-        tok = tok.strip()
-        if not tok:
+        row = _pattern_row(pattern_index, itemset_ids, support, feat_of, ctx_of, min_J, min_K)
+        if row is None:
+            continue
+
+        subject_ids = unpack_subject_bitset(sid_words[p])
+        if len(subject_ids) < min_I:
             continue
+        row["subject_ids"] = subject_ids
+        yield row
 
+
+def _decode_pattern_ids(tokens: list[str], max_item_id: int) -> list[list[int]]:
+    itemsets: list[list[int]] = []
+    current: list[int] = []
+
+    for tok in tokens:
         # Ignore time annotations like <0>
-        if tok.startswith("<") and tok.endswith(">"):
+        if tok.startswith("<"):
             continue
 
         if tok == "-1":
             if current:
-                itemsets.append(sorted(current))
+                itemsets.append(current)
                 current = []
             continue
 
@@ -628,25 +1575,32 @@ def _decode_pattern_tokens(tokens: list[str], reverse_map: dict[int, str]) -> li
 
         try:
             item_id = int(tok)
-        except Exception:
+        except ValueError:
             continue
 
-        if item_id in reverse_map:
-            current.append(reverse_map[item_id])
+        if 0 < item_id <= max_item_id:
+            current.append(item_id)
 
     if current:
-        itemsets.append(sorted(current))
+        itemsets.append(current)
 
     return itemsets
 
 
+def _pattern_strings(sequences: EncodedSequences, itemset_ids: list[list[int]]) -> tuple[str, list[list[str]]]:
+    """Readable form of a pattern: "(f0_0#bin1 f3_0#hot) (f0_1#bin2)" and its token itemsets."""
+    itemsets = [sorted(sequences.token(item_id) for item_id in itemset) for itemset in itemset_ids]
+    return " ".join("(" + " ".join(itemset) + ")" for itemset in itemsets), itemsets
+
+
 # -----------------------------------------------------------------------------
 # Pattern -> tricluster
 # -----------------------------------------------------------------------------
 
 def _pattern_to_tricluster(
     pattern_row: dict,
-    cube: np.ndarray,
+    cube: TriHSPAMCube,
+    sequences: EncodedSequences,
     feature_columns: list[str],
     numeric_feature_indices: list[int],
     symbolic_feature_indices: list[int],
@@ -659,52 +1613,70 @@ def _pattern_to_tricluster(
     relaxed: bool,
     tricluster_id: int,
 ) -> dict | None:
-    if relaxed:
-        raise NotImplementedError("Relaxed time mode is not implemented in this v1 engine.")
-
-    rows_I = sorted(set(pattern_row["subject_ids"]))
-    if len(rows_I) < min_I:
+    axes = _pattern_axes(pattern_row, min_I=min_I, min_J=min_J, min_K=min_K, relaxed=relaxed)
+    if axes is None:
         return None
 
-    cols_J: list[int] = []
-    contx_K: list[int] = []
+    h_score = h_var3_cube(cube, *axes)
+    if h_score > coherence_threshold:
+        return None
 
-    for itemset in pattern_row["pattern_itemsets"]:
-        for item in itemset:
-            left = item.split("#", 1)[0]  # e.g. f3_12
-            try:
-                feat_part, ctx_part = left.split("_", 1)
-                feat_idx = int(feat_part.replace("f", ""))
-                ctx_idx = int(ctx_part)
-            except Exception:
-                continue
+    return _build_tricluster(
+        pattern_row=pattern_row,
+        axes=axes,
+        h_score=h_score,
+        sequences=sequences,
+        feature_columns=feature_columns,
+        numeric_feature_indices=numeric_feature_indices,
+        symbolic_feature_indices=symbolic_feature_indices,
+        windows_meta=windows_meta,
+        window_ids=window_ids,
+        tricluster_id=tricluster_id,
+    )
 
-            if feat_idx not in cols_J:
-                cols_J.append(feat_idx)
-            if ctx_idx not in contx_K:
-                contx_K.append(ctx_idx)
 
-    rows_I.sort()
-    cols_J.sort()
-    contx_K.sort()
+def _pattern_axes(
+    pattern_row: dict,
+    min_I: int,
+    min_J: int,
+    min_K: int,
+    relaxed: bool,
+) -> tuple[list[int], list[int], list[int] | np.ndarray] | None:
+    """
+    (rows_I, cols_J, contx_K) of a mined pattern, or None when below the minimum sizes.
+    In relaxed mode contx_K is the (n_rows, m) array of per-row contexts.
+    """
+    rows_I = pattern_row["subject_ids"]
+    cols_J = pattern_row["cols"]
+    contx_K = pattern_row["contexts"]
 
-    if len(cols_J) < min_J or len(contx_K) < min_K:
+    if len(rows_I) < min_I or len(cols_J) < min_J or len(contx_K) < min_K:
         return None
 
-    subcube_kij = _extract_subcube_kij(
-        cube=cube,
-        rows_I=rows_I,
-        cols_J=cols_J,
-        contx_K=contx_K,
-    )
+    if relaxed:
+        return rows_I, cols_J, np.asarray(pattern_row["row_contexts"], dtype=np.int64)
+    return rows_I, cols_J, contx_K
+
+
+def _build_tricluster(
+    pattern_row: dict,
+    axes: tuple[list[int], list[int], list[int] | np.ndarray],
+    h_score: float,
+    sequences: EncodedSequences,
+    feature_columns: list[str],
+    numeric_feature_indices: list[int],
+    symbolic_feature_indices: list[int],
+    windows_meta: list[dict],
+    window_ids: list[int],
+    tricluster_id: int,
+) -> dict:
+    rows_I, cols_J, _ = axes
+    contx_K = list(pattern_row["contexts"])
+    h_score = float(h_score)
 
     numeric_local = [idx for idx, feat_idx in enumerate(cols_J) if feat_idx in set(numeric_feature_indices)]
     symbolic_local = [idx for idx, feat_idx in enumerate(cols_J) if feat_idx in set(symbolic_feature_indices)]
 
-    h_score = float(h_var3(subcube_kij, numeric_local, symbolic_local))
-    if h_score > coherence_threshold:
-        return None
-
     has_num = len(numeric_local) > 0
     has_sym = len(symbolic_local) > 0
     if has_num and has_sym:
@@ -724,11 +1696,12 @@ def _pattern_to_tricluster(
     row_windows_meta = [windows_meta[i] for i in rows_I] if len(windows_meta) == len(window_ids) else []
 
     volume = len(rows_I) * len(cols_J) * len(contx_K)
+    pattern_string, _ = _pattern_strings(sequences, pattern_row["itemset_ids"])
 
-    return {
+    tric = {
         "id": int(tricluster_id),
         "type": tric_type,
-        "pattern_string": pattern_row["pattern_string"],
+        "pattern_string": pattern_string,
         "support": int(len(rows_I)),
         "hvar3": h_score,
         "rows": rows_I,
@@ -745,26 +1718,75 @@ def _pattern_to_tricluster(
             "volume": int(volume),
         },
     }
+    if "row_contexts" in pattern_row:
+        # Relaxed: contexts are itemset positions; row_contexts[r] holds the
+        # window contexts they matched in rows[r]
+        tric["row_contexts"] = np.asarray(pattern_row["row_contexts"]).tolist()
+    return tric
 
 
 def _extract_subcube_kij(
-    cube: np.ndarray,
+    cube: TriHSPAMCube,
     rows_I: list[int],
     cols_J: list[int],
     contx_K: list[int],
+    layout: str = "kij",
 ) -> np.ndarray:
     """
-    Returns subcube with shape (K, I, J), matching the original evaluation code.
-    Input cube shape is (F, I, K).
+    Decoded object subcube of a candidate, gathered with np.ix_ (no per-cell loop).
+
+    layout="kij" returns the (K, I, J) array the evaluation code expects, as a
+    transposed view of the gathered block; layout="jik" returns the gathered
+    (J, I, K) block as-is, in the cube's own axis order. contx_K may also be an
+    (I, K) array of per-row contexts (relaxed triclusters).
     """
-    out = np.empty((len(contx_K), len(rows_I), len(cols_J)), dtype=object)
+    if layout not in ("kij", "jik"):
+        raise ValueError(f"layout must be 'kij' or 'jik', got {layout!r}")
 
-    for k_pos, k_idx in enumerate(contx_K):
-        for i_pos, i_idx in enumerate(rows_I):
-            for j_pos, j_idx in enumerate(cols_J):
-                out[k_pos, i_pos, j_pos] = cube[j_idx, i_idx, k_idx]
+    cols = np.asarray(cols_J, dtype=np.int64)
+    numeric_mask = cube.is_numeric[cols]
+    numeric, codes, _ = _extract_subblocks(cube, rows_I, cols_J, contx_K)
 
-    return out
+    out = np.empty((cols.size, len(rows_I), np.shape(contx_K)[-1]), dtype=object)
+    out[numeric_mask] = numeric
+    for pos, j_pos in enumerate(np.flatnonzero(~numeric_mask)):
+        local = cube.local_index[cols[j_pos]]
+        vocab = np.array(list(cube.vocabularies[local]) + [None], dtype=object)
+        out[j_pos] = vocab[codes[pos]]  # code -1 picks the trailing None
+
+    return out.transpose(2, 1, 0) if layout == "kij" else out
+
+
+def _extract_subblocks(
+    cube: TriHSPAMCube,
+    rows_I: list[int],
+    cols_J: list[int],
+    contx_K: list[int],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Typed gathers of a candidate, all in (J, I, K) order:
+    numeric float block of its numeric columns, code block of its symbolic
+    columns, and the missing mask over all of cols_J.
+
+    contx_K is either shared by all rows (1-d) or given per row as an (I, K)
+    array, in which case row i is read at its own contexts.
+    """
+    rows = np.asarray(rows_I, dtype=np.int64)
+    cols = np.asarray(cols_J, dtype=np.int64)
+    ctxs = np.asarray(contx_K, dtype=np.int64)
+    numeric_mask = cube.is_numeric[cols]
+
+    if ctxs.ndim == 1:
+        def _gather(block, index):
+            return block[np.ix_(index, rows, ctxs)]
+    else:
+        def _gather(block, index):
+            return block[index[:, None, None], rows[None, :, None], ctxs[None, :, :]]
+
+    numeric = _gather(cube.numeric, cube.local_index[cols[numeric_mask]])
+    codes = _gather(cube.codes, cube.local_index[cols[~numeric_mask]])
+    missing = _gather(cube.missing, cols)
+    return numeric, codes, missing
 
 
 # -----------------------------------------------------------------------------
@@ -844,6 +1866,276 @@ def _missing_values_ratio(data: np.ndarray) -> float:
     return float(missing / float(flat.size))
 
 
+# Typed-cube HVar3. Same score as h_var3() on the (K, I, J) object subcube, but
+# computed straight from the numeric / code blocks of a TriHSPAMCube.
+
+def h_var3_cube(
+    cube: TriHSPAMCube,
+    rows_I: list[int],
+    cols_J: list[int],
+    contx_K: list[int],
+) -> float:
+    """HVar3 of one (rows, cols, contexts) candidate; contexts may be per row, as (I, K)."""
+    rows = np.asarray(rows_I, dtype=np.int64)
+    cols = np.asarray(cols_J, dtype=np.int64)
+    ctxs = np.asarray(contx_K, dtype=np.int64)
+    volume = rows.size * cols.size * (ctxs.shape[-1] if ctxs.size else 0)
+    if volume == 0:
+        return 0.0
+
+    numeric, codes, missing = _extract_subblocks(cube, rows, cols, ctxs)
+
+    numeric_metric = 0.0
+    if numeric.size:
+        numeric_metric = _cv_from_block(numeric) / float(numeric.size)
+
+    symbolic_metric = 0.0
+    if codes.size:
+        symbolic_metric = _gini_from_codes(codes) / float(codes.size)
+
+    missing_ratio = float(missing.sum()) / float(volume)
+    return float(numeric_metric + symbolic_metric + missing_ratio)
+
+
+def _cv_from_block(block: np.ndarray) -> float:
+    """block: float (J, I, K), NaN = missing. Mean over (K, J) of the CV along I."""
+    valid = ~np.isnan(block)
+    n = valid.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(valid, block, 0.0).sum(axis=1) / n
+        dev = np.where(valid, block - mean[:, None, :], 0.0)
+        std = np.sqrt((dev * dev).sum(axis=1) / n)
+        cv = np.where(np.abs(mean) < 1e-12, 0.0, std / np.abs(mean))
+    cv = np.nan_to_num(cv, nan=0.0, posinf=0.0, neginf=0.0)
+    return float(cv.mean())
+
+
+def _gini_from_codes(block: np.ndarray) -> float:
+    """block: int codes (J, I, K), -1 = missing. Mean over (K, J) of the Gini along I."""
+    j_count, _, k_count = block.shape
+    n_symbols = int(block.max()) + 1
+    if n_symbols <= 0:
+        return 0.0
+
+    group = np.broadcast_to(
+        np.arange(j_count)[:, None, None] * k_count + np.arange(k_count)[None, None, :],
+        block.shape,
+    )
+    present = block >= 0
+    counts = np.bincount(
+        group[present] * n_symbols + block[present].astype(np.int64),
+        minlength=j_count * k_count * n_symbols,
+    ).reshape(j_count * k_count, n_symbols)
+    return float(_gini_from_counts(counts).mean())
+
+
+def _gini_from_counts(counts: np.ndarray) -> np.ndarray:
+    """counts: (G, S) category counts per group -> Gini per group (0 for empty groups)."""
+    total = counts.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        probs = counts / total[:, None]
+        gini = 1.0 - np.sum(probs ** 2, axis=1)
+    return np.where(total > 0, gini, 0.0)
+
+
+def h_var3_batch(
+    cube: TriHSPAMCube,
+    candidates: list[tuple[list[int], list[int], list[int]]],
+    max_cells: int = 1 << 21,
+    deadline: float | None = None,
+) -> np.ndarray:
+    """
+    HVar3 for many (rows_I, cols_J, contx_K) candidates at once (contx_K may
+    be an (I, K) array of per-row contexts, as in h_var3_cube).
+
+    Every cell of every candidate is gathered in a single fancy-index pass and
+    reduced per (candidate, feature, context) group with np.bincount, so the
+    cost is proportional to the total candidate volume with no per-cell Python
+    work. Candidates are processed in chunks of at most `max_cells` cells.
+
+    Once `deadline` (a time.monotonic() value) has passed, no further chunk is
+    started and the remaining candidates score np.inf; the first chunk always runs.
+    """
+    scores = np.zeros(len(candidates), dtype=np.float64)
+
+    start = 0
+    while start < len(candidates):
+        if start > 0 and _past(deadline):
+            scores[start:] = np.inf
+            break
+        stop, cells = start, 0
+        while stop < len(candidates) and (stop == start or cells < max_cells):
+            rows, cols, ctxs = candidates[stop]
+            cells += len(rows) * len(cols) * np.shape(ctxs)[-1]
+            stop += 1
+        scores[start:stop] = _h_var3_chunk(cube, candidates[start:stop])
+        start = stop
+
+    return scores
+
+
+def _h_var3_chunk(cube: TriHSPAMCube, candidates: list) -> np.ndarray:
+    n_cand = len(candidates)
+    _, i_count, k_count = cube.shape
+
+    # Per block: flat cell indices, the (candidate, feature, context) group of
+    # each cell, and the candidate owning each group.
+    parts = {"num": ([], [], []), "sym": ([], [], []), "all": ([], [], [])}
+    group_offset = {"num": 0, "sym": 0, "all": 0}
+    sizes = np.zeros((n_cand, 3), dtype=np.float64)  # numeric cells, symbolic cells, volume
+
+    for c, (rows_I, cols_J, contx_K) in enumerate(candidates):
+        rows = np.asarray(rows_I, dtype=np.int64)
+        cols = np.asarray(cols_J, dtype=np.int64)
+        ctxs = np.asarray(contx_K, dtype=np.int64)
+        numeric_mask = cube.is_numeric[cols]
+        k_size = ctxs.shape[-1]
+        ctx_index = ctxs[None, None, :] if ctxs.ndim == 1 else ctxs[None, :, :]
+
+        for key, local in (
+            ("num", cube.local_index[cols[numeric_mask]]),
+            ("sym", cube.local_index[cols[~numeric_mask]]),
+            ("all", cols),
+        ):
+            if local.size == 0 or rows.size == 0 or ctxs.size == 0:
+                continue
+            flat = (local[:, None, None] * i_count + rows[None, :, None]) * k_count + ctx_index
+            group = group_offset[key] + (
+                np.arange(local.size)[:, None, None] * k_size + np.arange(k_size)[None, None, :]
+            )
+            n_groups = local.size * k_size
+            parts[key][0].append(flat.reshape(-1))
+            parts[key][1].append(np.broadcast_to(group, flat.shape).reshape(-1))
+            parts[key][2].append(np.full(n_groups, c, dtype=np.int64))
+            group_offset[key] += n_groups
+
+        volume = rows.size * cols.size * k_size
+        sizes[c] = (
+            rows.size * int(numeric_mask.sum()) * k_size,
+            rows.size * int((~numeric_mask).sum()) * k_size,
+            volume,
+        )
+
+    def _gather(key):
+        flat, group, owner = parts[key]
+        if not flat:
+            return None
+        return np.concatenate(flat), np.concatenate(group), np.concatenate(owner)
+
+    def _per_candidate_mean(values: np.ndarray, owner: np.ndarray) -> np.ndarray:
+        totals = np.bincount(owner, weights=values, minlength=n_cand)
+        counts = np.bincount(owner, minlength=n_cand)
+        return np.divide(totals, counts, out=np.zeros(n_cand), where=counts > 0)
+
+    scores = np.zeros(n_cand, dtype=np.float64)
+
+    gathered = _gather("num")
+    if gathered is not None:
+        flat, group, owner = gathered
+        n_groups = owner.size
+        values = cube.numeric.reshape(-1)[flat]
+        valid = ~np.isnan(values)
+        n = np.bincount(group, weights=valid, minlength=n_groups)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = np.bincount(group, weights=np.where(valid, values, 0.0), minlength=n_groups) / n
+            dev = np.where(valid, values - mean[group], 0.0)
+            std = np.sqrt(np.bincount(group, weights=dev * dev, minlength=n_groups) / n)
+            cv = np.where(np.abs(mean) < 1e-12, 0.0, std / np.abs(mean))
+        cv = np.nan_to_num(cv, nan=0.0, posinf=0.0, neginf=0.0)
+        scores += np.divide(_per_candidate_mean(cv, owner), sizes[:, 0], out=np.zeros(n_cand), where=sizes[:, 0] > 0)
+
+    gathered = _gather("sym")
+    if gathered is not None:
+        flat, group, owner = gathered
+        n_groups = owner.size
+        codes = cube.codes.reshape(-1)[flat]
+        present = codes >= 0
+        n_symbols = max(1, int(codes.max()) + 1)
+        counts = np.bincount(
+            group[present] * n_symbols + codes[present].astype(np.int64),
+            minlength=n_groups * n_symbols,
+        ).reshape(n_groups, n_symbols)
+        gini = _gini_from_counts(counts)
+        scores += np.divide(_per_candidate_mean(gini, owner), sizes[:, 1], out=np.zeros(n_cand), where=sizes[:, 1] > 0)
+
+    gathered = _gather("all")
+    if gathered is not None:
+        flat, group, owner = gathered
+        missing = cube.missing.reshape(-1)[flat]
+        missing_per_group = np.bincount(group, weights=missing, minlength=owner.size)
+        missing_count = np.bincount(owner, weights=missing_per_group, minlength=n_cand)
+        scores += np.divide(missing_count, sizes[:, 2], out=np.zeros(n_cand), where=sizes[:, 2] > 0)
+
+    return scores
+
+
+# -----------------------------------------------------------------------------
+# Parallel scoring
+# -----------------------------------------------------------------------------
+
+PARALLEL_MIN_CHUNK = 256      # candidates per task; smaller batches are not worth the IPC
+PARALLEL_CHUNKS_PER_JOB = 4
+
+_WORKER_CUBE: dict = {}
+
+
+def _score_candidates(
+    cube: TriHSPAMCube,
+    candidates: list[tuple[list[int], list[int], list[int]]],
+    n_jobs: int | None = None,
+    deadline: float | None = None,
+    stats: dict | None = None,
+) -> np.ndarray:
+    """
+    HVar3 for every candidate, serially or over a process pool.
+
+    With n_jobs > 1 the cube is copied once into shared memory and each worker
+    attaches to it in its initializer; tasks only carry chunks of candidate
+    axes. executor.map keeps chunk order, so the scores line up exactly with
+    the serial path.
+
+    Candidates left unscored at `deadline` get np.inf (see h_var3_batch), and
+    stats["truncated"] is set to "time_budget".
+    """
+    scores = _score_all(cube, candidates, n_jobs, deadline)
+    if stats is not None and deadline is not None and np.isinf(scores).any():
+        stats["truncated"] = stats["truncated"] or "time_budget"
+    return scores
+
+
+def _score_all(cube: TriHSPAMCube, candidates: list, n_jobs: int | None, deadline: float | None) -> np.ndarray:
+    workers = (os.cpu_count() or 1) if n_jobs == -1 else int(n_jobs or 1)
+    n_chunks = min(workers * PARALLEL_CHUNKS_PER_JOB, len(candidates) // PARALLEL_MIN_CHUNK)
+    if workers <= 1 or n_chunks < 2:
+        return h_var3_batch(cube, candidates, deadline=deadline)
+
+    bounds = np.linspace(0, len(candidates), n_chunks + 1).astype(int)
+    chunks = [candidates[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+
+    segment, handle = share_cube(cube)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(chunks)),
+            initializer=_init_score_worker,
+            initargs=(handle,),
+        ) as pool:
+            # time.monotonic() is system-wide, so workers can check the same deadline
+            return np.concatenate(list(pool.map(_score_chunk, chunks, [deadline] * len(chunks))))
+    finally:
+        segment.close()
+        segment.unlink()
+
+
+def _init_score_worker(handle: dict) -> None:
+    cube, segment = attach_cube(handle)
+    _WORKER_CUBE["cube"] = cube
+    _WORKER_CUBE["segment"] = segment  # keeps the mapping alive
+
+
+def _score_chunk(candidates: list, deadline: float | None = None) -> np.ndarray:
+    return h_var3_batch(_WORKER_CUBE["cube"], candidates, deadline=deadline)
+
+
 # -----------------------------------------------------------------------------
 # Post-processing
 # -----------------------------------------------------------------------------
@@ -857,6 +2149,7 @@ def _deduplicate_triclusters(triclusters: list[dict]) -> list[dict]:
             tuple(tric["rows"]),
             tuple(tric["cols"]),
             tuple(tric["contexts"]),
+            tuple(map(tuple, tric.get("row_contexts", []))),
         )
         if key not in seen:
             seen.add(key)
@@ -868,37 +2161,106 @@ def _deduplicate_triclusters(triclusters: list[dict]) -> list[dict]:
 def _filter_overlapping_triclusters(
     triclusters: list[dict],
     overlap_threshold: float,
+    deadline: float | None = None,
+    min_kept: int = 1,
+    stats: dict | None = None,
 ) -> list[dict]:
+    """
+    Greedy filter: best (lowest HVar3, then largest) first, dropping any
+    tricluster whose Jaccard with an already kept one reaches the threshold.
+
+    Rows / cols / contexts are Python int bitmasks, so an intersection is an AND
+    plus a popcount. A row -> kept-triclusters bitmask index restricts the
+    comparisons to kept triclusters sharing at least one row (the others have
+    Jaccard 0), and min(volume) / max(volume) bounds the Jaccard from above, so
+    pairs whose sizes are too different are skipped without intersecting.
+
+    Relaxed triclusters cover different contexts in each row, so any pair
+    involving one compares (row, context) cell bitmasks instead of rows x contexts.
+
+    Once `deadline` has passed and at least `min_kept` triclusters are kept,
+    the remaining (worse) candidates are dropped and stats["truncated"] is set
+    to "time_budget".
+    """
     if not triclusters:
         return []
 
+    ordered = sorted(triclusters, key=lambda x: (x["hvar3"], -x["shape"]["volume"]))
+    if overlap_threshold <= 0:
+        # Every pair reaches a non-positive threshold
+        return ordered[:1]
+
+    k_stride = 0
+    if any("row_contexts" in tric for tric in ordered):
+        k_stride = 1 + max(
+            max((k for row in tric.get("row_contexts", [tric["contexts"]]) for k in row), default=0)
+            for tric in ordered
+        )
+
     kept: list[dict] = []
+    kept_masks: list[tuple[int, int, int, int]] = []
+    kept_cells: dict[int, int] = {}  # position in kept -> (row, context) bitmask, built on demand
+    row_index: dict[int, int] = {}  # row -> bitmask over positions in kept
+
+    for candidate in ordered:
+        if len(kept) >= min_kept and _past(deadline):
+            if stats is not None:
+                stats["truncated"] = "time_budget"
+            break
+        rows, cols, ctxs = (_to_bitmask(candidate[axis]) for axis in ("rows", "cols", "contexts"))
+        size = rows.bit_count() * cols.bit_count() * ctxs.bit_count()
+        relaxed = "row_contexts" in candidate
+        cells = _cell_bitmask(candidate, k_stride) if relaxed else None
+
+        neighbours = 0
+        for row in candidate["rows"]:
+            neighbours |= row_index.get(row, 0)
 
-    for candidate in sorted(
-        triclusters,
-        key=lambda x: (x["hvar3"], -x["shape"]["volume"])
-    ):
         should_keep = True
-        for chosen in kept:
-            jacc = _tricluster_jaccard(candidate, chosen)
-            if jacc >= overlap_threshold:
+        for pos in bitset_to_sids(neighbours):
+            k_rows, k_cols, k_ctxs, k_size = kept_masks[pos]
+            if min(size, k_size) / max(size, k_size) < overlap_threshold:
+                continue  # Jaccard <= min / max
+
+            if relaxed or "row_contexts" in kept[pos]:
+                if cells is None:
+                    cells = _cell_bitmask(candidate, k_stride)
+                if pos not in kept_cells:
+                    kept_cells[pos] = _cell_bitmask(kept[pos], k_stride)
+                inter = (cols & k_cols).bit_count() * (cells & kept_cells[pos]).bit_count()
+            else:
+                inter = (rows & k_rows).bit_count() * (cols & k_cols).bit_count() * (ctxs & k_ctxs).bit_count()
+            union = size + k_size - inter
+            if union > 0 and float(inter / union) >= overlap_threshold:
                 should_keep = False
                 break
+
         if should_keep:
+            bit = 1 << len(kept)
+            for row in candidate["rows"]:
+                row_index[row] = row_index.get(row, 0) | bit
             kept.append(candidate)
+            kept_masks.append((rows, cols, ctxs, size))
 
     return kept
 
 
-def _tricluster_jaccard(t1: dict, t2: dict) -> float:
-    i1, j1, k1 = set(t1["rows"]), set(t1["cols"]), set(t1["contexts"])
-    i2, j2, k2 = set(t2["rows"]), set(t2["cols"]), set(t2["contexts"])
+def _to_bitmask(indices) -> int:
+    mask = 0
+    for idx in indices:
+        mask |= 1 << int(idx)
+    return mask
 
-    inter = len(i1 & i2) * len(j1 & j2) * len(k1 & k2)
-    size1 = len(i1) * len(j1) * len(k1)
-    size2 = len(i2) * len(j2) * len(k2)
-    union = size1 + size2 - inter
 
-    if union <= 0:
-        return 0.0
-    return float(inter / union)
\ No newline at end of file
+def _cell_bitmask(tric: dict, k_stride: int) -> int:
+    """Bit row * k_stride + context for every (row, context) cell the tricluster covers."""
+    if "row_contexts" in tric:
+        row_ctxs = zip(tric["rows"], tric["row_contexts"])
+    else:
+        row_ctxs = ((row, tric["contexts"]) for row in tric["rows"])
+
+    mask = 0
+    for row, ctxs in row_ctxs:
+        mask |= _to_bitmask(ctxs) << (int(row) * k_stride)
+    return mask
+
@@ -0,0 +1,549 @@
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import numpy as np
+
+from .trihspam_cache import read_entry, stage_key, write_entry
+from .trihspam_cube import CODE_DTYPE, MISSING_CODE, TriHSPAMCube
+from .trihspam_engine import (
+    NATIVE_ALGOS,
+    EncodedSequences,
+    TriHSPAMConfig,
+    _CLOSED_TIME_ALGOS,
+    _as_typed_cube,
+    _build_abstractions,
+    _cube_context,
+    _cube_to_sequences,
+    _deadline,
+    _impute_missing_with_locf_cube,
+    _mine_and_score,
+    _mine_patterns,
+    _pack_patterns,
+    _past,
+    _pattern_axes,
+    _prepare_stages,
+    _score_candidates,
+    _select_triclusters,
+    _trihspam_result,
+    _unpack_patterns,
+    _validate_config,
+    _validate_cube_info,
+)
+from .trihspam_miner import (
+    absolute_min_support,
+    embed_relaxed_pattern,
+    relaxed_occurrence_masks,
+    vertical_index_from_item_array,
+)
+
+logger = logging.getLogger(__name__)
+
+# Bump when the persisted layout changes; older states are then ignored.
+STATE_VERSION = 3
+
+# Largest shift of a bin edge, as a fraction of the feature's frozen range,
+# before the frozen abstractions are reported as needing re-binning.
+REBIN_TOLERANCE = 0.05
+
+# Config fields that do not shape the persisted state: they only control how
+# a run executes or post-processes its candidates.
+_NON_STATE_FIELDS = {
+    "coherence_threshold",
+    "overlap_filter",
+    "top_k_by_hvar3",
+    "jar_path",
+    "keep_temp_files",
+    "spmf_workers",
+    "spmf_timeout_s",
+    "n_jobs",
+    "max_patterns",
+    "time_budget_s",
+    "cache_dir",
+    "cache_max_bytes",
+}
+
+
+# -----------------------------------------------------------------------------
+# State
+# -----------------------------------------------------------------------------
+
+@dataclass
+class TriHSPAMState:
+    """
+    Everything a finished run needs to be extended with new trailing windows:
+    the (imputed) cube, frozen abstractions, encoded sequences, and the mined
+    candidate patterns with their HVar3 scores. Post-processing settings are
+    not part of it, so any coherence / overlap / top-k can be applied on top.
+    history_checksum identifies the history rows its windows were built from,
+    so a caller can tell when those rows changed under it.
+    """
+
+    key: str
+    window_size: int
+    stride: int
+    context: dict
+    cube: TriHSPAMCube
+    abstractions: dict
+    sequences: EncodedSequences
+    patterns: list[dict]
+    scores: np.ndarray
+    min_support: int
+    n_patterns_mined: int
+    next_index: int
+    history_checksum: str | None = None
+
+    @property
+    def n_windows(self) -> int:
+        return int(self.cube.shape[1])
+
+
+def state_key(config: TriHSPAMConfig, window_size: int, stride: int) -> str:
+    params = {k: v for k, v in asdict(config).items() if k not in _NON_STATE_FIELDS}
+    return stage_key("incremental", version=STATE_VERSION, window_size=window_size, stride=stride, **params)
+
+
+def save_state(path: str | Path, state: TriHSPAMState) -> None:
+    meta = {
+        "version": STATE_VERSION,
+        "key": state.key,
+        "window_size": state.window_size,
+        "stride": state.stride,
+        "context": state.context,
+        "vocabularies": state.cube.vocabularies,
+        "abstractions": list(state.abstractions.items()),
+        "labels": state.sequences.labels,
+        "n_symbols": state.sequences.n_symbols,
+        "relaxed": state.sequences.relaxed,
+        "min_support": state.min_support,
+        "n_patterns_mined": state.n_patterns_mined,
+        "next_index": state.next_index,
+        "history_checksum": state.history_checksum,
+    }
+    arrays = {
+        "numeric": state.cube.numeric,
+        "codes": state.cube.codes,
+        "missing": state.cube.missing,
+        "item_ids": state.sequences.item_ids,
+        "scores": np.asarray(state.scores, dtype=np.float64),
+    }
+    packed = _pack_patterns(state.patterns, len(state.sequences))
+    arrays.update({f"patterns_{name}": value for name, value in packed.items()})
+    write_entry(path, meta, arrays)
+
+
+def load_state(path: str | Path, key: str) -> TriHSPAMState | None:
+    """The state saved at `path`, or None when missing, outdated or saved for another key."""
+    entry = read_entry(path)
+    if entry is None:
+        return None
+    meta, arrays = entry
+    if meta.get("version") != STATE_VERSION or meta.get("key") != key:
+        return None
+
+    context = meta["context"]
+    cube = TriHSPAMCube(
+        feature_columns=context["feature_columns"],
+        numeric_feature_indices=context["numeric_feature_indices"],
+        symbolic_feature_indices=context["symbolic_feature_indices"],
+        numeric=arrays["numeric"],
+        codes=arrays["codes"],
+        vocabularies=meta["vocabularies"],
+        missing=arrays["missing"],
+    )
+    sequences = EncodedSequences(
+        item_ids=arrays["item_ids"],
+        labels=meta["labels"],
+        n_symbols=meta["n_symbols"],
+        relaxed=meta["relaxed"],
+    )
+    packed = {name[len("patterns_"):]: value for name, value in arrays.items() if name.startswith("patterns_")}
+    return TriHSPAMState(
+        key=key,
+        window_size=meta["window_size"],
+        stride=meta["stride"],
+        context=context,
+        cube=cube,
+        abstractions={int(f_idx): abstraction for f_idx, abstraction in meta["abstractions"]},
+        sequences=sequences,
+        patterns=_unpack_patterns(packed, sequences),
+        scores=arrays["scores"],
+        min_support=meta["min_support"],
+        n_patterns_mined=meta["n_patterns_mined"],
+        next_index=meta["next_index"],
+        history_checksum=meta.get("history_checksum"),
+    )
+
+
+# -----------------------------------------------------------------------------
+# Full run + extension
+# -----------------------------------------------------------------------------
+
+def run_trihspam_with_state(
+    cube_info: dict,
+    config: TriHSPAMConfig,
+    window_size: int,
+    stride: int,
+    history_checksum: str | None = None,
+) -> tuple[dict, TriHSPAMState | None]:
+    """
+    run_weather_trihspam() that also returns the state to extend later
+    (None when mining was truncated, since the result is then not complete).
+    history_checksum, of the history rows the windows cover, is stored in the state.
+    """
+    _validate_cube_info(cube_info)
+    _validate_config(config)
+
+    t0 = time.perf_counter()
+    deadline = _deadline(config)
+    raw_cube = _as_typed_cube(cube_info)
+    context = _cube_context(cube_info, raw_cube)
+    prep = _prepare_stages(config, context, {"raw_cube": raw_cube, "cube_key": None, "imputed": {}})
+    mined = _mine_and_score(prep, config, deadline=deadline)
+
+    state = None
+    if mined["stats"]["truncated"] is None:
+        patterns = [row for row, _ in mined["candidates"]]
+        state = TriHSPAMState(
+            key=state_key(config, window_size, stride),
+            window_size=int(window_size),
+            stride=int(stride),
+            context=context,
+            cube=prep["cube"],
+            abstractions=prep["abstractions"],
+            sequences=prep["sequences"],
+            patterns=patterns,
+            scores=np.asarray(mined["scores"], dtype=np.float64),
+            min_support=absolute_min_support(config.min_I, raw_cube.shape[1]),
+            n_patterns_mined=int(mined["stats"]["n_patterns"]),
+            next_index=1 + max((row["index"] for row in patterns), default=-1),
+            history_checksum=history_checksum,
+        )
+
+    result = _result(
+        config=config,
+        cube=prep["cube"],
+        sequences=prep["sequences"],
+        abstractions=prep["abstractions"],
+        candidates=mined["candidates"],
+        scores=mined["scores"],
+        mining_stats=mined["stats"],
+        context=context,
+        t0=t0,
+        incremental={"mode": "full", "new_windows": int(raw_cube.shape[1])},
+        deadline=deadline,
+    )
+    return result, state
+
+
+def extend_trihspam_state(
+    state: TriHSPAMState,
+    tail_cube_info: dict,
+    config: TriHSPAMConfig,
+    rebin_on_drift: bool = False,
+    history_checksum: str | None = None,
+) -> tuple[dict | None, TriHSPAMState | None]:
+    """
+    Extend `state` with the windows of tail_cube_info, appended after the
+    state's windows.
+
+    The stored cube rows, abstractions and scores are kept as they are. The
+    abstractions the merged cube would get from scratch are compared with the
+    frozen ones, and engine["incremental"]["rebin_required"] reports drift
+    beyond REBIN_TOLERANCE; with rebin_on_drift=True the call returns
+    (None, None) instead, so the caller can rebuild from scratch.
+
+    With a native miner only patterns supported by a new window are mined
+    (closed and frequent patterns that no new window supports keep their
+    support, closedness and score). Patterns seen before keep their index,
+    so triclusters keep their ids while their rows grow. SPMF algorithms, or a
+    support threshold that went down with the larger I, re-mine everything.
+
+    The state's windows must still come from the same history rows; callers
+    compare state.history_checksum with those rows before extending, and pass
+    the checksum of the rows the extended windows cover as history_checksum.
+
+    Returns (result, new state); the state is None when mining was truncated.
+    """
+    _validate_cube_info(tail_cube_info)
+    _validate_config(config)
+    t0 = time.perf_counter()
+    deadline = _deadline(config)
+
+    tail = _as_typed_cube(tail_cube_info)
+    if config.mv_method == "locf":
+        tail = _impute_missing_with_locf_cube(tail)
+    cube = _append_cube(state.cube, tail)
+    n_old, n_total = state.n_windows, int(cube.shape[1])
+
+    fresh = _build_abstractions(
+        cube=cube,
+        numeric_feature_indices=cube.numeric_feature_indices,
+        symbolic_feature_indices=cube.symbolic_feature_indices,
+        disc_method=config.disc_method,
+        n_bins=config.n_bins,
+    )
+    drift = _abstraction_drift(state.abstractions, fresh, cube.feature_columns)
+    rebin_required = any(value > REBIN_TOLERANCE for value in drift.values())
+    if rebin_required and rebin_on_drift:
+        logger.info("TriHSPAM abstractions drifted beyond %.2f: %s", REBIN_TOLERANCE, drift)
+        return None, None
+
+    tail_sequences = _cube_to_sequences(tail, state.abstractions, relaxed=state.sequences.relaxed)
+    sequences = EncodedSequences(
+        item_ids=np.concatenate([state.sequences.item_ids, tail_sequences.item_ids]),
+        labels=state.sequences.labels,
+        n_symbols=state.sequences.n_symbols,
+        relaxed=state.sequences.relaxed,
+    )
+
+    min_support = absolute_min_support(config.min_I, n_total)
+    delta = config.spm_algo in NATIVE_ALGOS and min_support >= state.min_support
+    stats = {"n_patterns": 0, "truncated": None, "min_I": config.min_I}
+    mined_rows = list(
+        _mine_patterns(
+            sequences=sequences,
+            n_observations=n_total,
+            min_I=config.min_I,
+            min_J=config.min_J,
+            min_K=config.min_K,
+            spm_algo=config.spm_algo,
+            jar_path=config.jar_path,
+            keep_temp_files=config.keep_temp_files,
+            spmf_workers=config.spmf_workers,
+            spmf_timeout_s=config.spmf_timeout_s,
+            stats=stats,
+            deadline=deadline,
+            max_patterns=config.max_patterns,
+            touching_from=n_old if delta else 0,
+        )
+    )
+
+    kept_rows, kept_scores = [], []
+    if delta:
+        touched = _touches_rows(state.patterns, tail_sequences, contiguous=config.spm_algo in _CLOSED_TIME_ALGOS)
+        for row, score, is_touched in zip(state.patterns, state.scores, touched):
+            if not is_touched and len(row["subject_ids"]) >= min_support:
+                kept_rows.append(row)
+                kept_scores.append(score)
+
+    # Stable ids: a pattern seen before keeps its index
+    index_of = {_pattern_key(row): row["index"] for row in state.patterns}
+    next_index = state.next_index
+    for row in mined_rows:
+        known = index_of.get(_pattern_key(row))
+        if known is None:
+            known, next_index = next_index, next_index + 1
+        row["index"] = known
+
+    new_candidates = []
+    for row in mined_rows:
+        if new_candidates and _past(deadline):
+            stats["truncated"] = stats["truncated"] or "time_budget"
+            break
+        axes = _pattern_axes(row, min_I=config.min_I, min_J=config.min_J, min_K=config.min_K, relaxed=sequences.relaxed)
+        if axes is not None:
+            new_candidates.append((row, axes))
+    new_scores = _score_candidates(
+        cube, [axes for _, axes in new_candidates], n_jobs=config.n_jobs, deadline=deadline, stats=stats
+    )
+
+    candidates = [
+        (row, _pattern_axes(row, min_I=1, min_J=1, min_K=1, relaxed=sequences.relaxed)) for row in kept_rows
+    ] + new_candidates
+    scores = np.concatenate([np.asarray(kept_scores, dtype=np.float64), np.asarray(new_scores, dtype=np.float64)])
+    order = sorted(range(len(candidates)), key=lambda pos: candidates[pos][0]["index"])
+    candidates = [candidates[pos] for pos in order]
+    scores = scores[order] if len(order) else scores
+
+    context = dict(state.context)
+    tail_context = _cube_context(tail_cube_info, tail)
+    context["windows_meta"] = state.context["windows_meta"] + tail_context["windows_meta"]
+    context["window_ids"] = state.context["window_ids"] + tail_context["window_ids"]
+
+    # Delta runs count the patterns they mined plus the ones carried over
+    n_patterns_mined = int(stats["n_patterns"]) + len(kept_rows)
+
+    new_state = None
+    if stats["truncated"] is None:
+        new_state = TriHSPAMState(
+            key=state.key,
+            window_size=state.window_size,
+            stride=state.stride,
+            context=context,
+            cube=cube,
+            abstractions=state.abstractions,
+            sequences=sequences,
+            patterns=[row for row, _ in candidates],
+            scores=scores,
+            min_support=min_support,
+            n_patterns_mined=n_patterns_mined,
+            next_index=next_index,
+            history_checksum=history_checksum,
+        )
+
+    stats["n_patterns"] = n_patterns_mined
+    result = _result(
+        config=config,
+        cube=cube,
+        sequences=sequences,
+        abstractions=state.abstractions,
+        candidates=candidates,
+        scores=scores,
+        mining_stats=stats,
+        context=context,
+        t0=t0,
+        incremental={
+            "mode": "delta" if delta else "remined",
+            "new_windows": n_total - n_old,
+            "n_delta_patterns": len(mined_rows),
+            "n_kept_patterns": len(kept_rows),
+            "rebin_required": rebin_required,
+            "edge_drift": drift,
+        },
+        deadline=deadline,
+    )
+    return result, new_state
+
+
+def result_from_state(state: TriHSPAMState, config: TriHSPAMConfig) -> dict:
+    """Result for a state with no new windows: only post-processing runs."""
+    _validate_config(config)
+    t0 = time.perf_counter()
+    candidates = [
+        (row, _pattern_axes(row, min_I=1, min_J=1, min_K=1, relaxed=state.sequences.relaxed))
+        for row in state.patterns
+    ]
+    return _result(
+        config=config,
+        cube=state.cube,
+        sequences=state.sequences,
+        abstractions=state.abstractions,
+        candidates=candidates,
+        scores=state.scores,
+        mining_stats={"n_patterns": state.n_patterns_mined, "truncated": None, "min_I": config.min_I},
+        context=state.context,
+        t0=t0,
+        incremental={"mode": "unchanged", "new_windows": 0},
+    )
+
+
+# -----------------------------------------------------------------------------
+# Helpers
+# -----------------------------------------------------------------------------
+
+def _result(
+    config: TriHSPAMConfig,
+    cube: TriHSPAMCube,
+    sequences: EncodedSequences,
+    abstractions: dict,
+    candidates: list,
+    scores: np.ndarray,
+    mining_stats: dict,
+    context: dict,
+    t0: float,
+    incremental: dict,
+    deadline: float | None = None,
+) -> dict:
+    prep = {"cube": cube, "sequences": sequences}
+    triclusters = _select_triclusters(candidates, scores, config, prep, context, mining_stats, deadline=deadline)
+    result = _trihspam_result(
+        config=config,
+        cube=cube,
+        sequences=sequences,
+        abstractions=abstractions,
+        triclusters=triclusters,
+        mining_stats=mining_stats,
+        cache_hits=None,
+        context=context,
+        timings={"total_s": time.perf_counter() - t0},
+        group_size=1,
+    )
+    result["engine"]["incremental"] = incremental
+    return result
+
+
+def _append_cube(old: TriHSPAMCube, tail: TriHSPAMCube) -> TriHSPAMCube:
+    """Cube with the windows of `tail` after those of `old`, on merged vocabularies."""
+    if list(old.feature_columns) != list(tail.feature_columns) or old.shape[2] != tail.shape[2]:
+        raise ValueError("Cannot append windows with a different feature layout or window size.")
+
+    vocabularies = []
+    codes = np.empty((old.codes.shape[0], old.shape[1] + tail.shape[1], old.shape[2]), dtype=CODE_DTYPE)
+    for local in range(len(old.symbolic_feature_indices)):
+        vocab = sorted(set(old.vocabularies[local]) | set(tail.vocabularies[local]))
+        if len(vocab) > np.iinfo(CODE_DTYPE).max:
+            raise ValueError(f"Too many categories for int16 codes: {len(vocab)}")
+        position = {value: idx for idx, value in enumerate(vocab)}
+        for source, out in ((old, codes[local, :old.shape[1]]), (tail, codes[local, old.shape[1]:])):
+            # old code -> merged code; the trailing entry serves code -1 (missing)
+            lookup = np.array([position[v] for v in source.vocabularies[local]] + [MISSING_CODE], dtype=CODE_DTYPE)
+            out[...] = lookup[source.codes[local]]
+        vocabularies.append(vocab)
+
+    return TriHSPAMCube(
+        feature_columns=list(old.feature_columns),
+        numeric_feature_indices=list(old.numeric_feature_indices),
+        symbolic_feature_indices=list(old.symbolic_feature_indices),
+        numeric=np.concatenate([old.numeric, tail.numeric], axis=1),
+        codes=codes,
+        vocabularies=vocabularies,
+        missing=np.concatenate([old.missing, tail.missing], axis=1),
+    )
+
+
+def _abstraction_drift(frozen: dict, fresh: dict, feature_columns: list[str]) -> dict[str, float]:
+    """
+    Per feature, how far the frozen abstraction is from a fresh one: the
+    largest bin edge shift relative to the frozen range for numeric features,
+    1.0 when the bin count or the symbolic value set changed, else 0.0.
+    """
+    drift = {}
+    for f_idx, old in frozen.items():
+        new = fresh[f_idx]
+        if old["type"] == "symbolic":
+            drift[feature_columns[f_idx]] = 0.0 if old["values"] == new["values"] else 1.0
+            continue
+        old_edges = np.asarray(old["edges"], dtype=float)
+        new_edges = np.asarray(new["edges"], dtype=float)
+        if old_edges.shape != new_edges.shape:
+            drift[feature_columns[f_idx]] = 1.0
+        elif old_edges.size == 0:
+            drift[feature_columns[f_idx]] = 0.0
+        else:
+            span = float(old_edges[-1] - old_edges[0]) or 1.0
+            drift[feature_columns[f_idx]] = round(float(np.abs(new_edges - old_edges).max()) / span, 6)
+    return drift
+
+
+def _touches_rows(patterns: list[dict], tail: EncodedSequences, contiguous: bool) -> np.ndarray:
+    """Whether each pattern is supported by at least one sequence of `tail`."""
+    touched = np.zeros(len(patterns), dtype=bool)
+    if not patterns or len(tail) == 0:
+        return touched
+
+    if tail.relaxed:
+        occ = relaxed_occurrence_masks(tail.item_ids)
+        rows = np.arange(len(tail), dtype=np.int64)
+        for pos, row in enumerate(patterns):
+            found, _ = embed_relaxed_pattern(occ, rows, row["itemset_ids"], contiguous=contiguous)
+            touched[pos] = found.size > 0
+        return touched
+
+    # Aligned items carry their context, so support is the AND of item bitsets
+    vertical = vertical_index_from_item_array(tail.item_ids)
+    everything = (1 << len(tail)) - 1
+    for pos, row in enumerate(patterns):
+        bits = everything
+        for itemset in row["itemset_ids"]:
+            for item_id in itemset:
+                bits &= vertical.get(item_id, 0)
+        touched[pos] = bits != 0
+    return touched
+
+
+def _pattern_key(row: dict) -> tuple:
+    return tuple(tuple(itemset) for itemset in row["itemset_ids"])
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+
+# -----------------------------------------------------------------------------
+# Binary exchange formats
+# -----------------------------------------------------------------------------
+#
+# Sequences and mined patterns are exchanged with the SPMF worker as flat
+# little-endian arrays instead of SPMF's whitespace text, so Python writes them
+# with ndarray.tofile() and reads them back through a memory map. SpmfWorker.java
+# (RUNBIN) converts to and from the text SPMF itself reads and writes.
+#
+# Sequence file (.tseq):
+#   header   magic "TSEQ", int32 version, int32 flags (bit 0: timestamps),
+#            int32 n_sequences, int64 n_itemsets, int64 n_items     (32 bytes)
+#   int64    seq_ptr[n_sequences + 1]     itemsets of sequence s
+#   int64    itemset_ptr[n_itemsets + 1]  items of itemset t
+#   int32    itemset_time[n_itemsets]     context index of itemset t
+#   int32    items[n_items]               item ids, ascending per itemset
+#
+# Pattern file (.tpat):
+#   header   magic "TPAT", int32 version, int32 n_sequences, int32 n_words,
+#            int64 n_patterns, int64 n_itemsets, int64 n_items      (40 bytes)
+#   int64    pattern_ptr[n_patterns + 1]  itemsets of pattern p
+#   int64    itemset_ptr[n_itemsets + 1]  items of itemset t
+#   uint64   sid_words[n_patterns * n_words]  subject-id bitsets, bit s of
+#                                             word s // 64 set when s supports p
+#   int32    support[n_patterns]          SPMF's #SUP (0 when not reported)
+#   int32    items[n_items]
+#
+# Every array starts 8-byte aligned: the int32 ones come last.
+
+FORMAT_VERSION = 1
+FLAG_TIMESTAMPS = 1
+
+SEQUENCE_MAGIC = b"TSEQ"
+PATTERN_MAGIC = b"TPAT"
+
+_SEQUENCE_HEADER = np.dtype([
+    ("magic", "S4"),
+    ("version", "<i4"),
+    ("flags", "<i4"),
+    ("n_sequences", "<i4"),
+    ("n_itemsets", "<i8"),
+    ("n_items", "<i8"),
+])
+_PATTERN_HEADER = np.dtype([
+    ("magic", "S4"),
+    ("version", "<i4"),
+    ("n_sequences", "<i4"),
+    ("n_words", "<i4"),
+    ("n_patterns", "<i8"),
+    ("n_itemsets", "<i8"),
+    ("n_items", "<i8"),
+])
+
+
+def write_sequence_file(path: str | Path, item_ids: np.ndarray, include_timestamps: bool) -> None:
+    """
+    Write (I, K, F) item ids (0 = missing) as a sequence file. Empty itemsets
+    are dropped, as in SPMF's text input.
+    """
+    i_count, k_count, _ = item_ids.shape
+    present = item_ids > 0
+    itemset_sizes = present.sum(axis=2)
+    non_empty = itemset_sizes > 0
+
+    seq_ptr = _offsets(non_empty.sum(axis=1))
+    itemset_ptr = _offsets(itemset_sizes[non_empty])
+    itemset_time = np.broadcast_to(np.arange(k_count, dtype="<i4"), (i_count, k_count))[non_empty]
+    items = item_ids[present].astype("<i4", copy=False)
+
+    header = np.zeros(1, dtype=_SEQUENCE_HEADER)
+    header[0] = (
+        SEQUENCE_MAGIC,
+        FORMAT_VERSION,
+        FLAG_TIMESTAMPS if include_timestamps else 0,
+        i_count,
+        itemset_time.size,
+        items.size,
+    )
+    with Path(path).open("wb") as f:
+        for array in (header, seq_ptr, itemset_ptr, itemset_time, items):
+            array.tofile(f)
+
+
+def read_sequence_file(path: str | Path) -> dict:
+    """Memory-mapped arrays of a sequence file, plus include_timestamps."""
+    buf = np.memmap(path, dtype=np.uint8, mode="r")
+    header = _read_header(buf, _SEQUENCE_HEADER, SEQUENCE_MAGIC, path)
+    n_sequences, n_itemsets, n_items = (int(header[name]) for name in ("n_sequences", "n_itemsets", "n_items"))
+
+    arrays = _read_arrays(buf, _SEQUENCE_HEADER.itemsize, [
+        ("seq_ptr", "<i8", n_sequences + 1),
+        ("itemset_ptr", "<i8", n_itemsets + 1),
+        ("itemset_time", "<i4", n_itemsets),
+        ("items", "<i4", n_items),
+    ])
+    arrays["include_timestamps"] = bool(int(header["flags"]) & FLAG_TIMESTAMPS)
+    return arrays
+
+
+def write_pattern_file(
+    path: str | Path,
+    patterns: Iterable[tuple[list[list[int]], int, list[int]]],
+    n_sequences: int,
+) -> None:
+    """
+    Write (itemset_ids, support, subject_ids) patterns as a pattern file, the
+    same layout SpmfWorker.java produces.
+    """
+    patterns = list(patterns)
+    itemsets = [itemset for itemset_ids, _, _ in patterns for itemset in itemset_ids]
+    sid_words = pack_subject_bitsets([sids for _, _, sids in patterns], n_sequences)
+
+    pattern_ptr = _offsets([len(itemset_ids) for itemset_ids, _, _ in patterns])
+    itemset_ptr = _offsets([len(itemset) for itemset in itemsets])
+    support = np.array([support for _, support, _ in patterns], dtype="<i4")
+    items = np.fromiter((item for itemset in itemsets for item in itemset), dtype="<i4")
+
+    header = np.zeros(1, dtype=_PATTERN_HEADER)
+    header[0] = (
+        PATTERN_MAGIC,
+        FORMAT_VERSION,
+        n_sequences,
+        sid_words.shape[1],
+        len(patterns),
+        len(itemsets),
+        items.size,
+    )
+    with Path(path).open("wb") as f:
+        for array in (header, pattern_ptr, itemset_ptr, sid_words, support, items):
+            array.tofile(f)
+
+
+def read_pattern_file(path: str | Path) -> dict:
+    """
+    Memory-mapped arrays of a pattern file; sid_words is (n_patterns, n_words),
+    n_sequences the number of bits that are meaningful per row.
+    """
+    buf = np.memmap(path, dtype=np.uint8, mode="r")
+    header = _read_header(buf, _PATTERN_HEADER, PATTERN_MAGIC, path)
+    n_patterns, n_itemsets, n_items, n_words = (
+        int(header[name]) for name in ("n_patterns", "n_itemsets", "n_items", "n_words")
+    )
+
+    arrays = _read_arrays(buf, _PATTERN_HEADER.itemsize, [
+        ("pattern_ptr", "<i8", n_patterns + 1),
+        ("itemset_ptr", "<i8", n_itemsets + 1),
+        ("sid_words", "<u8", n_patterns * n_words),
+        ("support", "<i4", n_patterns),
+        ("items", "<i4", n_items),
+    ])
+    arrays["sid_words"] = arrays["sid_words"].reshape(n_patterns, n_words)
+    arrays["n_sequences"] = int(header["n_sequences"])
+    return arrays
+
+
+# -----------------------------------------------------------------------------
+# Subject-id bitsets
+# -----------------------------------------------------------------------------
+
+def pack_subject_bitsets(sid_lists: list[list[int]], n_sequences: int) -> np.ndarray:
+    """(len(sid_lists), ceil(n_sequences / 64)) uint64 bitsets, bit s of word s // 64."""
+    n_words = (int(n_sequences) + 63) // 64
+    words = np.zeros((len(sid_lists), n_words), dtype="<u8")
+    if not sid_lists or n_words == 0:
+        return words
+
+    counts = np.fromiter((len(sids) for sids in sid_lists), dtype=np.int64, count=len(sid_lists))
+    sids = np.fromiter((sid for sids in sid_lists for sid in sids), dtype=np.int64, count=int(counts.sum()))
+    if sids.size and (sids.min() < 0 or sids.max() >= n_sequences):
+        raise ValueError(f"Subject ids must lie in [0, {n_sequences}).")
+
+    rows = np.repeat(np.arange(len(sid_lists), dtype=np.int64), counts)
+    bits = np.left_shift(np.uint64(1), (sids & 63).astype(np.uint64))
+    np.bitwise_or.at(words, (rows, sids >> 6), bits)
+    return words
+
+
+def unpack_subject_bitset(words: np.ndarray) -> list[int]:
+    """Sorted subject ids of one bitset row."""
+    bits = np.unpackbits(np.ascontiguousarray(words, dtype="<u8").view(np.uint8), bitorder="little")
+    return np.flatnonzero(bits).tolist()
+
+
+# -----------------------------------------------------------------------------
+# Helpers
+# -----------------------------------------------------------------------------
+
+def _offsets(counts) -> np.ndarray:
+    counts = np.asarray(counts, dtype="<i8").ravel()
+    out = np.zeros(counts.size + 1, dtype="<i8")
+    np.cumsum(counts, out=out[1:])
+    return out
+
+
+def _read_header(buf: np.ndarray, dtype: np.dtype, magic: bytes, path) -> np.void:
+    if buf.size < dtype.itemsize:
+        raise ValueError(f"Truncated TriHSPAM binary file: {path}")
+    header = buf[:dtype.itemsize].view(dtype)[0]
+    if header["magic"] != magic or int(header["version"]) != FORMAT_VERSION:
+        raise ValueError(f"Not a version {FORMAT_VERSION} {magic.decode()} file: {path}")
+    return header
+
+
+def _read_arrays(buf: np.ndarray, offset: int, layout: list[tuple[str, str, int]]) -> dict:
+    arrays = {}
+    for name, dtype, count in layout:
+        size = np.dtype(dtype).itemsize * count
+        if offset + size > buf.size:
+            raise ValueError("Truncated TriHSPAM binary file.")
+        arrays[name] = buf[offset:offset + size].view(dtype)
+        offset += size
+    return arrays
@@ -0,0 +1,461 @@
+from __future__ import annotations
+
+import math
+import time
+
+import numpy as np
+
+
+# -----------------------------------------------------------------------------
+# In-process sequential pattern miner for aligned TriHSPAM sequences
+# -----------------------------------------------------------------------------
+#
+# In the aligned (time-constrained) case every item is a "f{feat}_{ctx}#symbol"
+# token, so an item can only ever occur at timestamp ctx. The embedding of a
+# pattern in a sequence is therefore fixed, and the SPAM-style vertical
+# representation collapses to one support bitset per item: bit s is set when
+# sequence s contains the item. Both itemset (I-step) and sequence (S-step)
+# extensions reduce to a bitwise AND of these bitsets.
+#
+# Bitsets are plain Python ints (arbitrary precision AND + int.bit_count()).
+
+
+def absolute_min_support(min_I: int, n_observations: int) -> int:
+    """
+    Same minimum support SPMF ends up with for the percentage we hand the jar,
+    so the native and Java miners agree on which patterns are frequent.
+    """
+    if n_observations <= 0:
+        return max(1, int(min_I))
+    percent = max(1, int(math.ceil((float(min_I) / float(n_observations)) * 100.0)))
+    return max(1, int(math.ceil((percent / 100.0) * n_observations)))
+
+
+def vertical_index_from_item_array(item_ids: np.ndarray) -> dict[int, int]:
+    """
+    item_ids: integer array whose first axis is the sequence index, 0 = no item.
+    Returns {item_id: support bitset over sequence indices}.
+    """
+    n_sequences = int(item_ids.shape[0])
+    flat = item_ids.reshape(n_sequences, -1)
+    sids = np.broadcast_to(np.arange(n_sequences)[:, None], flat.shape).reshape(-1)
+    ids = flat.reshape(-1)
+
+    keep = ids > 0
+    ids, sids = ids[keep], sids[keep]
+    order = np.argsort(ids, kind="stable")
+    ids, sids = ids[order], sids[order]
+
+    uniq, starts = np.unique(ids, return_index=True)
+    ends = np.append(starts[1:], ids.size)
+    return {
+        int(item_id): sids_to_bitset(sids[start:end], n_sequences)
+        for item_id, start, end in zip(uniq, starts, ends)
+    }
+
+
+def sids_to_bitset(sids, n_sequences: int) -> int:
+    mask = np.zeros(max(1, n_sequences), dtype=bool)
+    mask[np.asarray(sids, dtype=np.int64)] = True
+    return int.from_bytes(np.packbits(mask, bitorder="little").tobytes(), "little")
+
+
+def bitset_to_sids(bits: int) -> list[int]:
+    out: list[int] = []
+    while bits:
+        low = bits & -bits
+        out.append(low.bit_length() - 1)
+        bits ^= low
+    return out
+
+
+def mine_aligned_patterns(
+    vertical: dict[int, int],
+    item_ctx: dict[int, int],
+    min_support: int,
+    *,
+    closed: bool,
+    contiguous: bool,
+    min_span: int = 1,
+    deadline: float | None = None,
+    max_results: int | None = None,
+    stats: dict | None = None,
+    touching_from: int = 0,
+) -> list[tuple[list[list[int]], int]]:
+    """
+    Depth-first search over aligned sequential patterns.
+
+    vertical: {item_id: support bitset}
+    item_ctx: {item_id: timestamp the item is bound to}
+    closed: only emit patterns with no same-support super-pattern (under the same constraints)
+    contiguous: consecutive itemsets must be exactly one timestamp apart
+        (the min/max interval = 1 setting used for Fournier08-Closed+time)
+    min_span: minimum number of timestamps covered by an emitted pattern
+    deadline: time.monotonic() value after which the search stops early
+    max_results: stop once this many patterns have been emitted
+    stats: if given, stats["truncated"] is set to "time_budget" or
+        "max_patterns" when the search stopped early (None otherwise)
+    touching_from: only search patterns supported by at least one sequence
+        with index >= touching_from (support only shrinks down a branch, so
+        whole subtrees are skipped); closedness is still judged on all sequences
+
+    Returns [(itemsets, bitset)], where itemsets is a list of item-id lists
+    ordered by timestamp and bitset holds the supporting sequence indices.
+    """
+    if stats is not None:
+        stats["truncated"] = None
+    min_support = max(1, int(min_support))
+
+    items_by_ctx: dict[int, list[tuple[int, int]]] = {}
+    for item_id, bits in vertical.items():
+        if bits.bit_count() < min_support:
+            continue
+        items_by_ctx.setdefault(int(item_ctx[item_id]), []).append((int(item_id), bits))
+    for entries in items_by_ctx.values():
+        entries.sort()
+
+    ctxs = sorted(items_by_ctx)
+    if not ctxs:
+        return []
+
+    results: list[tuple[list[list[int]], int]] = []
+
+    def _covered_by(candidates, bits: int) -> bool:
+        for _, other in candidates:
+            if other & bits == bits:
+                return True
+        return False
+
+    def _blocked(itemsets, first_ctx: int, cur_ctx: int, last_pos: int, bits: int) -> bool:
+        # Items that can no longer be added anywhere in this subtree but still sit
+        # inside the range a valid super-pattern could use. If one of them covers the
+        # current support, neither this node nor any descendant can be closed.
+        in_pattern = {item for itemset in itemsets for item in itemset}
+        lower = first_ctx - 1 if contiguous else ctxs[0]
+        for ctx in ctxs:
+            if ctx < lower:
+                continue
+            if ctx > cur_ctx:
+                break
+            entries = items_by_ctx[ctx]
+            if ctx == cur_ctx:
+                entries = entries[:last_pos]
+            for item_id, other in entries:
+                if item_id not in in_pattern and other & bits == bits:
+                    return True
+        return False
+
+    def _is_closed(cur_ctx: int, last_pos: int, bits: int) -> bool:
+        if _covered_by(items_by_ctx[cur_ctx][last_pos + 1:], bits):
+            return False
+        for ctx in _next_ctxs(cur_ctx):
+            if _covered_by(items_by_ctx[ctx], bits):
+                return False
+        return True
+
+    def _next_ctxs(cur_ctx: int):
+        if contiguous:
+            return [cur_ctx + 1] if (cur_ctx + 1) in items_by_ctx else []
+        return [c for c in ctxs if c > cur_ctx]
+
+    # Node: (itemsets, first_ctx, cur_ctx, last_pos, bits)
+    stack = []
+    for ctx in reversed(ctxs):
+        for pos in range(len(items_by_ctx[ctx]) - 1, -1, -1):
+            item_id, bits = items_by_ctx[ctx][pos]
+            stack.append(([[item_id]], ctx, ctx, pos, bits))
+
+    visited = 0
+    while stack:
+        visited += 1
+        if deadline is not None and visited % 256 == 0 and time.monotonic() > deadline:
+            if stats is not None:
+                stats["truncated"] = "time_budget"
+            break
+
+        itemsets, first_ctx, cur_ctx, last_pos, bits = stack.pop()
+
+        if touching_from and not bits >> touching_from:
+            continue
+        if closed and _blocked(itemsets, first_ctx, cur_ctx, last_pos, bits):
+            continue
+
+        span = cur_ctx - first_ctx + 1
+        if span >= min_span and (not closed or _is_closed(cur_ctx, last_pos, bits)):
+            results.append(([list(x) for x in itemsets], bits))
+            if max_results is not None and len(results) >= max_results:
+                if stats is not None:
+                    stats["truncated"] = "max_patterns"
+                break
+
+        children = []
+        entries = items_by_ctx[cur_ctx]
+        for pos in range(last_pos + 1, len(entries)):
+            item_id, other = entries[pos]
+            new_bits = bits & other
+            if new_bits.bit_count() >= min_support:
+                children.append((itemsets[:-1] + [itemsets[-1] + [item_id]], first_ctx, cur_ctx, pos, new_bits))
+
+        for ctx in _next_ctxs(cur_ctx):
+            for pos, (item_id, other) in enumerate(items_by_ctx[ctx]):
+                new_bits = bits & other
+                if new_bits.bit_count() >= min_support:
+                    children.append((itemsets + [[item_id]], first_ctx, ctx, pos, new_bits))
+
+        # Reverse so the stack pops children in canonical order
+        stack.extend(reversed(children))
+
+    return results
+
+
+# -----------------------------------------------------------------------------
+# In-process miner for time-relaxed TriHSPAM sequences
+# -----------------------------------------------------------------------------
+#
+# Relaxed items are "f{feat}#symbol" tokens, so a pattern may match each
+# sequence at a different offset. Per item we keep one uint64 per sequence
+# whose bit k is set when the item occurs at timestamp k (hence at most 64
+# timestamps). A search node carries, for each supporting sequence, the
+# positions where its embedding sits:
+#
+#   contiguous (consecutive itemsets exactly one timestamp apart): the bitmask
+#       of every start offset where the whole pattern matches; extending with
+#       item y at pattern position d is `starts & (occ[y] >> d)`.
+#   gapped: the leftmost embedding (greedy, which is optimal for existence),
+#       i.e. the matched timestamp of every itemset plus the occurrence mask of
+#       the last itemset, so an I-step only has to re-place the last itemset.
+#
+# Matched positions are therefore known for every emitted pattern without
+# rescanning the sequences.
+
+MAX_RELAXED_CONTEXTS = 64
+
+_ALL_BITS = (1 << 64) - 1
+# _BITS_FROM[s]: bits s..63 set (0 for s = 64)
+_BITS_FROM = np.array([(_ALL_BITS << s) & _ALL_BITS for s in range(65)], dtype=np.uint64)
+
+
+def relaxed_occurrence_masks(item_ids: np.ndarray) -> dict[int, np.ndarray]:
+    """
+    item_ids: (I, K, F) relaxed item ids, 0 = no item.
+    Returns {item_id: uint64 array (I,)}, bit k set when the item occurs at k.
+    """
+    i_count, k_count = int(item_ids.shape[0]), int(item_ids.shape[1])
+    if k_count > MAX_RELAXED_CONTEXTS:
+        raise ValueError(f"Relaxed mining supports at most {MAX_RELAXED_CONTEXTS} contexts, got {k_count}.")
+
+    rows, ctxs, _ = np.nonzero(item_ids > 0)
+    ids = item_ids[rows, ctxs, _].astype(np.int64)
+    uniq, inverse = np.unique(ids, return_inverse=True)
+
+    masks = np.zeros((uniq.size, i_count), dtype=np.uint64)
+    np.bitwise_or.at(masks, (inverse, rows), np.left_shift(np.uint64(1), ctxs.astype(np.uint64)))
+    return {int(item_id): masks[pos] for pos, item_id in enumerate(uniq)}
+
+
+def lowest_bit_index(masks: np.ndarray) -> np.ndarray:
+    """Index of the lowest set bit of each (non-zero) uint64."""
+    low = masks & (~masks + np.uint64(1))
+    return np.log2(low.astype(np.float64)).astype(np.int64)
+
+
+def embed_relaxed_pattern(
+    occ: dict[int, np.ndarray],
+    rows: np.ndarray,
+    itemsets: list[list[int]],
+    contiguous: bool,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Leftmost embedding of a relaxed pattern in the given sequences.
+    Returns (rows that contain it, matched timestamps (n, len(itemsets))).
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    itemset_masks = []
+    for itemset in itemsets:
+        mask = np.full(rows.size, _ALL_BITS, dtype=np.uint64)
+        for item_id in itemset:
+            mask &= occ[item_id][rows] if item_id in occ else np.uint64(0)
+        itemset_masks.append(mask)
+
+    m = len(itemsets)
+    if contiguous:
+        starts = np.full(rows.size, _ALL_BITS, dtype=np.uint64)
+        for pos, mask in enumerate(itemset_masks):
+            starts &= mask >> np.uint64(pos)
+        keep = starts != 0
+        first = lowest_bit_index(starts[keep])
+        return rows[keep], first[:, None] + np.arange(m)[None, :]
+
+    positions = np.empty((rows.size, m), dtype=np.int64)
+    keep = np.ones(rows.size, dtype=bool)
+    prev = np.full(rows.size, -1, dtype=np.int64)
+    for pos, mask in enumerate(itemset_masks):
+        cand = mask & _BITS_FROM[prev + 1]
+        keep &= cand != 0
+        cand[~keep] = np.uint64(1)
+        prev = lowest_bit_index(cand)
+        positions[:, pos] = prev
+    return rows[keep], positions[keep]
+
+
+def mine_relaxed_patterns(
+    occ: dict[int, np.ndarray],
+    min_support: int,
+    *,
+    closed: bool,
+    contiguous: bool,
+    min_span: int = 1,
+    deadline: float | None = None,
+    max_results: int | None = None,
+    stats: dict | None = None,
+    touching_from: int = 0,
+) -> list[tuple[list[list[int]], np.ndarray, np.ndarray]]:
+    """
+    Depth-first search over time-relaxed sequential patterns.
+
+    occ: {item_id: uint64 occurrence masks (I,)} from relaxed_occurrence_masks()
+    closed: only emit patterns with no same-support super-pattern; supported
+        for contiguous patterns (the Fournier08-Closed+time setting)
+    contiguous: consecutive itemsets must be exactly one timestamp apart
+    min_span: minimum number of itemsets (= timestamps) in an emitted pattern
+    deadline / max_results / stats / touching_from: as in mine_aligned_patterns()
+
+    Returns [(itemsets, rows, positions)]: rows holds the supporting sequence
+    indices (ascending) and positions[r, p] the timestamp matched by itemset p
+    in sequence rows[r].
+    """
+    if closed and not contiguous:
+        raise ValueError("Closed relaxed mining is only implemented for contiguous patterns.")
+    if stats is not None:
+        stats["truncated"] = None
+
+    min_support = max(1, int(min_support))
+    frequent = sorted(item_id for item_id, mask in occ.items() if int(np.count_nonzero(mask)) >= min_support)
+    if not frequent:
+        return []
+
+    item_arr = np.array(frequent, dtype=np.int64)
+    occ_mat = np.stack([occ[item_id] for item_id in frequent])  # (N, I)
+    n_items = len(frequent)
+
+    results: list[tuple[list[list[int]], np.ndarray, np.ndarray]] = []
+
+    def _emit(itemsets, rows, positions) -> bool:
+        results.append(([list(x) for x in itemsets], rows, positions))
+        if max_results is not None and len(results) >= max_results:
+            if stats is not None:
+                stats["truncated"] = "max_patterns"
+            return True
+        return False
+
+    all_rows = np.arange(occ_mat.shape[1], dtype=np.int64)
+    stack = []
+    for pos in range(n_items - 1, -1, -1):
+        mask = occ_mat[pos]
+        rows = all_rows[mask != 0]
+        if contiguous:
+            stack.append(([[frequent[pos]]], pos, rows, mask[rows]))
+        else:
+            first = lowest_bit_index(mask[rows])
+            stack.append(([[frequent[pos]]], pos, rows, (first[:, None], mask[rows])))
+
+    visited = 0
+    while stack:
+        visited += 1
+        if deadline is not None and visited % 256 == 0 and time.monotonic() > deadline:
+            if stats is not None:
+                stats["truncated"] = "time_budget"
+            break
+
+        itemsets, last_pos, rows, state = stack.pop()
+        if touching_from and (rows.size == 0 or rows[-1] < touching_from):
+            continue
+        m = len(itemsets)
+        sub = occ_mat[:, rows]  # (N, n)
+
+        if contiguous:
+            starts = state
+            # Offsets -1 .. m relative to the pattern start; bit k of `shifted`
+            # says the item occurs at start k + offset.
+            offsets = range(-1, m + 1)
+            shifted = np.stack(
+                [(sub << np.uint64(1)) if d < 0 else (sub >> np.uint64(d)) for d in offsets],
+                axis=1,
+            )  # (N, m + 2, n)
+            hit = (shifted & starts[None, None, :]) != 0
+            support = hit.sum(axis=2)  # (N, m + 2)
+
+            if closed:
+                in_pattern = np.zeros((n_items, m + 2), dtype=bool)
+                for p, itemset in enumerate(itemsets):
+                    in_pattern[np.searchsorted(item_arr, itemset), p + 1] = True
+
+                # Items no descendant can add (earlier positions, or before the
+                # last item in the last itemset) that sit next to every single
+                # start: every descendant has a same-support super-pattern.
+                blocked = np.zeros((n_items, m + 2), dtype=bool)
+                blocked[:, :m] = True
+                blocked[:last_pos, m] = True
+                blocked &= ~in_pattern
+                if blocked.any():
+                    covers = ((starts[None, :] & ~shifted[blocked]) == 0).all(axis=1)
+                    if covers.any():
+                        continue
+
+                is_closed = not ((support == rows.size) & ~in_pattern).any()
+            else:
+                is_closed = True
+
+            if m >= min_span and is_closed:
+                first = lowest_bit_index(starts)
+                if _emit(itemsets, rows, first[:, None] + np.arange(m)[None, :]):
+                    break
+
+            children = []
+            for pos in np.flatnonzero(support[:, m] >= min_support):  # I-step, d = m - 1
+                if pos <= last_pos:
+                    continue
+                new_starts = starts & shifted[pos, m]
+                keep = new_starts != 0
+                children.append((itemsets[:-1] + [itemsets[-1] + [frequent[pos]]], int(pos), rows[keep], new_starts[keep]))
+            for pos in np.flatnonzero(support[:, m + 1] >= min_support):  # S-step, d = m
+                new_starts = starts & shifted[pos, m + 1]
+                keep = new_starts != 0
+                children.append((itemsets + [[frequent[pos]]], int(pos), rows[keep], new_starts[keep]))
+
+        else:
+            positions, last_mask = state
+            if m >= min_span:
+                if _emit(itemsets, rows, positions):
+                    break
+
+            children = []
+            prev = positions[:, -2] if m > 1 else np.full(rows.size, -1, dtype=np.int64)
+            # I-step: re-place the last itemset, now also holding item y
+            i_cand = sub & (last_mask & _BITS_FROM[prev + 1])[None, :]
+            # S-step: new itemset {y} strictly after the last one
+            s_cand = sub & _BITS_FROM[positions[:, -1] + 1][None, :]
+
+            for pos in np.flatnonzero((i_cand != 0).sum(axis=1) >= min_support):
+                if pos <= last_pos:
+                    continue
+                keep = i_cand[pos] != 0
+                new_positions = positions[keep].copy()
+                new_positions[:, -1] = lowest_bit_index(i_cand[pos][keep])
+                children.append((
+                    itemsets[:-1] + [itemsets[-1] + [frequent[pos]]],
+                    int(pos),
+                    rows[keep],
+                    (new_positions, last_mask[keep] & sub[pos][keep]),
+                ))
+            for pos in np.flatnonzero((s_cand != 0).sum(axis=1) >= min_support):
+                keep = s_cand[pos] != 0
+                new_positions = np.concatenate(
+                    [positions[keep], lowest_bit_index(s_cand[pos][keep])[:, None]], axis=1
+                )
+                children.append((itemsets + [[frequent[pos]]], int(pos), rows[keep], (new_positions, sub[pos][keep])))
+
+        # Reverse so the stack pops children in canonical order
+        stack.extend(reversed(children))
+
+    return results
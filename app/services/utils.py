@@ -2,3 +2,7 @@ def city_key(city: str, country_code: str | None = None):
     c = city.strip().lower().replace(" ", "_")
     cc = (country_code or "").strip().lower()
     return f"{c}_{cc}" if cc else c
+
+def safe_city_dir(key: str) -> str:
+    """city_key() with anything but letters, digits, "-" and "_" replaced, for file and directory names."""
+    return "".join(ch if ch.isalnum() or ch in ("-", "_") else "_" for ch in key)
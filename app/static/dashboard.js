@@ -52,9 +52,37 @@ async function rerunAnalysis(){
     return;
   }
 
+  const run = await waitForRun(j.run_id);
+  if(run.status !== "ok"){
+    el("statusBox").textContent = "Analysis failed: " + (run.error || "unknown");
+    return;
+  }
+
   await loadDashboard();
 }
 
+const RUN_POLL_MS = 2000;
+
+async function waitForRun(runId){
+  // Poll the queued run until it finishes, showing the step it is on
+  while(true){
+    const res = await fetch(`/runs/${encodeURIComponent(runId)}`);
+    const run = await res.json();
+
+    if(!res.ok) return { status: "error", error: run.error };
+    if(run.status === "ok" || run.status === "error") return run;
+
+    const progress = run.progress || {};
+    const done = Object.keys(progress.step_timings_ms || {}).length;
+    el("statusBox").textContent =
+      run.status === "queued"
+        ? "Analysis queued..."
+        : `Running analysis: ${progress.current_step || "..."} (${done} steps done)`;
+
+    await new Promise(resolve => setTimeout(resolve, RUN_POLL_MS));
+  }
+}
+
 function destroyChartIfExists(canvasId){
   if(chartStore[canvasId]){
     chartStore[canvasId].destroy();
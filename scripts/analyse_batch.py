@@ -0,0 +1,79 @@
+"""
+Run the analysis pipeline over many cities in one go (e.g. nightly).
+
+    python scripts/analyse_batch.py --all                      # every city in metadata
+    python scripts/analyse_batch.py --city Pune,IN --city Oslo
+    python scripts/analyse_batch.py --file cities.txt --json-out batch.json
+
+A cities file has one "City" or "City,CC" per line. Prints one line per
+city and the batch throughput; --json-out writes the full summary.
+"""
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.analysis_batch import run_batch_analysis  # noqa: E402
+from app.services.db import list_cities  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--city", action="append", default=[], help='"City" or "City,CC"; repeatable')
+    parser.add_argument("--file", help="File with one city per line")
+    parser.add_argument("--all", action="store_true", help="Every city with stored metadata")
+    parser.add_argument("--start", default="2016-01-01")
+    parser.add_argument("--end", default="2024-12-31")
+    parser.add_argument("--workers", type=int, default=None, help="Concurrent cities (default: one per core)")
+    parser.add_argument("--no-auto-ingest", action="store_true")
+    parser.add_argument("--time-budget-s", type=float, default=None)
+    parser.add_argument("--top-k", type=int, default=None)
+    parser.add_argument("--incremental", action="store_true")
+    parser.add_argument("--json-out", help="Write the full batch summary here")
+    args = parser.parse_args()
+
+    cities = list(args.city)
+    if args.file:
+        lines = Path(args.file).read_text(encoding="utf-8").splitlines()
+        cities += [ln.strip() for ln in lines if ln.strip() and not ln.lstrip().startswith("#")]
+    if args.all:
+        # metadata stores city keys, which analyse back to themselves
+        cities += list_cities()["city"].tolist()
+    if not cities:
+        parser.error("no cities given (use --city, --file or --all)")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    summary = run_batch_analysis(
+        cities,
+        start=args.start,
+        end=args.end,
+        workers=args.workers,
+        auto_ingest=not args.no_auto_ingest,
+        time_budget_s=args.time_budget_s,
+        top_k_by_hvar3=args.top_k,
+        incremental=args.incremental,
+    )
+
+    for r in summary["cities"]:
+        detail = r.get("error") if r["status"] == "error" else f"run_id={r['run_id']}"
+        print(f"{r['city_key']:<32} {r['status']:<6} {r['duration_ms']:>9} ms  {detail}")
+    print(
+        f"{summary['ok']}/{summary['n_cities']} ok, {summary['attached']} attached to running analyses, "
+        f"{summary['failed']} failed in "
+        f"{summary['wall_ms'] / 1000:.1f} s ({summary['cities_per_minute']} cities/min, "
+        f"{summary['workers']} workers)"
+    )
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, default=str)
+
+    sys.exit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+"""
+Micro-benchmarks for the TriHSPAM engine.
+
+    python scripts/bench_trihspam.py                 # run everything
+    python scripts/bench_trihspam.py --only subcube  # one benchmark
+
+Each benchmark times the current implementation against the straightforward
+reference it replaced, on a synthetic cube, and checks both give the same result.
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.analysis_features import (  # noqa: E402
+    build_trihspam_cube,
+    build_trihspam_cube_from_views,
+    build_weather_window_views,
+    build_weather_windows,
+)
+from app.services.trihspam_cube import TriHSPAMCube, _is_missing  # noqa: E402
+from app.services import trihspam_engine as engine  # noqa: E402
+from app.services import trihspam_io  # noqa: E402
+
+NUMERIC_FEATURES = ["tavg", "tmin", "tmax", "diurnal_range", "delta_1", "roll_std_7", "anomaly_z"]
+SYMBOLIC_FEATURES = ["season", "temp_band", "trend", "volatility", "anomaly_band"]
+
+
+def make_cube(n_windows: int, window_size: int, missing_rate: float = 0.02, seed: int = 0) -> TriHSPAMCube:
+    rng = np.random.default_rng(seed)
+    feature_columns = NUMERIC_FEATURES + SYMBOLIC_FEATURES
+    n_num, n_sym = len(NUMERIC_FEATURES), len(SYMBOLIC_FEATURES)
+
+    numeric = rng.normal(20.0, 5.0, size=(n_num, n_windows, window_size))
+    numeric[rng.random(numeric.shape) < missing_rate] = np.nan
+
+    labels = np.array(["low", "mid", "high", "very_high"], dtype=object)
+    symbolic = labels[rng.integers(0, len(labels), size=(n_sym, n_windows, window_size))]
+    symbolic[rng.random(symbolic.shape) < missing_rate] = None
+
+    return TriHSPAMCube.from_blocks(
+        feature_columns=feature_columns,
+        numeric_feature_indices=list(range(n_num)),
+        symbolic_feature_indices=list(range(n_num, n_num + n_sym)),
+        numeric=numeric,
+        symbolic_values=symbolic,
+    )
+
+
+def make_candidates(cube: TriHSPAMCube, n_candidates: int, seed: int = 1) -> list[tuple[list[int], list[int], list[int]]]:
+    rng = np.random.default_rng(seed)
+    f_count, i_count, k_count = cube.shape
+    out = []
+    for _ in range(n_candidates):
+        rows = np.sort(rng.choice(i_count, size=int(rng.integers(8, 60)), replace=False)).tolist()
+        cols = np.sort(rng.choice(f_count, size=int(rng.integers(2, 7)), replace=False)).tolist()
+        k0 = int(rng.integers(0, k_count - 1))
+        ctxs = list(range(k0, min(k_count, k0 + int(rng.integers(2, 6)))))
+        out.append((rows, cols, ctxs))
+    return out
+
+
+def timed(fn, repeat: int = 3) -> tuple[float, object]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def report(name: str, old_s: float, new_s: float, detail: str = "") -> None:
+    speedup = old_s / new_s if new_s > 0 else float("inf")
+    print(f"{name:<28} old={old_s * 1000:9.1f} ms  new={new_s * 1000:9.1f} ms  x{speedup:6.1f}  {detail}")
+
+
+# -----------------------------------------------------------------------------
+# Benchmarks
+# -----------------------------------------------------------------------------
+
+def _extract_subcube_kij_loop(cube: TriHSPAMCube, rows_I, cols_J, contx_K) -> np.ndarray:
+    """Reference: the original per-cell triple loop."""
+    out = np.empty((len(contx_K), len(rows_I), len(cols_J)), dtype=object)
+    for k_pos, k_idx in enumerate(contx_K):
+        for i_pos, i_idx in enumerate(rows_I):
+            for j_pos, j_idx in enumerate(cols_J):
+                out[k_pos, i_pos, j_pos] = cube.value(j_idx, i_idx, k_idx)
+    return out
+
+
+def bench_subcube(args) -> None:
+    cube = make_cube(n_windows=500, window_size=args.window_size)
+    candidates = make_candidates(cube, args.candidates)
+    cells = sum(len(r) * len(c) * len(k) for r, c, k in candidates)
+
+    old_s, old = timed(lambda: [_extract_subcube_kij_loop(cube, *c) for c in candidates], args.repeat)
+    new_s, new = timed(lambda: [engine._extract_subcube_kij(cube, *c) for c in candidates], args.repeat)
+
+    for a, b in zip(old, new):
+        same = (a == b) | ((a != a) & (b != b))  # NaN == NaN
+        if not same.all():
+            raise AssertionError("subcube mismatch")
+
+    report("subcube_extract", old_s, new_s, f"{len(candidates)} candidates, {cells} cells")
+
+
+def bench_hvar3(args) -> None:
+    cube = make_cube(n_windows=500, window_size=args.window_size)
+    candidates = make_candidates(cube, args.candidates)
+    numeric = set(cube.numeric_feature_indices)
+
+    def _legacy():
+        scores = []
+        for rows, cols, ctxs in candidates:
+            sub = engine._extract_subcube_kij(cube, rows, cols, ctxs)
+            numeric_local = [p for p, j in enumerate(cols) if j in numeric]
+            symbolic_local = [p for p, j in enumerate(cols) if j not in numeric]
+            scores.append(engine.h_var3(sub, numeric_local, symbolic_local))
+        return np.array(scores)
+
+    old_s, old = timed(_legacy, args.repeat)
+    new_s, new = timed(lambda: engine.h_var3_batch(cube, candidates), args.repeat)
+
+    if not np.allclose(old, new, rtol=0.0, atol=1e-12):
+        raise AssertionError("hvar3 mismatch")
+
+    report("hvar3_batch", old_s, new_s, f"{len(candidates)} candidates")
+
+
+def _tricluster_cells(tric: dict) -> set[tuple[int, int]]:
+    """(row, context) pairs covered by a tricluster (per-row contexts when relaxed)."""
+    if "row_contexts" in tric:
+        return {(row, k) for row, ctxs in zip(tric["rows"], tric["row_contexts"]) for k in ctxs}
+    return {(row, k) for row in tric["rows"] for k in tric["contexts"]}
+
+
+def _tricluster_jaccard(t1: dict, t2: dict) -> float:
+    """Reference: set-based Jaccard of two triclusters."""
+    j1, j2 = set(t1["cols"]), set(t2["cols"])
+    cells1, cells2 = _tricluster_cells(t1), _tricluster_cells(t2)
+
+    inter = len(j1 & j2) * len(cells1 & cells2)
+    size1 = len(j1) * len(cells1)
+    size2 = len(j2) * len(cells2)
+    union = size1 + size2 - inter
+
+    if union <= 0:
+        return 0.0
+    return float(inter / union)
+
+
+def _filter_overlapping_pairwise(triclusters: list[dict], overlap_threshold: float) -> list[dict]:
+    """Reference: compare each candidate against every kept tricluster."""
+    kept = []
+    for candidate in sorted(triclusters, key=lambda x: (x["hvar3"], -x["shape"]["volume"])):
+        if all(_tricluster_jaccard(candidate, chosen) < overlap_threshold for chosen in kept):
+            kept.append(candidate)
+    return kept
+
+
+def bench_overlap(args) -> None:
+    # Mined triclusters come in families of near-duplicates: perturb the rows of
+    # a few base candidates so that plenty of pairs actually overlap.
+    rng = np.random.default_rng(2)
+    cube = make_cube(n_windows=500, window_size=args.window_size)
+    triclusters = []
+    for rows, cols, ctxs in make_candidates(cube, max(1, args.candidates // 20)):
+        for _ in range(20):
+            keep = rng.random(len(rows)) > 0.2
+            extra = rng.choice(cube.shape[1], size=3, replace=False)
+            variant = sorted(set(np.asarray(rows)[keep].tolist()) | set(extra.tolist()))
+            triclusters.append({
+                "rows": variant,
+                "cols": cols,
+                "contexts": ctxs,
+                "hvar3": float(rng.random()),
+                "shape": {"volume": len(variant) * len(cols) * len(ctxs)},
+            })
+
+    old_s, old = timed(lambda: _filter_overlapping_pairwise(triclusters, 0.3), args.repeat)
+    new_s, new = timed(lambda: engine._filter_overlapping_triclusters(triclusters, 0.3), args.repeat)
+
+    if [id(t) for t in old] != [id(t) for t in new]:
+        raise AssertionError("overlap filter mismatch")
+
+    report("overlap_filter", old_s, new_s, f"{len(triclusters)} triclusters, {len(new)} kept")
+
+
+def _impute_locf_cellwise(cube: np.ndarray) -> np.ndarray:
+    """Reference: the original per-cell LOCF over the dtype=object cube."""
+    out = cube.copy()
+    f_count, i_count, k_count = out.shape
+    for f_idx in range(f_count):
+        for i_idx in range(i_count):
+            last_value = None
+            for k_idx in range(k_count):
+                value = out[f_idx, i_idx, k_idx]
+                if _is_missing(value):
+                    if last_value is not None:
+                        out[f_idx, i_idx, k_idx] = last_value
+                else:
+                    last_value = value
+    return out
+
+
+def bench_locf(args) -> None:
+    cube = make_cube(n_windows=3000, window_size=30, missing_rate=0.15)
+    object_cube = cube.to_object_cube()
+
+    old_s, old = timed(lambda: _impute_locf_cellwise(object_cube), 1)
+    new_s, new = timed(lambda: engine._impute_missing_with_locf_cube(cube), args.repeat)
+
+    for f_idx in range(cube.shape[0]):
+        for a, b in zip(old[f_idx].ravel(), new.to_object_cube()[f_idx].ravel()):
+            if not (a == b or (_is_missing(a) and _is_missing(b))):
+                raise AssertionError("locf mismatch")
+
+    report("locf_impute", old_s, new_s, f"cube {cube.shape}, {int(cube.missing.sum())} missing cells")
+
+
+def bench_spmf_io(args) -> None:
+    # One SPMF round trip: write the input sequences, read back mined
+    # patterns. Patterns are random itemsets of real item ids with random
+    # supporting rows, written once in SPMF's text and in the binary format.
+    rng = np.random.default_rng(3)
+    cube = make_cube(n_windows=3000, window_size=args.window_size)
+    abstractions = engine._build_abstractions(
+        cube=cube,
+        numeric_feature_indices=cube.numeric_feature_indices,
+        symbolic_feature_indices=cube.symbolic_feature_indices,
+        disc_method="eq_size",
+        n_bins=3,
+    )
+    sequences = engine._cube_to_sequences(cube, abstractions)
+    n_rows = len(sequences)
+
+    patterns = []
+    for _ in range(args.candidates * 20):
+        itemsets = [
+            sorted(rng.choice(sequences.max_item_id, size=int(rng.integers(1, 4)), replace=False) + 1)
+            for _ in range(int(rng.integers(1, 4)))
+        ]
+        sids = np.sort(rng.choice(n_rows, size=int(rng.integers(20, 300)), replace=False)).tolist()
+        patterns.append(([[int(x) for x in s] for s in itemsets], len(sids), sids))
+
+    with tempfile.TemporaryDirectory(prefix="bench_trihspam_") as tmp:
+        tmp = Path(tmp)
+        with (tmp / "out.txt").open("w", encoding="utf-8") as f:
+            for itemsets, support, sids in patterns:
+                body = " ".join(" ".join(map(str, s)) + " -1" for s in itemsets)
+                f.write(f"{body} #SUP: {support} #SID: {' '.join(map(str, sids))}\n")
+        trihspam_io.write_pattern_file(tmp / "out.tpat", patterns, n_rows)
+
+        def _text():
+            engine._write_spmf_input(sequences, tmp / "in.txt", include_timestamps=True)
+            return list(engine._iter_spmf_patterns(tmp / "out.txt", sequences, min_I=1))
+
+        def _binary():
+            trihspam_io.write_sequence_file(tmp / "in.tseq", sequences.item_ids, include_timestamps=True)
+            return list(engine._iter_binary_patterns(tmp / "out.tpat", sequences, min_I=1))
+
+        old_s, old = timed(_text, args.repeat)
+        new_s, new = timed(_binary, args.repeat)
+        sizes = [(tmp / name).stat().st_size >> 10 for name in ("in.txt", "in.tseq", "out.txt", "out.tpat")]
+
+    if old != new:
+        raise AssertionError("spmf io mismatch")
+
+    report(
+        "spmf_io",
+        old_s,
+        new_s,
+        f"{n_rows} sequences, {len(patterns)} patterns, in {sizes[0]}->{sizes[1]} KiB, out {sizes[2]}->{sizes[3]} KiB",
+    )
+
+
+def _synthetic_daily_df(seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    days = pd.date_range("2014-01-01", "2023-12-31")
+    daily_df = pd.DataFrame({"date": days})
+    for feature in NUMERIC_FEATURES:
+        daily_df[feature] = rng.normal(20.0, 5.0, len(days))
+    for feature in SYMBOLIC_FEATURES:
+        daily_df[feature] = rng.choice(["low", "mid", "high"], len(days))
+    return daily_df
+
+
+def _cube_blocks_per_window(windows_df, numeric_features, symbolic_features, window_size):
+    """Reference: the original per-window filtering of the long-form frame."""
+    window_ids = sorted(windows_df["window_id"].drop_duplicates().tolist())
+    numeric = np.full((len(numeric_features), len(window_ids), window_size), np.nan)
+    symbolic = np.empty((len(symbolic_features), len(window_ids), window_size), dtype=object)
+    for w_idx, wid in enumerate(window_ids):
+        chunk = windows_df[windows_df["window_id"] == wid].sort_values("context_idx")
+        for local, feature in enumerate(numeric_features):
+            numeric[local, w_idx] = pd.to_numeric(chunk[feature], errors="coerce").astype(float).to_numpy()
+        for local, feature in enumerate(symbolic_features):
+            symbolic[local, w_idx] = chunk[feature].fillna("missing").astype(str).to_numpy()
+    return numeric, symbolic
+
+
+def bench_cube_build(args) -> None:
+    # Stride-1 windows over ten years of synthetic daily features
+    daily_df = _synthetic_daily_df(seed=4)
+    _, windows_df = build_weather_windows(daily_df, window_size=args.window_size, stride=1)
+
+    old_s, (numeric, symbolic) = timed(
+        lambda: _cube_blocks_per_window(windows_df, NUMERIC_FEATURES, SYMBOLIC_FEATURES, args.window_size), 1
+    )
+    new_s, cube_info = timed(
+        lambda: build_trihspam_cube(
+            windows_df=windows_df,
+            feature_columns=NUMERIC_FEATURES + SYMBOLIC_FEATURES,
+            numeric_features=NUMERIC_FEATURES,
+            symbolic_features=SYMBOLIC_FEATURES,
+            window_size=args.window_size,
+        ),
+        args.repeat,
+    )
+
+    cube = cube_info["cube"]
+    decoded = np.stack([np.asarray(vocab, dtype=object)[codes] for vocab, codes in zip(cube.vocabularies, cube.codes)])
+    if not (np.array_equal(numeric, cube.numeric) and (decoded == symbolic).all()):
+        raise AssertionError("cube build mismatch")
+
+    report("cube_build", old_s, new_s, f"cube {cube.shape}, {len(windows_df)} window rows")
+
+
+def _weather_windows_concat(daily_df, window_size, stride):
+    """Reference: the original copy-and-concat long-form windowing."""
+    frames = []
+    for window_id, start in enumerate(range(0, len(daily_df) - window_size + 1, stride)):
+        window_slice = daily_df.iloc[start:start + window_size].copy().reset_index(drop=True)
+        window_slice["window_id"] = window_id
+        window_slice["context_idx"] = np.arange(window_size, dtype=int)
+        frames.append(window_slice)
+    windows_df = pd.concat(frames, ignore_index=True)
+    windows_df["date"] = windows_df["date"].dt.strftime("%Y-%m-%d")
+    return windows_df
+
+
+def bench_windows(args) -> None:
+    # Daily table -> cube for stride-1 windows over ten years: materialized
+    # long-form windows vs sliding-window views over the daily columns.
+    daily_df = _synthetic_daily_df(seed=5)
+    window_size = 30
+    kwargs = dict(
+        feature_columns=NUMERIC_FEATURES + SYMBOLIC_FEATURES,
+        numeric_features=NUMERIC_FEATURES,
+        symbolic_features=SYMBOLIC_FEATURES,
+    )
+
+    old_s, old = timed(
+        lambda: build_trihspam_cube(
+            windows_df=_weather_windows_concat(daily_df, window_size, 1), window_size=window_size, **kwargs
+        ),
+        1,
+    )
+    new_s, new = timed(
+        lambda: build_trihspam_cube_from_views(build_weather_window_views(daily_df, window_size, 1), **kwargs),
+        args.repeat,
+    )
+
+    a, b = old["cube"], new["cube"]
+    if not (np.array_equal(a.numeric, b.numeric) and np.array_equal(a.codes, b.codes) and a.vocabularies == b.vocabularies):
+        raise AssertionError("windowing mismatch")
+
+    report("windows", old_s, new_s, f"cube {b.shape} from {len(daily_df)} days")
+
+
+BENCHMARKS = {
+    "subcube": bench_subcube,
+    "hvar3": bench_hvar3,
+    "overlap": bench_overlap,
+    "locf": bench_locf,
+    "spmf_io": bench_spmf_io,
+    "cube_build": bench_cube_build,
+    "windows": bench_windows,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--only", choices=sorted(BENCHMARKS), action="append")
+    parser.add_argument("--candidates", type=int, default=1000)
+    parser.add_argument("--window-size", type=int, default=14)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with np.errstate(all="ignore"):
+        for name in args.only or BENCHMARKS:
+            BENCHMARKS[name](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -65,6 +65,16 @@ def main():
     );
     """)
 
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS analysis_checksums (
+        city TEXT NOT NULL,
+        table_name TEXT NOT NULL,    -- analysis_daily | analysis_monthly
+        range_key TEXT NOT NULL,     -- YYYY-MM for daily rows, YYYY for monthly rows
+        checksum TEXT,
+        PRIMARY KEY (city, table_name, range_key)
+    );
+    """)
+
     cur.execute("""
     CREATE TABLE IF NOT EXISTS execution_runs (
         run_id TEXT PRIMARY KEY,
@@ -72,14 +82,39 @@ def main():
         finished_at TEXT,
         endpoint TEXT,
         city TEXT,
-        status TEXT,
+        status TEXT,                 -- queued | running | ok | error
         duration_ms INTEGER,
         params_json TEXT,
+        params_hash TEXT,            -- single-flight key, see analysis_jobs
+        progress_json TEXT,
         result_json TEXT,
         error TEXT
     );
     """)
+
+    # Databases created before progress_json / params_hash existed
+    cols = {row[1] for row in cur.execute("PRAGMA table_info(execution_runs)")}
+    for col in ("progress_json", "params_hash"):
+        if col not in cols:
+            cur.execute(f"ALTER TABLE execution_runs ADD COLUMN {col} TEXT")
+
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_execution_runs_inflight
+    ON execution_runs (city, params_hash, status);
+    """)
     
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS analysis_step_cache (
+        city TEXT,
+        step TEXT,
+        fingerprint TEXT,            -- inputs + params of the step, see step_cache
+        run_id TEXT,
+        output_ref TEXT,             -- path of the stored step output
+        updated_at TEXT,
+        PRIMARY KEY (city, step)
+    );
+    """)
+
     cur.execute("""
     CREATE TABLE IF NOT EXISTS insights_cache (
         city TEXT PRIMARY KEY,
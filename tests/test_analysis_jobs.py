@@ -0,0 +1,35 @@
+"""
+AnalysisJobQueue recovery from a triclustering process that died.
+"""
+import os
+
+from app.services import analysis_jobs
+
+
+def test_broken_cpu_pool_fails_only_the_current_run(monkeypatch):
+    outcomes = []
+
+    def fake_run_city_analysis(run_id, cpu_executor, **params):
+        try:
+            if params["crash"]:
+                cpu_executor.submit(os._exit, 1).result()  # the worker dies, as on an OOM kill
+            outcomes.append((run_id, cpu_executor.submit(os.getpid).result()))
+        except Exception as e:
+            outcomes.append((run_id, type(e).__name__))
+            raise
+
+    monkeypatch.setattr(analysis_jobs, "run_city_analysis", fake_run_city_analysis)
+
+    queue = analysis_jobs.AnalysisJobQueue(workers=1, max_queue=1, cpu_workers=1)
+    try:
+        broken = queue._cpu_executor()
+        for run_id, crash in (("crashed", True), ("next", False)):
+            queue._pending += 1  # as submit() would
+            queue._run(run_id, (run_id, "hash"), {"crash": crash})
+
+        assert outcomes[0] == ("crashed", "BrokenProcessPool")
+        assert outcomes[1][0] == "next" and isinstance(outcomes[1][1], int)
+        assert queue._cpu_executor() is not broken
+        assert queue.depth == 0
+    finally:
+        queue.shutdown()
@@ -0,0 +1,46 @@
+"""
+Round trips of memoized step outputs through step_cache's frame entries and
+the .npz files they are stored in.
+"""
+import numpy as np
+import pandas as pd
+
+from app.services.step_cache import frame_from_entry, frame_to_entry
+from app.services.trihspam_cache import read_entry, write_entry
+
+
+def make_frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        "date": pd.to_datetime(["2024-01-01", "2024-01-02", None, "2024-01-04"]),
+        "tavg": [1.5, np.nan, 3.0, 4.25],
+        "n_days": np.array([1, 2, 3, 4], dtype=np.int64),
+        "temp_band": ["cold", None, "hot", np.nan],
+        "label": ["None", "nan", "", "mild"],  # look like missing values, but are not
+        "empty": [None, None, np.nan, None],
+    })
+
+
+def round_trip(df: pd.DataFrame, tmp_path) -> pd.DataFrame:
+    meta, arrays = frame_to_entry(df)
+    write_entry(tmp_path / "entry.npz", {"output": meta}, arrays)
+    stored_meta, stored_arrays = read_entry(tmp_path / "entry.npz")
+    return frame_from_entry(stored_meta["output"], stored_arrays)
+
+
+def test_frame_round_trip_keeps_missing_values(tmp_path):
+    df = make_frame()
+    out = round_trip(df, tmp_path)
+
+    assert list(out.columns) == list(df.columns)
+    assert out["temp_band"].tolist()[0::2] == ["cold", "hot"]
+    assert out["temp_band"].isna().tolist() == [False, True, False, True]
+    assert out["label"].tolist() == ["None", "nan", "", "mild"]
+    assert out["empty"].isna().all()
+    # An all-missing object column may come back as float NaN
+    pd.testing.assert_frame_equal(out.drop(columns="empty"), df.drop(columns="empty"))
+
+
+def test_frame_without_missing_values_stores_no_masks():
+    _, arrays = frame_to_entry(make_frame()[["tavg", "label"]])
+
+    assert sorted(arrays) == ["c0", "c1"]
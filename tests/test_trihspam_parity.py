@@ -0,0 +1,190 @@
+"""
+Parity checks for the TriHSPAM rewrites:
+
+- the in-process miners return the same patterns as the SPMF jar
+  (skipped when java or the jar is not available), and
+- batched HVar3 scoring matches the legacy per-tricluster h_var3().
+"""
+import shutil
+
+import numpy as np
+import pytest
+
+from app.services import trihspam_engine as engine
+from app.services.trihspam_cube import TriHSPAMCube
+
+NUMERIC = ["tavg", "tmin", "diurnal_range"]
+SYMBOLIC = ["temp_band", "trend_class"]
+
+
+def make_cube(n_windows: int = 60, window_size: int = 6, missing_rate: float = 0.05, seed: int = 0) -> TriHSPAMCube:
+    """Small cube with few symbols per feature, so plenty of patterns are frequent."""
+    rng = np.random.default_rng(seed)
+    n_num, n_sym = len(NUMERIC), len(SYMBOLIC)
+
+    numeric = rng.normal(20.0, 5.0, size=(n_num, n_windows, window_size))
+    numeric[rng.random(numeric.shape) < missing_rate] = np.nan
+
+    labels = np.array(["low", "mid", "high"], dtype=object)
+    symbolic = labels[rng.integers(0, len(labels), size=(n_sym, n_windows, window_size))]
+    symbolic[rng.random(symbolic.shape) < missing_rate] = None
+
+    return TriHSPAMCube.from_blocks(
+        feature_columns=NUMERIC + SYMBOLIC,
+        numeric_feature_indices=list(range(n_num)),
+        symbolic_feature_indices=list(range(n_num, n_num + n_sym)),
+        numeric=numeric,
+        symbolic_values=symbolic,
+    )
+
+
+def make_sequences(cube: TriHSPAMCube, relaxed: bool = False) -> engine.EncodedSequences:
+    abstractions = engine._build_abstractions(
+        cube=cube,
+        numeric_feature_indices=cube.numeric_feature_indices,
+        symbolic_feature_indices=cube.symbolic_feature_indices,
+        disc_method="eq_size",
+        n_bins=2,
+    )
+    return engine._cube_to_sequences(cube, abstractions, relaxed=relaxed)
+
+
+def mined(sequences: engine.EncodedSequences, spm_algo: str, min_I: int, min_K: int, **kwargs) -> set:
+    """Mined patterns as a set of (itemsets, support, subject ids); mining order is not compared."""
+    rows = engine._mine_patterns(
+        sequences=sequences,
+        n_observations=len(sequences),
+        min_I=min_I,
+        min_J=1,
+        min_K=min_K,
+        spm_algo=spm_algo,
+        jar_path=None,
+        keep_temp_files=False,
+        **kwargs,
+    )
+    return {
+        (
+            tuple(tuple(itemset) for itemset in row["itemset_ids"]),
+            int(row["support"]),
+            tuple(int(s) for s in row["subject_ids"]),
+        )
+        for row in rows
+    }
+
+
+# -----------------------------------------------------------------------------
+# Native miner vs SPMF
+# -----------------------------------------------------------------------------
+
+requires_spmf = pytest.mark.skipif(
+    shutil.which("java") is None or not engine._default_jar_path().exists(),
+    reason="java and app/services/spmf_vd.jar are needed to compare against SPMF",
+)
+
+
+@requires_spmf
+@pytest.mark.parametrize("spmf_workers", [0, 1])
+@pytest.mark.parametrize(
+    "native_algo, spmf_algo, min_K",
+    [
+        ("native_fournier08closed", "fournier08closed", 2),
+        ("native_prefixspan", "prefixspan", 1),
+    ],
+)
+def test_native_miner_matches_spmf(native_algo, spmf_algo, min_K, spmf_workers):
+    sequences = make_sequences(make_cube())
+    expected = mined(sequences, spmf_algo, min_I=12, min_K=min_K, spmf_workers=spmf_workers)
+    actual = mined(sequences, native_algo, min_I=12, min_K=min_K)
+
+    assert expected
+    assert actual == expected
+
+
+def test_native_closed_patterns_are_closed_frequent_patterns():
+    # Needs no jar: every closed pattern is frequent, with the same support
+    sequences = make_sequences(make_cube(seed=1))
+    closed = mined(sequences, "native_fournier08closed", min_I=15, min_K=1)
+    frequent = mined(sequences, "native_prefixspan", min_I=15, min_K=1)
+
+    assert closed
+    frequent_by_items = {items: (support, sids) for items, support, sids in frequent}
+    for items, support, sids in closed:
+        assert frequent_by_items.get(items) == (support, sids)
+
+
+# -----------------------------------------------------------------------------
+# Batched HVar3 vs legacy h_var3
+# -----------------------------------------------------------------------------
+
+def make_candidates(cube: TriHSPAMCube, n_candidates: int = 200, seed: int = 2) -> list:
+    rng = np.random.default_rng(seed)
+    f_count, i_count, k_count = cube.shape
+    out = []
+    for _ in range(n_candidates):
+        rows = np.sort(rng.choice(i_count, size=int(rng.integers(2, 20)), replace=False)).tolist()
+        cols = np.sort(rng.choice(f_count, size=int(rng.integers(1, f_count + 1)), replace=False)).tolist()
+        k0 = int(rng.integers(0, k_count - 1))
+        ctxs = list(range(k0, min(k_count, k0 + int(rng.integers(1, 4)))))
+        out.append((rows, cols, ctxs))
+    return out
+
+
+def legacy_h_var3(cube: TriHSPAMCube, rows, cols, ctxs) -> float:
+    sub = engine._extract_subcube_kij(cube, rows, cols, ctxs)
+    numeric = set(cube.numeric_feature_indices)
+    numeric_local = [p for p, j in enumerate(cols) if j in numeric]
+    symbolic_local = [p for p, j in enumerate(cols) if j not in numeric]
+    return engine.h_var3(sub, numeric_local, symbolic_local)
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")  # legacy nanmean/nanstd over all-missing slices
+@pytest.mark.parametrize("missing_rate", [0.0, 0.2])
+def test_h_var3_batch_matches_legacy(missing_rate):
+    cube = make_cube(missing_rate=missing_rate, seed=3)
+    candidates = make_candidates(cube)
+
+    expected = np.array([legacy_h_var3(cube, *c) for c in candidates])
+    batched = engine.h_var3_batch(cube, candidates)
+    single = np.array([engine.h_var3_cube(cube, *c) for c in candidates])
+
+    np.testing.assert_allclose(batched, expected, rtol=0.0, atol=1e-9)
+    np.testing.assert_allclose(single, expected, rtol=0.0, atol=1e-9)
+
+
+def test_h_var3_batch_is_independent_of_chunking():
+    cube = make_cube(missing_rate=0.1, seed=4)
+    candidates = make_candidates(cube, seed=5)
+
+    whole = engine.h_var3_batch(cube, candidates)
+    chunked = engine.h_var3_batch(cube, candidates, max_cells=64)
+
+    np.testing.assert_allclose(chunked, whole, rtol=0.0, atol=1e-9)
+
+
+# -----------------------------------------------------------------------------
+# Time budget
+# -----------------------------------------------------------------------------
+
+def test_unreached_time_budget_does_not_change_the_result():
+    cube = make_cube(n_windows=200, seed=1)
+    cube_info = {
+        "cube": cube,
+        "feature_columns": NUMERIC + SYMBOLIC,
+        "numeric_features": NUMERIC,
+        "symbolic_features": SYMBOLIC,
+        "numeric_feature_indices": cube.numeric_feature_indices,
+        "symbolic_feature_indices": cube.symbolic_feature_indices,
+        "windows_meta": [{}] * cube.shape[1],
+        "window_ids": list(range(cube.shape[1])),
+        "n_windows": cube.shape[1],
+        "window_size": cube.shape[2],
+    }
+    common = dict(min_I=25, min_J=1, min_K=1, n_bins=2, spm_algo="native_prefixspan", coherence_threshold=1.0)
+
+    unbounded = engine.run_weather_trihspam(cube_info, engine.TriHSPAMConfig(**common))
+    budgeted = engine.run_weather_trihspam(cube_info, engine.TriHSPAMConfig(time_budget_s=3600, **common))
+
+    assert unbounded["triclusters"]
+    assert budgeted["engine"]["truncated"] is False
+    assert [t["rows"] for t in budgeted["triclusters"]] == [t["rows"] for t in unbounded["triclusters"]]
+    assert [t["hvar3"] for t in budgeted["triclusters"]] == [t["hvar3"] for t in unbounded["triclusters"]]